@@ -1,20 +1,62 @@
 from __future__ import annotations
 
+import asyncio
 import mimetypes
+import tracemalloc
+from contextlib import asynccontextmanager
 
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
 
-from .routers import register_routes
+from .bots import shutdown_pool
+from .config import HEARTBEAT_INTERVAL, STATIC_CACHE, TRACEMALLOC_FRAMES
+from .game_service import (
+    arm_turn_timer,
+    evict_room,
+    run_heartbeat,
+    run_room_sweeper,
+    run_turn_timers,
+    schedule_bots,
+)
+from .routers import register_admin, register_metrics, register_routes
+from .static import StaticAssets
+from .storage import games, lobbies, store
 
 # Гарантируем корректный MIME-тип для JS/CSS (особенно важно для ES-модулей)
 mimetypes.add_type("text/css", ".css")
 mimetypes.add_type("application/javascript", ".js")
 
 
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    if TRACEMALLOC_FRAMES:
+        tracemalloc.start(TRACEMALLOC_FRAMES)
+    await store.start()
+    for game in await store.load_all():
+        # Сохранённых комнат может быть больше MAX_ROOMS: лишние удаляются так же,
+        # как при создании новой комнаты.
+        for evicted in games.add(game):
+            await evict_room(evicted, "capacity")
+        lobbies.update(game)
+        arm_turn_timer(game)
+        if game.phase == "playing":
+            # Игра могла сохраниться на ходе бота: без этого она ждёт таймаута.
+            schedule_bots(game)
+    tasks = [asyncio.create_task(run_room_sweeper()), asyncio.create_task(run_turn_timers())]
+    if HEARTBEAT_INTERVAL > 0:
+        tasks.append(asyncio.create_task(run_heartbeat()))
+    try:
+        yield
+    finally:
+        for task in tasks:
+            task.cancel()
+        shutdown_pool()
+        await store.stop()
+
+
 def create_app() -> FastAPI:
-    app = FastAPI()
+    app = FastAPI(lifespan=lifespan)
     app.add_middleware(
         CORSMiddleware,
         allow_origins=["*"],
@@ -22,5 +64,10 @@ def create_app() -> FastAPI:
         allow_methods=["*"],
     )
     register_routes(app)
-    app.mount("/", StaticFiles(directory="public", html=True), name="static")
+    register_metrics(app)
+    register_admin(app)
+    if STATIC_CACHE:
+        app.mount("/", StaticAssets("public"), name="static")
+    else:
+        app.mount("/", StaticFiles(directory="public", html=True), name="static")
     return app
@@ -0,0 +1,58 @@
+from __future__ import annotations
+
+import json
+import struct
+from typing import Iterator, List, Tuple
+
+OP_JOIN = 1
+OP_START = 2
+OP_ATTACK = 3
+OP_DEFEND = 4
+OP_PASS = 5
+OP_TAKE = 6
+OP_REMATCH = 7
+OP_CANCEL_REMATCH = 8
+OP_SURRENDER = 9
+OP_LEAVE = 10
+
+NO_ARG = 0xFF
+
+# Запись журнала — 4 байта: код действия, место игрока, карта, доп. аргумент.
+ENTRY = struct.Struct("BBBB")
+HEADER = struct.Struct("!QBI")
+
+Entry = Tuple[int, int, int, int]
+
+
+class ActionLog:
+    def __init__(self, seed: int, max_players: int):
+        self.seed = seed
+        self.max_players = max_players
+        self.roster: List[Tuple[str, str]] = []
+        self.entries = bytearray()
+
+    def __len__(self) -> int:
+        return len(self.entries) // ENTRY.size
+
+    def __iter__(self) -> Iterator[Entry]:
+        return ENTRY.iter_unpack(self.entries)
+
+    def record(self, op: int, seat: int, card: int = NO_ARG, arg: int = NO_ARG) -> None:
+        self.entries += ENTRY.pack(op, seat, card, arg)
+
+    def record_join(self, player_id: str, name: str) -> None:
+        self.roster.append((player_id, name))
+        self.record(OP_JOIN, len(self.roster) - 1)
+
+    def to_bytes(self) -> bytes:
+        roster = json.dumps(self.roster, ensure_ascii=False, separators=(",", ":")).encode()
+        return HEADER.pack(self.seed, self.max_players, len(roster)) + roster + bytes(self.entries)
+
+    @classmethod
+    def from_bytes(cls, blob: bytes) -> ActionLog:
+        seed, max_players, roster_size = HEADER.unpack_from(blob)
+        log = cls(seed, max_players)
+        roster_end = HEADER.size + roster_size
+        log.roster = [tuple(entry) for entry in json.loads(blob[HEADER.size:roster_end])]
+        log.entries = bytearray(blob[roster_end:])
+        return log
@@ -0,0 +1,305 @@
+from __future__ import annotations
+
+import struct
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from .action_log import NO_ARG
+from .cards import CARD_IDS, CARD_JSON, DECK_SIZE
+from .engine import ACTION_OPS
+
+# Двоичный протокол включается, если клиент запросил этот подпротокол
+# WebSocket; иначе соединение работает в JSON, как раньше. Состояние и патчи
+# в нём — те же поля, что и в JSON, но без имён ключей: маска полей и значения
+# по порядку, карта — один байт, игрок — номер места. Остальные кадры
+# (joined, ошибки, чат) и на двоичном соединении остаются текстовыми JSON.
+SUBPROTOCOL = "durak.bin.v1"
+
+FRAME_STATE = 1
+FRAME_PATCH = 2
+
+# Команды клиента: первый байт — код. Игровые действия используют коды
+# журнала (OP_START…OP_SURRENDER) и всегда занимают 3 байта: код, карта,
+# номер атаки; служебные идут выше.
+CMD_ACK = 0x40
+CMD_SYNC = 0x41
+CMD_CHAT_HISTORY = 0x42
+CMD_PONG = 0x43
+
+NONE = 0xFF
+
+# Заголовок: тип кадра, порядковый номер кадра игрока (seq), версия,
+# у патча — базовая версия, затем маска полей.
+STATE_HEADER = struct.Struct("!BIII")
+PATCH_HEADER = struct.Struct("!BIIII")
+ACTION = struct.Struct("BBB")
+COUNTER = struct.Struct("!BI")
+U16 = struct.Struct("!H")
+
+PHASES = ("lobby", "playing", "ended")
+PHASE_CODES = {phase: code for code, phase in enumerate(PHASES)}
+ACTION_FLAGS = (
+    "canStart",
+    "canAttack",
+    "canThrow",
+    "canPass",
+    "canDefend",
+    "canTake",
+    "canSurrender",
+)
+PLAYER_HOST = 1
+PLAYER_OUT = 2
+PLAYER_CONNECTED = 4
+PLAYER_BOT = 8
+OP_ACTIONS = {op: action for action, op in ACTION_OPS.items()}
+
+Seats = Dict[str, int]
+Encoded = Tuple[int, bytes]
+
+
+def _card(value: Optional[Dict[str, str]]) -> int:
+    if value is None:
+        return NONE
+    return CARD_IDS[(value["suit"], value["rank"])]
+
+
+def _seat(player_id: Optional[str], seats: Seats) -> int:
+    if player_id is None:
+        return NONE
+    return seats.get(player_id, NONE)
+
+
+def _str8(text: str) -> bytes:
+    data = text.encode()[:255]
+    return bytes((len(data),)) + data
+
+
+def _str16(text: str) -> bytes:
+    data = text.encode()[:0xFFFF]
+    return U16.pack(len(data)) + data
+
+
+def _players(players: List[Dict[str, Any]], seats: Seats) -> bytes:
+    out = bytearray((len(players),))
+    for entry in players:
+        flags = (
+            (PLAYER_HOST if entry["isHost"] else 0)
+            | (PLAYER_OUT if entry["isOut"] else 0)
+            | (PLAYER_CONNECTED if entry["connected"] else 0)
+            | (PLAYER_BOT if entry["isBot"] else 0)
+        )
+        out += bytes((flags, entry["handSize"]))
+        out += _str8(entry["id"])
+        out += _str8(entry["name"])
+    return bytes(out)
+
+
+def _table(table: List[Dict[str, Any]], seats: Seats) -> bytes:
+    out = bytearray((len(table),))
+    for slot in table:
+        out += bytes(
+            (_card(slot["attack"]), _card(slot["defense"]), _seat(slot["attackerId"], seats))
+        )
+    return bytes(out)
+
+
+def _votes(votes: List[str], seats: Seats) -> bytes:
+    mask = 0
+    for player_id in votes:
+        seat = seats.get(player_id)
+        if seat is not None:
+            mask |= 1 << seat
+    return U16.pack(mask)
+
+
+def _actions(actions: Dict[str, bool], seats: Seats) -> bytes:
+    mask = 0
+    for bit, flag in enumerate(ACTION_FLAGS):
+        if actions.get(flag):
+            mask |= 1 << bit
+    return bytes((mask,))
+
+
+# Порядок полей задаёт их биты в маске; личные поля (рука, действия) идут
+# последними, поэтому общий публичный кусок и личный склеиваются без разбора.
+FIELDS: List[Tuple[str, Callable[[Any, Seats], bytes]]] = [
+    ("id", lambda value, seats: _str8(value)),
+    ("phase", lambda value, seats: bytes((PHASE_CODES[value],))),
+    ("maxPlayers", lambda value, seats: bytes((value,))),
+    ("players", _players),
+    ("deckCount", lambda value, seats: bytes((value,))),
+    ("discardCount", lambda value, seats: bytes((value,))),
+    ("trumpCard", lambda value, seats: bytes((_card(value),))),
+    ("table", _table),
+    ("status", lambda value, seats: _str16(value)),
+    ("attackerId", lambda value, seats: bytes((_seat(value, seats),))),
+    ("defenderId", lambda value, seats: bytes((_seat(value, seats),))),
+    ("allowThrowIns", lambda value, seats: bytes((1 if value else 0,))),
+    ("loserId", lambda value, seats: bytes((_seat(value, seats),))),
+    ("winnerId", lambda value, seats: bytes((_seat(value, seats),))),
+    ("rematchVotes", _votes),
+    ("surrenderedPlayer", lambda value, seats: bytes((_seat(value, seats),))),
+    ("hand", lambda value, seats: bytes((len(value), *(_card(card) for card in value)))),
+    ("availableActions", _actions),
+]
+
+
+def encode_fields(values: Dict[str, Any], seats: Seats) -> Encoded:
+    mask = 0
+    out = bytearray()
+    for bit, (field, encode) in enumerate(FIELDS):
+        if field in values:
+            mask |= 1 << bit
+            out += encode(values[field], seats)
+    return mask, bytes(out)
+
+
+def encode_state_frame(seq: int, version: int, public: Encoded, private: Encoded) -> bytes:
+    return (
+        STATE_HEADER.pack(FRAME_STATE, seq, version, public[0] | private[0])
+        + public[1]
+        + private[1]
+    )
+
+
+def encode_patch_frame(
+    seq: int, version: int, base_version: int, public: Encoded, private: Encoded
+) -> bytes:
+    return (
+        PATCH_HEADER.pack(FRAME_PATCH, seq, version, base_version, public[0] | private[0])
+        + public[1]
+        + private[1]
+    )
+
+
+def decode_command(data: bytes) -> Optional[Dict[str, Any]]:
+    # Переводит двоичную команду в тот же словарь, что приходит в JSON,
+    # чтобы лимиты, метрики и правила работали с одним форматом.
+    if not data:
+        return None
+    code = data[0]
+    if code in OP_ACTIONS and len(data) == ACTION.size:
+        _, card, arg = ACTION.unpack(data)
+        message: Dict[str, Any] = {"action": OP_ACTIONS[code]}
+        if card != NO_ARG:
+            message["card"] = CARD_JSON[card] if card < DECK_SIZE else None
+        if arg != NO_ARG:
+            message["attackIndex"] = arg
+        return message
+    if code in (CMD_ACK, CMD_CHAT_HISTORY) and len(data) == COUNTER.size:
+        _, value = COUNTER.unpack(data)
+        if code == CMD_ACK:
+            return {"action": "ack", "version": value}
+        return {"action": "chat_history", "afterSeq": value}
+    if code == CMD_SYNC and len(data) == 1:
+        return {"action": "sync"}
+    if code == CMD_PONG and len(data) == 1:
+        return {"action": "pong"}
+    return None
+
+
+class _Reader:
+    __slots__ = ("data", "pos")
+
+    def __init__(self, data: bytes, pos: int):
+        self.data = data
+        self.pos = pos
+
+    def byte(self) -> int:
+        value = self.data[self.pos]
+        self.pos += 1
+        return value
+
+    def u16(self) -> int:
+        (value,) = U16.unpack_from(self.data, self.pos)
+        self.pos += U16.size
+        return value
+
+    def text(self, size: int) -> str:
+        value = self.data[self.pos:self.pos + size].decode()
+        self.pos += size
+        return value
+
+
+def _read_card(reader: _Reader) -> Optional[Dict[str, str]]:
+    card = reader.byte()
+    return None if card == NONE else CARD_JSON[card]
+
+
+def decode_frame(data: bytes, players: Optional[List[Dict[str, Any]]] = None) -> Dict[str, Any]:
+    # Обратное преобразование для тестов и бенчмарка; браузерный клиент
+    # делает то же самое в public/js/binary.js. Места игроков переводятся
+    # в id по списку игроков из этого же кадра или из уже известного состояния.
+    if data[0] == FRAME_STATE:
+        _, seq, version, mask = STATE_HEADER.unpack_from(data)
+        reader = _Reader(data, STATE_HEADER.size)
+        message: Dict[str, Any] = {"type": "game_state", "seq": seq, "version": version}
+    else:
+        _, seq, version, base_version, mask = PATCH_HEADER.unpack_from(data)
+        reader = _Reader(data, PATCH_HEADER.size)
+        message = {
+            "type": "game_patch",
+            "seq": seq,
+            "version": version,
+            "baseVersion": base_version,
+        }
+    values: Dict[str, Any] = {}
+    roster = players or []
+
+    def player_id(seat: int) -> Optional[str]:
+        return roster[seat]["id"] if seat < len(roster) else None
+
+    for bit, (field, _) in enumerate(FIELDS):
+        if not mask >> bit & 1:
+            continue
+        if field == "id":
+            values[field] = reader.text(reader.byte())
+        elif field == "phase":
+            values[field] = PHASES[reader.byte()]
+        elif field in ("maxPlayers", "deckCount", "discardCount"):
+            values[field] = reader.byte()
+        elif field == "players":
+            roster = []
+            for _ in range(reader.byte()):
+                flags = reader.byte()
+                hand_size = reader.byte()
+                pid = reader.text(reader.byte())
+                name = reader.text(reader.byte())
+                roster.append(
+                    {
+                        "id": pid,
+                        "name": name,
+                        "handSize": hand_size,
+                        "isHost": bool(flags & PLAYER_HOST),
+                        "isOut": bool(flags & PLAYER_OUT),
+                        "connected": bool(flags & PLAYER_CONNECTED),
+                        "isBot": bool(flags & PLAYER_BOT),
+                    }
+                )
+            values[field] = roster
+        elif field == "trumpCard":
+            values[field] = _read_card(reader)
+        elif field == "table":
+            values[field] = [
+                {
+                    "attack": _read_card(reader),
+                    "defense": _read_card(reader),
+                    "attackerId": player_id(reader.byte()),
+                }
+                for _ in range(reader.byte())
+            ]
+        elif field == "status":
+            values[field] = reader.text(reader.u16())
+        elif field == "allowThrowIns":
+            values[field] = bool(reader.byte())
+        elif field == "rematchVotes":
+            votes = reader.u16()
+            values[field] = [player_id(seat) for seat in range(16) if votes >> seat & 1]
+        elif field == "hand":
+            values[field] = [_read_card(reader) for _ in range(reader.byte())]
+        elif field == "availableActions":
+            flags = reader.byte()
+            values[field] = {flag: bool(flags >> bit & 1) for bit, flag in enumerate(ACTION_FLAGS)}
+        else:
+            values[field] = player_id(reader.byte())
+    message["game" if data[0] == FRAME_STATE else "changes"] = values
+    return message
@@ -0,0 +1,191 @@
+from __future__ import annotations
+
+import multiprocessing
+import os
+import random
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Dict, List, Optional, Tuple
+
+from .action_log import OP_ATTACK, OP_DEFEND, OP_PASS, OP_REMATCH, OP_SURRENDER, OP_TAKE
+from .cards import card_rank, card_suit, iter_cards
+from .config import (
+    BOT_MAX_DETERMINIZATIONS,
+    BOT_MOVE_BUDGET,
+    BOT_ROLLOUT_STEPS,
+    BOT_WORKERS,
+)
+from .engine import Action, apply_op, legal_actions
+from .models import GameState, PlayerState, TableSlot, rebuild_indexes
+
+ALL_CARDS = (1 << 36) - 1
+
+BotView = Dict[str, Any]
+SearchResult = Tuple[Action, int, float, int]
+
+_pool: Optional[ProcessPoolExecutor] = None
+
+
+def get_pool() -> ProcessPoolExecutor:
+    global _pool
+    if _pool is None:
+        _pool = ProcessPoolExecutor(
+            max_workers=BOT_WORKERS, mp_context=multiprocessing.get_context("spawn")
+        )
+    return _pool
+
+
+def shutdown_pool() -> None:
+    global _pool
+    if _pool is not None:
+        _pool.shutdown(wait=False, cancel_futures=True)
+        _pool = None
+
+
+def bot_candidates(game: GameState, seat: int) -> List[Action]:
+    player = game.players[seat]
+    if game.phase == "ended":
+        if player.id in game.rematch_votes:
+            return []
+        return [Action(OP_REMATCH, seat)]
+    if game.phase != "playing" or player.id in game.attack_passed:
+        return []
+    return [action for action in legal_actions(game, seat) if action.op != OP_SURRENDER]
+
+
+def next_bot_turn(game: GameState) -> Optional[Tuple[int, List[Action]]]:
+    for seat, player in enumerate(game.players):
+        if player.is_bot:
+            actions = bot_candidates(game, seat)
+            if actions:
+                return seat, actions
+    return None
+
+
+def build_view(game: GameState, seat: int) -> BotView:
+    # Только то, что видит сам бот: чужие руки передаются одним размером.
+    return {
+        "seat": seat,
+        "players": [
+            (pl.id, pl.hand if idx == seat else None, pl.hand_size, pl.is_out)
+            for idx, pl in enumerate(game.players)
+        ],
+        "host": game.host_id,
+        "deckSize": len(game.deck),
+        "trump": game.trump_card,
+        "discard": game.discard,
+        "attacker": game.attacker_index,
+        "defender": game.defender_index,
+        "table": [(slot.attack, slot.defense, slot.attacker_id) for slot in game.table],
+        "throwIns": game.allow_throw_ins,
+        "passed": set(game.attack_passed),
+        "attackLimit": game.attack_limit,
+    }
+
+
+def determinize(view: BotView, rng: random.Random) -> GameState:
+    # Раздаём невидимые карты соперникам и в колоду случайным образом.
+    game = GameState("BOT", len(view["players"]), seed=0)
+    seen = view["discard"]
+    for attack, defense, _ in view["table"]:
+        seen |= 1 << attack
+        if defense is not None:
+            seen |= 1 << defense
+    own_hand = view["players"][view["seat"]][1]
+    unknown = list(iter_cards(ALL_CARDS & ~seen & ~own_hand))
+    rng.shuffle(unknown)
+    for player_id, hand, hand_size, is_out in view["players"]:
+        player = PlayerState(player_id, player_id, None)
+        if hand is None:
+            for _ in range(hand_size):
+                player.add_card(unknown.pop())
+        else:
+            player.hand = hand
+        player.is_out = is_out
+        game.seat_player(player)
+    game.deck = unknown[: view["deckSize"]]
+    game.host_id = view["host"]
+    game.phase = "playing"
+    game.trump_card = view["trump"]
+    game.discard = view["discard"]
+    game.attacker_index = view["attacker"]
+    game.defender_index = view["defender"]
+    for attack, defense, attacker_id in view["table"]:
+        slot = TableSlot(attack, attacker_id)
+        slot.defense = defense
+        game.table.append(slot)
+    rebuild_indexes(game)
+    game.allow_throw_ins = view["throwIns"]
+    game.attack_passed = set(view["passed"])
+    game.attack_limit = view["attackLimit"]
+    return game
+
+
+def rollout_action(game: GameState, rng: random.Random) -> Optional[Action]:
+    # Быстрая политика доигрывания: отбиваемся и ходим младшими картами,
+    # изредка подкидываем, иначе пасуем или берём.
+    actions = [
+        action
+        for action in legal_actions(game)
+        if action.op != OP_SURRENDER
+        and game.players[action.seat].id not in game.attack_passed
+    ]
+    if not actions:
+        return None
+    trump = game.trump_suit
+
+    def weight(action: Action) -> Tuple[bool, int]:
+        return (card_suit(action.card) == trump, card_rank(action.card))
+
+    defenses = [action for action in actions if action.op == OP_DEFEND]
+    if defenses:
+        return min(defenses, key=weight)
+    attacks = [action for action in actions if action.op == OP_ATTACK]
+    if attacks and (not game.table or rng.random() < 0.5):
+        return min(attacks, key=weight)
+    for op in (OP_PASS, OP_TAKE):
+        for action in actions:
+            if action.op == op:
+                return action
+    return rng.choice(actions)
+
+
+def playout(game: GameState, player_id: str, rng: random.Random) -> Tuple[float, int]:
+    nodes = 0
+    while game.phase == "playing" and nodes < BOT_ROLLOUT_STEPS:
+        action = rollout_action(game, rng)
+        if action is None:
+            break
+        apply_op(game, action.seat, action.op, action.card, action.arg)
+        nodes += 1
+    if game.phase == "playing":
+        return 0.5, nodes
+    return (0.0 if game.loser_id == player_id else 1.0), nodes
+
+
+def search_move(
+    view: BotView,
+    candidates: List[Action],
+    budget: float = BOT_MOVE_BUDGET,
+    max_determinizations: int = BOT_MAX_DETERMINIZATIONS,
+) -> SearchResult:
+    # Детерминизированный Монте-Карло: на каждой случайной раскладке
+    # скрытых карт доигрываем партию после каждого кандидата.
+    started = time.perf_counter()
+    deadline = started + budget
+    rng = random.Random()
+    player_id = view["players"][view["seat"]][0]
+    scores = [0.0] * len(candidates)
+    nodes = 0
+    rounds = 0
+    while rounds < max_determinizations and (rounds == 0 or time.perf_counter() < deadline):
+        world_seed = rng.getrandbits(64)
+        for idx, action in enumerate(candidates):
+            world = determinize(view, random.Random(world_seed))
+            apply_op(world, action.seat, action.op, action.card, action.arg)
+            score, used = playout(world, player_id, rng)
+            scores[idx] += score
+            nodes += used + 1
+        rounds += 1
+    best = max(range(len(candidates)), key=scores.__getitem__)
+    return candidates[best], nodes, time.perf_counter() - started, os.getpid()
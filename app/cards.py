@@ -3,28 +3,123 @@ from __future__ import annotations
 import random
 import secrets
 import string
-from typing import Dict, List
+import zlib
+from typing import Any, Dict, Iterator, List, Optional
 
 SUITS = ["C", "D", "H", "S"]
 RANKS = ["6", "7", "8", "9", "10", "J", "Q", "K", "A"]
 RANK_VALUE = {rank: idx for idx, rank in enumerate(RANKS)}
+SUIT_INDEX = {suit: idx for idx, suit in enumerate(SUITS)}
 MAX_ATTACKS = 6
+DECK_SIZE = len(SUITS) * len(RANKS)
 
+# Карта — целое 0..35: card = rank * 4 + suit. Рука, сброс и набор рангов
+# на столе хранятся битовыми масками, младшие биты — младшие ранги.
+RANK_MASKS = [0b1111 << (rank * 4) for rank in range(len(RANKS))]
+SUIT_MASKS = [
+    sum(1 << (rank * 4 + suit) for rank in range(len(RANKS))) for suit in range(len(SUITS))
+]
+# THROW_MASKS[ranks] — все карты, ранги которых входят в 9-битную маску ranks.
+THROW_MASKS = [
+    sum(RANK_MASKS[rank] for rank in range(len(RANKS)) if ranks >> rank & 1)
+    for ranks in range(1 << len(RANKS))
+]
 
-def generate_game_id() -> str:
+
+def card_rank(card: int) -> int:
+    return card >> 2
+
+
+def card_suit(card: int) -> int:
+    return card & 3
+
+
+def _build_beats_table(trump: int) -> List[int]:
+    table = []
+    for defense in range(DECK_SIZE):
+        mask = 0
+        for attack in range(DECK_SIZE):
+            if card_suit(defense) == card_suit(attack):
+                if card_rank(defense) > card_rank(attack):
+                    mask |= 1 << attack
+            elif card_suit(defense) == trump:
+                mask |= 1 << attack
+        table.append(mask)
+    return table
+
+
+# BEATS[trump][defense] — маска атакующих карт, которые бьёт defense;
+# BEATEN_BY[trump][attack] — маска карт, которыми можно побить attack.
+BEATS = [_build_beats_table(trump) for trump in range(len(SUITS))]
+BEATEN_BY = [
+    [
+        sum(1 << defense for defense in range(DECK_SIZE) if BEATS[trump][defense] >> attack & 1)
+        for attack in range(DECK_SIZE)
+    ]
+    for trump in range(len(SUITS))
+]
+
+CARD_JSON = [
+    {"suit": SUITS[card_suit(card)], "rank": RANKS[card_rank(card)]} for card in range(DECK_SIZE)
+]
+CARD_IDS = {(entry["suit"], entry["rank"]): card for card, entry in enumerate(CARD_JSON)}
+
+
+def shard_for_game_id(game_id: str, shard_count: int) -> int:
+    return zlib.crc32(game_id.encode()) % shard_count
+
+
+def generate_game_id(shard_index: int = 0, shard_count: int = 1) -> str:
+    # Код подбирается так, чтобы его хеш указывал на шард, создавший комнату.
     alphabet = string.ascii_uppercase + string.digits
-    return "".join(secrets.choice(alphabet) for _ in range(6))
+    while True:
+        game_id = "".join(secrets.choice(alphabet) for _ in range(6))
+        if shard_count <= 1 or shard_for_game_id(game_id, shard_count) == shard_index:
+            return game_id
 
 
-def build_deck() -> List[Dict[str, str]]:
-    deck = [{"suit": suit, "rank": rank} for suit in SUITS for rank in RANKS]
-    random.shuffle(deck)
+def generate_seed() -> int:
+    return secrets.randbits(63)
+
+
+def build_deck(seed: int, deal: int) -> List[int]:
+    # Колода зависит только от зерна комнаты и номера раздачи — это
+    # позволяет воспроизвести партию по журналу действий.
+    deck = list(range(DECK_SIZE))
+    random.Random(seed * 1000003 + deal).shuffle(deck)
     return deck
 
 
-def beats(defense: Dict[str, str], attack: Dict[str, str], trump_suit: str) -> bool:
-    if defense["suit"] == attack["suit"]:
-        return RANK_VALUE[defense["rank"]] > RANK_VALUE[attack["rank"]]
-    if defense["suit"] == trump_suit and attack["suit"] != trump_suit:
-        return True
-    return False
+def beats(defense: int, attack: int, trump_suit: int) -> bool:
+    return bool(BEATS[trump_suit][defense] >> attack & 1)
+
+
+def iter_cards(mask: int) -> Iterator[int]:
+    while mask:
+        low = mask & -mask
+        yield low.bit_length() - 1
+        mask ^= low
+
+
+def lowest_card(mask: int) -> int:
+    return (mask & -mask).bit_length() - 1
+
+
+def card_to_json(card: Optional[int]) -> Optional[Dict[str, str]]:
+    if card is None:
+        return None
+    return CARD_JSON[card]
+
+
+def mask_to_json(mask: int) -> List[Dict[str, str]]:
+    return [CARD_JSON[card] for card in iter_cards(mask)]
+
+
+def card_from_json(data: Any) -> int:
+    if not isinstance(data, dict):
+        raise ValueError("Укажите карту.")
+    suit, rank = data.get("suit"), data.get("rank")
+    card = CARD_IDS.get((suit, rank)) if isinstance(suit, str) and isinstance(rank, str) else None
+    if card is None:
+        raise ValueError("Неизвестная карта.")
+    return card
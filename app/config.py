@@ -0,0 +1,118 @@
+from __future__ import annotations
+
+import os
+from typing import Tuple
+
+
+def _env_int(name: str, default: int) -> int:
+    return int(os.environ.get(name, default))
+
+
+def _env_float(name: str, default: float) -> float:
+    return float(os.environ.get(name, default))
+
+
+def _env_rate(name: str, rate: float, burst: float) -> Tuple[float, float]:
+    # Формат "скорость:запас", например "10:20" — 10 в секунду, всплеск до 20.
+    value = os.environ.get(name)
+    if not value:
+        return rate, burst
+    rate_part, _, burst_part = value.partition(":")
+    return float(rate_part), float(burst_part or rate_part)
+
+
+# Сколько версий состояния клиент может не подтвердить, прежде чем
+# вместо патча ему снова отправят полный снимок.
+MAX_PATCH_LAG = _env_int("DURAK_MAX_PATCH_LAG", 20)
+
+# Таймаут записи в один сокет: медленный клиент отключается, не задерживая комнату.
+SEND_TIMEOUT = _env_float("DURAK_SEND_TIMEOUT", 5.0)
+
+# Возобновление сессии: сколько последних кадров состояния хранится для
+# каждого игрока и сколько секунд после обрыва игрок считается в сети
+# и может продолжить с места обрыва без полного снимка (0 — выключено).
+OUTBOX_SIZE = _env_int("DURAK_OUTBOX_SIZE", 32)
+RESUME_GRACE = _env_float("DURAK_RESUME_GRACE", 15.0)
+
+# Сколько зрителей может смотреть одну комнату.
+MAX_SPECTATORS = _env_int("DURAK_MAX_SPECTATORS", 500)
+
+# Сколько последних сообщений чата хранит комната (кольцевой буфер).
+CHAT_HISTORY = _env_int("DURAK_CHAT_HISTORY", 200)
+
+# Склейка рассылок: если больше нуля, изменения комнаты копятся и уходят
+# клиентам не чаще одного раза за столько секунд (например, 0.025–0.05).
+BROADCAST_INTERVAL = _env_float("DURAK_BROADCAST_INTERVAL", 0.0)
+
+# Входящий поток одного соединения: максимальный размер кадра (байт),
+# длина очереди необработанных сообщений и ведра токенов по группам действий.
+MAX_FRAME_BYTES = _env_int("DURAK_MAX_FRAME_BYTES", 8192)
+INBOUND_QUEUE_SIZE = _env_int("DURAK_INBOUND_QUEUE_SIZE", 16)
+RATE_LIMITS = {
+    "total": _env_rate("DURAK_RATE_TOTAL", 30, 60),
+    "game": _env_rate("DURAK_RATE_GAME", 10, 20),
+    "send_chat": _env_rate("DURAK_RATE_CHAT", 1, 5),
+    "sync": _env_rate("DURAK_RATE_SYNC", 1, 5),
+    "chat_history": _env_rate("DURAK_RATE_CHAT_HISTORY", 1, 5),
+    "ack": _env_rate("DURAK_RATE_ACK", 60, 120),
+    # Честный клиент отвечает на пинг раз в HEARTBEAT_INTERVAL секунд.
+    "pong": _env_rate("DURAK_RATE_PONG", 1, 3),
+}
+
+# Статика отдаётся из памяти в сжатом виде; 0 — читать файлы с диска
+# при каждом запросе (удобно при правке фронтенда без перезапуска).
+STATIC_CACHE = _env_int("DURAK_STATIC_CACHE", 1)
+
+# Профилирование (по умолчанию выключено): доля действий под cProfile,
+# порог медленного действия в секундах для записи в лог, глубина стека
+# tracemalloc при запуске. Админские /admin/* доступны только с DURAK_ADMIN_TOKEN.
+PROFILE_SAMPLE_RATE = _env_float("DURAK_PROFILE_SAMPLE_RATE", 0.0)
+SLOW_ACTION_THRESHOLD = _env_float("DURAK_SLOW_ACTION_THRESHOLD", 0.0)
+TRACEMALLOC_FRAMES = _env_int("DURAK_TRACEMALLOC_FRAMES", 0)
+ADMIN_TOKEN = os.environ.get("DURAK_ADMIN_TOKEN", "")
+
+# Реестр комнат: жёсткий лимит и сроки жизни неактивных комнат (в секундах).
+MAX_ROOMS = _env_int("DURAK_MAX_ROOMS", 10000)
+ROOM_IDLE_TTL = _env_float("DURAK_ROOM_IDLE_TTL", 2 * 60 * 60)
+ROOM_ABANDONED_TTL = _env_float("DURAK_ROOM_ABANDONED_TTL", 10 * 60)
+ROOM_SWEEP_INTERVAL = _env_float("DURAK_ROOM_SWEEP_INTERVAL", 30)
+# Сколько секунд отключённый игрок держит место в лобби; 0 — не освобождать.
+# Без срока брошенные лобби так и остаются в каталоге и быстром поиске.
+LOBBY_SEAT_TTL = _env_float("DURAK_LOBBY_SEAT_TTL", 60.0)
+
+# Пинг от сервера раз в HEARTBEAT_INTERVAL секунд (0 — выключен); сокет,
+# от которого ничего не приходило дольше HEARTBEAT_TIMEOUT, закрывается.
+HEARTBEAT_INTERVAL = _env_float("DURAK_HEARTBEAT_INTERVAL", 20.0)
+HEARTBEAT_TIMEOUT = _env_float("DURAK_HEARTBEAT_TIMEOUT", 45.0)
+
+# Сроки хода в секундах (0 — без ограничения). Защитник, не отбившийся за
+# DEFEND_TIMEOUT, берёт карты; атакующие, молчащие ATTACK_TIMEOUT, пасуют,
+# а на пустой стол атакующий заходит младшей картой.
+DEFEND_TIMEOUT = _env_float("DURAK_DEFEND_TIMEOUT", 0.0)
+ATTACK_TIMEOUT = _env_float("DURAK_ATTACK_TIMEOUT", 0.0)
+
+# Каталог публичных лобби: размер комнаты, которую создаёт быстрая игра,
+# если подходящей нет, и размер страницы списка по умолчанию.
+QUICK_MATCH_PLAYERS = _env_int("DURAK_QUICK_MATCH_PLAYERS", 4)
+LOBBY_PAGE_SIZE = _env_int("DURAK_LOBBY_PAGE_SIZE", 20)
+
+# Хранилище комнат: "memory" (по умолчанию) или "sqlite" с отложенной записью.
+STORAGE_BACKEND = os.environ.get("DURAK_STORAGE", "memory")
+SQLITE_PATH = os.environ.get("DURAK_SQLITE_PATH", "durak.sqlite3")
+PERSIST_DELAY = _env_float("DURAK_PERSIST_DELAY", 0.5)
+
+# Номер шарда этого процесса и их общее число (см. run_sharded.py).
+SHARD_INDEX = _env_int("DURAK_SHARD_INDEX", 0)
+SHARD_COUNT = _env_int("DURAK_SHARD_COUNT", 1)
+
+# Сверять инкрементальные индексы состояния с полным пересчётом после
+# каждого хода (медленно; для самоигры и отладки).
+CHECK_INDEXES = os.environ.get("DURAK_CHECK_INDEXES", "") == "1"
+
+# Боты: процессы для поиска ходов, бюджет времени на ход (с) и предел
+# числа случайных раскладок — больше бюджет, сильнее и дороже бот.
+BOT_WORKERS = _env_int("DURAK_BOT_WORKERS", os.cpu_count() or 1)
+BOT_MOVE_BUDGET = _env_float("DURAK_BOT_MOVE_BUDGET", 0.5)
+BOT_MAX_DETERMINIZATIONS = _env_int("DURAK_BOT_MAX_DETERMINIZATIONS", 200)
+BOT_ROLLOUT_STEPS = _env_int("DURAK_BOT_ROLLOUT_STEPS", 400)
+BOT_MOVE_DELAY = _env_float("DURAK_BOT_MOVE_DELAY", 0.6)
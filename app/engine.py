@@ -0,0 +1,590 @@
+from __future__ import annotations
+
+import secrets
+from typing import TYPE_CHECKING, Any, Dict, List, NamedTuple, Optional, Tuple
+
+from .action_log import (
+    NO_ARG,
+    OP_ATTACK,
+    OP_CANCEL_REMATCH,
+    OP_DEFEND,
+    OP_LEAVE,
+    OP_PASS,
+    OP_REMATCH,
+    OP_START,
+    OP_SURRENDER,
+    OP_TAKE,
+)
+from .cards import (
+    BEATEN_BY,
+    MAX_ATTACKS,
+    SUIT_MASKS,
+    THROW_MASKS,
+    beats,
+    build_deck,
+    card_from_json,
+    card_rank,
+    card_suit,
+    iter_cards,
+    lowest_card,
+)
+from .config import CHECK_INDEXES
+from .models import (
+    GameState,
+    PlayerState,
+    check_indexes,
+    cleanup_finished_players,
+    clear_table,
+    ensure_current_roles,
+    next_active_index,
+    rebuild_indexes,
+    recalc_attack_limit,
+    refill_hands,
+    reset_players,
+    table_add_attack,
+    table_add_defense,
+)
+
+if TYPE_CHECKING:
+    from fastapi import WebSocket
+
+
+class Action(NamedTuple):
+    # Тот же формат, что и запись журнала: код, место игрока, карта, аргумент.
+    op: int
+    seat: int
+    card: int = NO_ARG
+    arg: int = NO_ARG
+
+
+def lowest_trump_player(players: List[PlayerState], trump_suit: int) -> int:
+    best_index = 0
+    best_value: Optional[int] = None
+    for idx, player in enumerate(players):
+        trumps = player.hand & SUIT_MASKS[trump_suit]
+        if trumps:
+            value = card_rank(lowest_card(trumps))
+            if best_value is None or value < best_value:
+                best_value = value
+                best_index = idx
+    return best_index
+
+
+def add_chat_message(game: GameState, player: PlayerState, text: str) -> Dict[str, Any]:
+    game.chat_seq += 1
+    message = {
+        "seq": game.chat_seq,
+        "playerId": player.id,
+        "playerName": player.name,
+        "text": text,
+    }
+    game.chat.append(message)
+    return message
+
+
+def handle_surrender(game: GameState, player: PlayerState) -> None:
+    if game.phase != "playing":
+        raise ValueError("Сдаваться можно только во время партии.")
+    if game.active_count > 2:
+        raise ValueError("Сдаваться можно только когда остались два игрока.")
+    game.phase = "ended"
+    game.surrendered_player = player.id
+    game.loser_id = player.id
+    opponent = next(
+        (pl for pl in game.players if not pl.is_out and pl.id != player.id), None
+    )
+    game.winner_id = opponent.id if opponent else None
+    game.status_message = (
+        f"{player.name} с позором сдался и убежал, поджав хвост."
+    )
+    game.rematch_votes.clear()
+    reset_players(game)
+    game.attack_passed.clear()
+    game.allow_throw_ins = False
+
+
+def build_available_actions(game: GameState, player_id: str) -> Dict[str, Any]:
+    return seat_available_actions(game, game.seat_of.get(player_id))
+
+
+def seat_available_actions(game: GameState, seat: Optional[int]) -> Dict[str, Any]:
+    # Все проверки — по индексам состояния, без обхода стола и рук.
+    actions: Dict[str, Any] = {
+        "canStart": False,
+        "canAttack": False,
+        "canThrow": False,
+        "canPass": False,
+        "canDefend": False,
+        "canTake": False,
+        "canSurrender": False,
+    }
+    if seat is None or not game.is_active(seat):
+        return actions
+    player = game.players[seat]
+    if game.phase == "lobby" and player.id == game.host_id:
+        actions["canStart"] = len(game.players) >= 2 or game.fill_with_bots
+        return actions
+    if game.phase != "playing" or game.attacker_index is None or game.defender_index is None:
+        return actions
+    is_defender = seat == game.defender_index
+    pending_defense = game.undefended > 0
+    max_attacks = max(1, game.attack_limit or MAX_ATTACKS)
+    if not is_defender and not player.hand:
+        return actions
+    if seat == game.attacker_index and len(game.table) < max_attacks:
+        if not game.table:
+            actions["canAttack"] = True
+        else:
+            actions["canThrow"] = bool(player.hand & THROW_MASKS[game.table_ranks])
+    elif (
+        not is_defender
+        and game.allow_throw_ins
+        and len(game.table) < max_attacks
+    ):
+        actions["canThrow"] = bool(player.hand & THROW_MASKS[game.table_ranks])
+    if not is_defender:
+        actions["canPass"] = bool(game.table) and not pending_defense
+    if is_defender:
+        actions["canDefend"] = pending_defense
+        actions["canTake"] = bool(game.table)
+    if game.active_count <= 2:
+        actions["canSurrender"] = True
+    return actions
+
+
+def handle_start_game(game: GameState, player: PlayerState) -> None:
+    if player.id != game.host_id:
+        raise ValueError("Только создатель может начать игру.")
+    if len(game.players) < 2:
+        raise ValueError("Нужно минимум два игрока.")
+    if game.phase != "lobby":
+        raise ValueError("Игра уже началась.")
+    game.phase = "playing"
+    game.deals += 1
+    game.deck = build_deck(game.seed, game.deals)
+    game.trump_card = game.deck[-1]
+    for _ in range(6):
+        for pl in game.players:
+            pl.add_card(game.deck.pop())
+    lowest_idx = lowest_trump_player(game.players, card_suit(game.trump_card))
+    game.attacker_index = lowest_idx
+    game.defender_index = next_active_index(game, lowest_idx)
+    if game.defender_index is None:
+        game.defender_index = 0
+    recalc_attack_limit(game)
+    clear_table(game)
+    game.discard = 0
+    game.rematch_votes.clear()
+    game.winner_id = None
+    game.loser_id = None
+    game.surrendered_player = None
+    game.status_message = f"Атакует {game.players[game.attacker_index].name}"
+    game.allow_throw_ins = False
+    game.attack_passed.clear()
+
+
+def add_player(
+    game: GameState, player_id: str, name: str, websocket: Optional[WebSocket] = None
+) -> PlayerState:
+    player = PlayerState(player_id, name, websocket)
+    game.seat_player(player)
+    if not game.host_id:
+        game.host_id = player_id
+    game.action_log.record_join(player_id, name)
+    return player
+
+
+def remove_lobby_player(game: GameState, seat: int) -> None:
+    # Освобождает место в лобби; места остальных сдвигаются, поэтому индексы
+    # пересчитываются целиком, а в журнал попадает OP_LEAVE для реплея.
+    if game.phase != "lobby":
+        raise ValueError("Убрать игрока можно только в лобби.")
+    player = game.players.pop(seat)
+    rebuild_indexes(game)
+    game.rematch_votes.discard(player.id)
+    if game.host_id == player.id:
+        game.host_id = next((pl.id for pl in game.players if not pl.is_bot), None)
+
+
+def fill_bot_seats(game: GameState) -> None:
+    bots = sum(1 for player in game.players if player.is_bot)
+    while len(game.players) < game.max_players:
+        bots += 1
+        # id случайный, как у людей: по нему входят в комнату через join.
+        player = add_player(game, secrets.token_hex(4), f"Бот {bots}")
+        player.is_bot = True
+
+
+def reset_to_lobby(game: GameState) -> None:
+    game.phase = "lobby"
+    game.deck = []
+    clear_table(game)
+    game.discard = 0
+    game.rematch_votes.clear()
+    game.loser_id = None
+    game.winner_id = None
+    game.attack_limit = MAX_ATTACKS
+    game.surrendered_player = None
+    game.status_message = "Игра завершена. Создайте новую партию или дождитесь игроков."
+    game.trump_card = None
+    reset_players(game)
+    game.attacker_index = None
+    game.defender_index = None
+
+
+def restart_game(game: GameState) -> None:
+    game.phase = "playing"
+    game.deals += 1
+    game.deck = build_deck(game.seed, game.deals)
+    game.discard = 0
+    clear_table(game)
+    game.rematch_votes.clear()
+    game.winner_id = None
+    game.loser_id = None
+    game.attack_limit = MAX_ATTACKS
+    game.surrendered_player = None
+    game.trump_card = game.deck[-1]
+    reset_players(game)
+    for _ in range(6):
+        for pl in game.players:
+            pl.add_card(game.deck.pop())
+            if not game.deck:
+                break
+        if not game.deck:
+            break
+    lowest_idx = lowest_trump_player(game.players, card_suit(game.trump_card))
+    game.attacker_index = lowest_idx
+    game.defender_index = next_active_index(game, lowest_idx)
+    if game.defender_index is None:
+        game.defender_index = 0
+    recalc_attack_limit(game)
+    game.status_message = f"Атакует {game.players[game.attacker_index].name}"
+
+
+def validate_attack_card(game: GameState, player: PlayerState, card: int) -> None:
+    if game.attacker_index is None or game.defender_index is None:
+        raise ValueError("Сейчас нельзя атаковать.")
+    max_attacks = max(1, game.attack_limit or MAX_ATTACKS)
+    if len(game.table) >= max_attacks:
+        raise ValueError("Нельзя подкидывать больше карт.")
+    if not player.has_card(card):
+        raise ValueError("У вас нет такой карты.")
+    if not game.table:
+        if player.id != game.players[game.attacker_index].id:
+            raise ValueError("Первым ходит назначенный атакующий.")
+        return
+    if not game.table_ranks >> card_rank(card) & 1:
+        raise ValueError("Можно подкидывать только имеющиеся ранги.")
+    if player.id != game.players[game.attacker_index].id and not game.allow_throw_ins:
+        raise ValueError("Ждите пока защитник побьёт первую карту.")
+
+
+def validate_defense_card(
+    game: GameState, player: PlayerState, attack_index: int, card: int
+) -> None:
+    if game.defender_index is None:
+        raise ValueError("Нет защитника.")
+    if player.id != game.players[game.defender_index].id:
+        raise ValueError("Сейчас ход защиты у другого игрока.")
+    if attack_index < 0 or attack_index >= len(game.table):
+        raise ValueError("Нет такой карты на столе.")
+    slot = game.table[attack_index]
+    if slot.defense is not None:
+        raise ValueError("Эта карта уже побита.")
+    if not player.has_card(card):
+        raise ValueError("У вас нет этой карты.")
+    if game.trump_suit is None or not beats(card, slot.attack, game.trump_suit):
+        raise ValueError("Карта не бьёт атаку.")
+
+
+def remove_card_from_hand(player: PlayerState, card: int) -> int:
+    if not player.has_card(card):
+        raise ValueError("Карта не найдена.")
+    player.remove_card(card)
+    return card
+
+
+def finish_successful_round(game: GameState) -> None:
+    game.discard |= clear_table(game)
+    game.attack_passed.clear()
+    game.allow_throw_ins = False
+    if game.attacker_index is None or game.defender_index is None:
+        return
+    game.status_message = (
+        f"{game.players[game.defender_index].name} отбился и теперь атакует."
+    )
+    game.attacker_index = game.defender_index
+    game.defender_index = next_active_index(game, game.attacker_index)
+    if game.defender_index is None:
+        game.defender_index = game.attacker_index
+    refill_hands(game, game.attacker_index)
+    cleanup_finished_players(game)
+    ensure_current_roles(game)
+    recalc_attack_limit(game)
+    check_for_game_end(game)
+
+
+def defender_take_cards(game: GameState) -> None:
+    if game.defender_index is None or not game.table:
+        raise ValueError("Нечего брать.")
+    defender = game.players[game.defender_index]
+    defender.hand |= clear_table(game)
+    game.attack_passed.clear()
+    game.allow_throw_ins = False
+    prev_attacker = game.attacker_index if game.attacker_index is not None else 0
+    attacker_name = game.players[prev_attacker].name if game.players else "Атакующий"
+    game.status_message = (
+        f"{defender.name} взял карты. Атакует {attacker_name}."
+    )
+    refill_hands(game, prev_attacker)
+    cleanup_finished_players(game)
+    game.defender_index = next_active_index(game, prev_attacker)
+    ensure_current_roles(game)
+    recalc_attack_limit(game)
+    check_for_game_end(game)
+
+
+def handle_attack_pass(game: GameState, player: PlayerState) -> None:
+    if not game.table:
+        raise ValueError("Нельзя пасовать до первой атаки.")
+    if game.defender_index is None:
+        raise ValueError("Нет защитника.")
+    if player.id == game.players[game.defender_index].id:
+        raise ValueError("Защитник не пасует.")
+    if game.undefended:
+        raise ValueError("Сначала дождитесь защиты карт.")
+    game.attack_passed.add(player.id)
+    attackers = game.active_seats & ~(1 << game.defender_index)
+    if all(
+        pl.id in game.attack_passed or not pl.hand
+        for idx, pl in enumerate(game.players)
+        if attackers >> idx & 1
+    ):
+        finish_successful_round(game)
+
+
+def check_for_game_end(game: GameState) -> None:
+    if game.active_count <= 1 and game.phase == "playing":
+        game.phase = "ended"
+        if game.active_seats:
+            loser = game.players[game.active_seats.bit_length() - 1]
+            game.loser_id = loser.id
+            game.status_message = f"{loser.name} остался в дураках."
+            winners = [pl for pl in game.players if pl.id != loser.id]
+            game.winner_id = winners[0].id if winners else None
+        else:
+            game.status_message = "Игра завершена."
+            finished = [pl for pl in game.players if not pl.hand]
+            game.winner_id = finished[0].id if finished else None
+        game.rematch_votes.clear()
+
+
+def play_attack_card(game: GameState, player: PlayerState, card: int) -> None:
+    validate_attack_card(game, player, card)
+    removed = remove_card_from_hand(player, card)
+    is_first_card = not game.table
+    table_add_attack(game, removed, player.id)
+    game.attack_passed.clear()
+    if is_first_card:
+        game.allow_throw_ins = False
+    if game.allow_throw_ins is False and len(game.table) == 1:
+        game.status_message = f"{game.players[game.defender_index].name} отбивается."
+
+
+def play_defense_card(game: GameState, player: PlayerState, attack_index: int, card: int) -> None:
+    validate_defense_card(game, player, attack_index, card)
+    removed = remove_card_from_hand(player, card)
+    table_add_defense(game, attack_index, removed)
+    if not game.allow_throw_ins:
+        game.allow_throw_ins = True
+    if all(slot.defense is not None for slot in game.table):
+        game.status_message = f"{game.players[game.defender_index].name} решает подкидывать или пасовать."
+
+
+def apply_op(game: GameState, seat: int, op: int, card: int = NO_ARG, arg: int = NO_ARG) -> None:
+    # Единственная точка применения правил: сервер, реплей и самоигра идут
+    # через неё, а все принятые ходы попадают в журнал.
+    player = game.players[seat]
+    if op == OP_START:
+        handle_start_game(game, player)
+    elif op == OP_REMATCH or op == OP_CANCEL_REMATCH:
+        if game.phase != "ended":
+            raise ValueError("Повторное приглашение доступно после завершения партии.")
+        if op == OP_REMATCH:
+            game.rematch_votes.add(player.id)
+            if len(game.rematch_votes) == len(game.players):
+                restart_game(game)
+        else:
+            reset_to_lobby(game)
+    elif op == OP_SURRENDER:
+        handle_surrender(game, player)
+    elif op == OP_LEAVE:
+        remove_lobby_player(game, seat)
+    elif game.phase != "playing":
+        raise ValueError("Игра ещё не началась.")
+    elif op == OP_ATTACK:
+        play_attack_card(game, player, card)
+    elif op == OP_DEFEND:
+        play_defense_card(game, player, arg, card)
+    elif op == OP_PASS:
+        handle_attack_pass(game, player)
+    elif op == OP_TAKE:
+        defender_take_cards(game)
+    else:
+        raise ValueError("Неизвестное действие.")
+    game.action_log.record(op, seat, card, arg)
+    if CHECK_INDEXES:
+        check_indexes(game)
+
+
+ACTION_OPS = {
+    "start_game": OP_START,
+    "request_rematch": OP_REMATCH,
+    "cancel_rematch": OP_CANCEL_REMATCH,
+    "surrender": OP_SURRENDER,
+    "play_attack": OP_ATTACK,
+    "play_defense": OP_DEFEND,
+    "pass_attack": OP_PASS,
+    "take_cards": OP_TAKE,
+}
+
+
+def apply_action(
+    action: str, data: Dict[str, Any], game: GameState, player: PlayerState
+) -> None:
+    op = ACTION_OPS.get(action)
+    if op is None:
+        if game.phase != "playing":
+            raise ValueError("Игра ещё не началась.")
+        raise ValueError("Неизвестное действие.")
+    seat = game.players.index(player)
+    if op == OP_START and game.fill_with_bots and game.phase == "lobby" and player.id == game.host_id:
+        fill_bot_seats(game)
+    if op in (OP_ATTACK, OP_DEFEND) and game.phase != "playing":
+        raise ValueError("Игра ещё не началась.")
+    if op == OP_ATTACK:
+        apply_op(game, seat, op, card_from_json(data.get("card")))
+    elif op == OP_DEFEND:
+        attack_index = data.get("attackIndex")
+        if not isinstance(data.get("card"), dict) or not isinstance(attack_index, int):
+            raise ValueError("Нужны карта и номер атаки.")
+        apply_op(game, seat, op, card_from_json(data.get("card")), attack_index)
+    else:
+        apply_op(game, seat, op)
+
+
+def legal_actions(game: GameState, seat: Optional[int] = None) -> List[Action]:
+    seats = range(len(game.players)) if seat is None else [seat]
+    actions: List[Action] = []
+    if game.phase == "lobby":
+        for idx in seats:
+            if game.players[idx].id == game.host_id and len(game.players) >= 2:
+                actions.append(Action(OP_START, idx))
+        return actions
+    if game.phase == "ended":
+        for idx in seats:
+            if game.players[idx].id not in game.rematch_votes:
+                actions.append(Action(OP_REMATCH, idx))
+            actions.append(Action(OP_CANCEL_REMATCH, idx))
+        return actions
+    if game.phase != "playing" or game.attacker_index is None or game.defender_index is None:
+        return actions
+    trump = game.trump_suit
+    for idx in seats:
+        player = game.players[idx]
+        available = seat_available_actions(game, idx)
+        if available["canAttack"]:
+            cards = player.hand
+        elif available["canThrow"]:
+            cards = player.hand & THROW_MASKS[game.table_ranks]
+        else:
+            cards = 0
+        for card in iter_cards(cards):
+            actions.append(Action(OP_ATTACK, idx, card))
+        if available["canDefend"]:
+            for slot_index, slot in enumerate(game.table):
+                if slot.defense is None:
+                    for card in iter_cards(player.hand & BEATEN_BY[trump][slot.attack]):
+                        actions.append(Action(OP_DEFEND, idx, card, slot_index))
+        if available["canPass"]:
+            actions.append(Action(OP_PASS, idx))
+        if available["canTake"]:
+            actions.append(Action(OP_TAKE, idx))
+        if available["canSurrender"]:
+            actions.append(Action(OP_SURRENDER, idx))
+    return actions
+
+
+TIMEOUT_DEFEND = "defend"
+TIMEOUT_ATTACK = "attack"
+
+
+def stalled_turn(game: GameState) -> Optional[str]:
+    # Кого ждёт стол: защитника, пока есть неотбитые карты, иначе атакующих.
+    if game.phase != "playing" or game.attacker_index is None or game.defender_index is None:
+        return None
+    return TIMEOUT_DEFEND if game.undefended else TIMEOUT_ATTACK
+
+
+def turn_key(game: GameState) -> Optional[Tuple[Any, ...]]:
+    # Чего именно ждёт стол: срок переносится, только когда это меняется,
+    # а не на каждое изменение комнаты (вход, переподключение, смена имени).
+    kind = stalled_turn(game)
+    if kind is None:
+        return None
+    return (
+        kind,
+        game.deals,
+        game.attacker_index,
+        game.defender_index,
+        len(game.table),
+        game.undefended,
+        frozenset(game.attack_passed),
+    )
+
+
+def apply_turn_timeout(game: GameState, kind: str) -> None:
+    # Ход за замешкавшегося игрока идёт через apply_op, как обычный, поэтому
+    # попадает в журнал и воспроизводится реплеем.
+    if kind == TIMEOUT_DEFEND:
+        apply_op(game, game.defender_index, OP_TAKE)
+        return
+    if not game.table:
+        # До первой атаки пасовать нельзя: заходим младшей картой, по возможности не козырем.
+        seat = game.attacker_index
+        hand = game.players[seat].hand
+        if hand:
+            plain = hand & ~SUIT_MASKS[game.trump_suit] if game.trump_suit is not None else hand
+            apply_op(game, seat, OP_ATTACK, lowest_card(plain or hand))
+        return
+    attackers = game.active_seats & ~(1 << game.defender_index)
+    for seat, player in enumerate(game.players):
+        if not attackers >> seat & 1 or not player.hand or player.id in game.attack_passed:
+            continue
+        apply_op(game, seat, OP_PASS)
+        if not game.table or game.phase != "playing":
+            break
+
+
+class DurakEngine:
+    # Синхронный движок без сокетов и блокировок — для самоигры, ботов и тестов.
+    def __init__(self, state: GameState):
+        self.state = state
+
+    @classmethod
+    def new_game(cls, player_count: int, seed: Optional[int] = None) -> DurakEngine:
+        state = GameState("SIM", player_count, seed=seed)
+        for idx in range(player_count):
+            add_player(state, f"p{idx}", f"Игрок {idx + 1}")
+        apply_op(state, 0, OP_START)
+        return cls(state)
+
+    @property
+    def is_over(self) -> bool:
+        return self.state.phase != "playing"
+
+    def legal_actions(self, seat: Optional[int] = None) -> List[Action]:
+        return legal_actions(self.state, seat)
+
+    def apply(self, action: Action) -> None:
+        apply_op(self.state, action.seat, action.op, action.card, action.arg)
@@ -1,104 +1,124 @@
 from __future__ import annotations
 
+import asyncio
+import json
+import logging
 import secrets
-from typing import Any, Dict, List, Optional
+import time
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Coroutine, Dict, List, Optional, Set, Tuple, Union
 
 from fastapi import HTTPException, WebSocket, WebSocketDisconnect
+from starlette.websockets import WebSocketState
 
-from .cards import MAX_ATTACKS, RANK_VALUE, beats, build_deck, generate_game_id
-from .models import (
-    GameState,
-    PlayerState,
-    cleanup_finished_players,
-    ensure_current_roles,
-    next_active_index,
-    recalc_attack_limit,
-    refill_hands,
+from .binary_protocol import (
+    SUBPROTOCOL,
+    decode_command,
+    encode_fields,
+    encode_patch_frame,
+    encode_state_frame,
 )
-from .schemas import CreateGameRequest
-from .storage import games
-
-
-def lowest_trump_player(players: List[PlayerState], trump_suit: str) -> int:
-    best_index = 0
-    best_value: Optional[int] = None
-    for idx, player in enumerate(players):
-        for card in player.hand:
-            if card["suit"] == trump_suit:
-                value = RANK_VALUE[card["rank"]]
-                if best_value is None or value < best_value:
-                    best_value = value
-                    best_index = idx
-    return best_index
-
-
-def ranks_on_table(game: GameState) -> set[str]:
-    ranks: set[str] = set()
-    for slot in game.table:
-        ranks.add(slot["attack"]["rank"])
-        if slot["defense"]:
-            ranks.add(slot["defense"]["rank"])
-    return ranks
-
-
-def add_chat_message(game: GameState, player: PlayerState, text: str) -> None:
-    game.chat_messages.append(
+from .bots import BotView, build_view, get_pool, next_bot_turn, search_move
+from .cards import card_to_json, generate_game_id, mask_to_json
+from .config import (
+    ATTACK_TIMEOUT,
+    BOT_MOVE_DELAY,
+    BROADCAST_INTERVAL,
+    DEFEND_TIMEOUT,
+    HEARTBEAT_INTERVAL,
+    HEARTBEAT_TIMEOUT,
+    INBOUND_QUEUE_SIZE,
+    LOBBY_PAGE_SIZE,
+    LOBBY_SEAT_TTL,
+    MAX_FRAME_BYTES,
+    MAX_PATCH_LAG,
+    MAX_SPECTATORS,
+    OUTBOX_SIZE,
+    QUICK_MATCH_PLAYERS,
+    RESUME_GRACE,
+    ROOM_ABANDONED_TTL,
+    ROOM_IDLE_TTL,
+    ROOM_SWEEP_INTERVAL,
+    SEND_TIMEOUT,
+    SHARD_COUNT,
+    SHARD_INDEX,
+)
+from .action_log import OP_LEAVE
+from .engine import (
+    ACTION_OPS,
+    TIMEOUT_ATTACK,
+    TIMEOUT_DEFEND,
+    Action,
+    add_chat_message,
+    add_player,
+    apply_action,
+    apply_op,
+    apply_turn_timeout,
+    build_available_actions,
+    stalled_turn,
+    turn_key,
+)
+from .metrics import clear_gauge, inc, observe, set_gauge
+from .models import GameState, PlayerState, Spectator
+from .profiling import report_slow_action, start_profile, stop_profile
+from .ratelimit import ConnectionLimiter
+from .schemas import CreateGameRequest, QuickMatchRequest
+from .storage import games, lobbies, store
+from .timers import DeadlineScheduler
+
+logger = logging.getLogger(__name__)
+
+# Цикл событий держит задачи слабыми ссылками: фоновые задачи без хозяина
+# живут здесь, пока не завершатся.
+background_tasks: Set[asyncio.Task] = set()
+
+
+def spawn(coro: Coroutine[Any, Any, None]) -> asyncio.Task:
+    task = asyncio.create_task(coro)
+    background_tasks.add(task)
+    task.add_done_callback(forget_task)
+    return task
+
+
+def forget_task(task: asyncio.Task) -> None:
+    background_tasks.discard(task)
+    if not task.cancelled() and task.exception() is not None:
+        logger.error("Background task failed", exc_info=task.exception())
+
+
+def serialize_table(game: GameState) -> List[Dict[str, Any]]:
+    return [
         {
-            "playerId": player.id,
-            "playerName": player.name,
-            "text": text,
+            "attack": card_to_json(slot.attack),
+            "defense": card_to_json(slot.defense),
+            "attackerId": slot.attacker_id,
         }
-    )
-    if len(game.chat_messages) > 200:
-        game.chat_messages = game.chat_messages[-200:]
-
-
-def handle_surrender(game: GameState, player: PlayerState) -> None:
-    if game.phase != "playing":
-        raise ValueError("Сдаваться можно только во время партии.")
-    active_players = [pl for pl in game.players if not pl.is_out]
-    if len(active_players) > 2:
-        raise ValueError("Сдаваться можно только когда остались два игрока.")
-    game.phase = "ended"
-    game.surrendered_player = player.id
-    game.loser_id = player.id
-    opponent = next((pl for pl in active_players if pl.id != player.id), None)
-    game.winner_id = opponent.id if opponent else None
-    game.status_message = (
-        f"{player.name} с позором сдался и убежал, поджав хвост."
-    )
-    game.rematch_votes.clear()
-    for pl in game.players:
-        pl.hand.clear()
-        pl.is_out = False
-    game.attack_passed.clear()
-    game.allow_throw_ins = False
+        for slot in game.table
+    ]
 
 
-def serialize_game_for_player(game: GameState, player_id: str) -> Dict[str, Any]:
-    player = game.find_player(player_id)
-    you_cards = player.hand if player else []
+def serialize_public_state(game: GameState) -> Dict[str, Any]:
     serialized_players = []
     for pl in game.players:
         entry = {
             "id": pl.id,
             "name": pl.name,
-            "hand": you_cards if pl.id == player_id else [],
-            "handSize": len(pl.hand),
+            "handSize": pl.hand_size,
             "isHost": pl.id == game.host_id,
             "isOut": pl.is_out,
             "connected": pl.connected,
+            "isBot": pl.is_bot,
         }
         serialized_players.append(entry)
-    payload = {
+    return {
         "id": game.id,
         "phase": game.phase,
         "maxPlayers": game.max_players,
         "players": serialized_players,
         "deckCount": len(game.deck),
-        "discardCount": len(game.discard),
-        "trumpCard": game.trump_card,
-        "table": game.table,
+        "discardCount": game.discard.bit_count(),
+        "trumpCard": card_to_json(game.trump_card),
+        "table": serialize_table(game),
         "status": game.status_message,
         "attackerId": game.players[game.attacker_index].id
         if game.attacker_index is not None
@@ -110,83 +130,599 @@ def serialize_game_for_player(game: GameState, player_id: str) -> Dict[str, Any]
         "loserId": game.loser_id,
         "winnerId": game.winner_id,
         "rematchVotes": list(game.rematch_votes),
-        "chat": game.chat_messages[-120:],
         "surrenderedPlayer": game.surrendered_player,
     }
-    payload["availableActions"] = build_available_actions(game, player_id)
-    return payload
 
 
-def build_available_actions(game: GameState, player_id: str) -> Dict[str, Any]:
-    actions: Dict[str, Any] = {
-        "canStart": False,
-        "canAttack": False,
-        "canThrow": False,
-        "canPass": False,
-        "canDefend": False,
-        "canTake": False,
-        "canSurrender": False,
-    }
+def serialize_private_state(game: GameState, player_id: str) -> Dict[str, Any]:
     player = game.find_player(player_id)
-    if not player or player.is_out:
-        return actions
-    if game.phase == "lobby" and player.id == game.host_id:
-        actions["canStart"] = len(game.players) >= 2
-        return actions
-    if game.phase != "playing" or game.attacker_index is None or game.defender_index is None:
-        return actions
-    attacker = game.players[game.attacker_index]
-    defender = game.players[game.defender_index]
-    pending_defense = any(slot["defense"] is None for slot in game.table)
-    max_attacks = max(1, game.attack_limit or MAX_ATTACKS)
-    if player.id != defender.id and not player.hand:
-        return actions
-    if player.id == attacker.id and len(game.table) < max_attacks:
-        if not game.table:
-            actions["canAttack"] = True
-        else:
-            ranks = ranks_on_table(game)
-            if ranks:
-                available = any(card["rank"] in ranks for card in player.hand)
-                actions["canThrow"] = available
-    elif (
-        player.id != defender.id
-        and game.allow_throw_ins
-        and len(game.table) < max_attacks
-    ):
-        ranks = ranks_on_table(game)
-        if ranks:
-            can_throw = any(card["rank"] in ranks for card in player.hand)
-            actions["canThrow"] = can_throw
-    if player.id != defender.id:
-        actions["canPass"] = bool(game.table) and not pending_defense
-    if player.id == defender.id:
-        actions["canDefend"] = pending_defense
-        actions["canTake"] = bool(game.table)
-    active_players = [pl for pl in game.players if not pl.is_out]
-    if len(active_players) <= 2 and player.id in {pl.id for pl in active_players}:
-        actions["canSurrender"] = True
-    return actions
+    return {
+        "hand": mask_to_json(player.hand) if player else [],
+        "availableActions": build_available_actions(game, player_id),
+    }
 
 
-async def broadcast_state(game: GameState) -> None:
+def serialize_game_for_player(game: GameState, player_id: str) -> Dict[str, Any]:
+    payload = serialize_public_state(game)
+    payload.update(serialize_private_state(game, player_id))
+    return payload
+
+
+def diff_state(old: Dict[str, Any], new: Dict[str, Any]) -> Dict[str, Any]:
+    return {key: value for key, value in new.items() if old.get(key) != value}
+
+
+def encode_message(message: Dict[str, Any]) -> str:
+    return json.dumps(message, ensure_ascii=False, separators=(",", ":"))
+
+
+def merge_encoded(first: str, second: str) -> str:
+    # Склеивает два закодированных JSON-объекта без повторного кодирования.
+    if first == "{}":
+        return second
+    if second == "{}":
+        return first
+    return first[:-1] + "," + second[1:]
+
+
+def get_public_state(game: GameState) -> Tuple[Dict[str, Any], str]:
+    if game.public_cache_version == game.version and game.public_state is not None:
+        inc("public_state_cache_hits")
+        return game.public_state, game.public_json
+    inc("public_state_cache_misses")
+    game.public_state = serialize_public_state(game)
+    game.public_json = encode_message(game.public_state)
+    game.public_cache_version = game.version
+    game.public_patches.clear()
+    game.public_binary = None
+    game.public_binary_patches.clear()
+    return game.public_state, game.public_json
+
+
+def get_public_patch(game: GameState, base_version: int, base: Dict[str, Any]) -> str:
+    patch = game.public_patches.get(base_version)
+    if patch is not None:
+        inc("public_patch_cache_hits")
+        return patch
+    inc("public_patch_cache_misses")
+    public, _ = get_public_state(game)
+    patch = encode_message(diff_state(base, public))
+    game.public_patches[base_version] = patch
+    return patch
+
+
+def get_public_binary(game: GameState) -> Tuple[int, bytes]:
+    # Двоичная форма кешируется так же, как JSON: одна на версию и одна
+    # на каждую базовую версию патча, сколько бы клиентов её ни получало.
+    public, _ = get_public_state(game)
+    if game.public_binary is None:
+        game.public_binary = encode_fields(public, game.seat_of)
+    return game.public_binary
+
+
+def get_public_binary_patch(
+    game: GameState, base_version: int, base: Dict[str, Any]
+) -> Tuple[int, bytes]:
+    patch = game.public_binary_patches.get(base_version)
+    if patch is None:
+        public, _ = get_public_state(game)
+        patch = encode_fields(diff_state(base, public), game.seat_of)
+        game.public_binary_patches[base_version] = patch
+    return patch
+
+
+Message = Union[str, bytes]
+
+
+def build_binary_message(
+    game: GameState, player: PlayerState, private: Dict[str, Any], full: bool, seq: int
+) -> Optional[bytes]:
+    if full:
+        return encode_state_frame(
+            seq, game.version, get_public_binary(game), encode_fields(private, game.seat_of)
+        )
+    public_patch = get_public_binary_patch(game, player.sent_version, player.sent_public)
+    private_patch = encode_fields(diff_state(player.sent_private, private), game.seat_of)
+    if not public_patch[0] and not private_patch[0]:
+        return None
+    return encode_patch_frame(seq, game.version, player.sent_version, public_patch, private_patch)
+
+
+def build_state_message(game: GameState, player: PlayerState) -> Optional[Message]:
+    public, public_json = get_public_state(game)
+    private = serialize_private_state(game, player.id)
+    too_far_behind = (
+        player.sent_public is None
+        or player.sent_private is None
+        or player.sent_version is None
+        or game.version - player.acked_version > MAX_PATCH_LAG
+    )
+    if too_far_behind:
+        player.acked_version = game.version
+    seq = player.out_seq + 1
+    message: Optional[Message]
+    if player.binary:
+        message = build_binary_message(game, player, private, too_far_behind, seq)
+        if message is None:
+            return None
+    elif too_far_behind:
+        message = (
+            f'{{"type":"game_state","seq":{seq},"version":{game.version},"game":'
+            f"{merge_encoded(public_json, encode_message(private))}}}"
+        )
+    else:
+        changes = merge_encoded(
+            get_public_patch(game, player.sent_version, player.sent_public),
+            encode_message(diff_state(player.sent_private, private)),
+        )
+        if changes == "{}":
+            return None
+        message = (
+            f'{{"type":"game_patch","seq":{seq},"version":{game.version},'
+            f'"baseVersion":{player.sent_version},"changes":{changes}}}'
+        )
+    player.sent_version = game.version
+    player.sent_public = public
+    player.sent_private = private
+    player.out_seq = seq
+    player.outbox.append((seq, message))
+    return message
+
+
+Outgoing = List[Tuple[PlayerState, WebSocket, Message]]
+
+
+def spectator_message(game: GameState, binary: bool) -> Message:
+    # Зрители видят только публичную часть, поэтому кадр у них общий:
+    # он кодируется один раз на версию и протокол, а seq совпадает с версией.
+    cached = game.spectator_frames.get(binary)
+    if cached is not None and cached[0] == game.version:
+        return cached[1]
+    message: Message
+    if binary:
+        message = encode_state_frame(game.version, game.version, get_public_binary(game), (0, b""))
+    else:
+        _, public_json = get_public_state(game)
+        message = (
+            f'{{"type":"game_state","seq":{game.version},"version":{game.version},'
+            f'"game":{public_json}}}'
+        )
+    game.spectator_frames[binary] = (game.version, message)
+    return message
+
+
+def feed_spectators(game: GameState) -> None:
+    # Под блокировкой комнаты только подменяется последний кадр каждого
+    # зрителя; отправляют их отдельные задачи, и медленный зритель просто
+    # пропускает промежуточные версии, не задерживая игроков.
+    for spectator in game.spectators.values():
+        push_spectator_frame(game, spectator)
+
+
+def push_spectator_frame(game: GameState, spectator: Spectator) -> None:
+    if spectator.latest is not None:
+        inc("spectator_frames_skipped")
+    spectator.latest = spectator_message(game, spectator.binary)
+    spectator.wakeup.set()
+
+
+async def run_spectator_feed(game: GameState, spectator: Spectator) -> None:
+    websocket = spectator.websocket
+    try:
+        while True:
+            await spectator.wakeup.wait()
+            spectator.wakeup.clear()
+            message, spectator.latest = spectator.latest, None
+            if message is None:
+                continue
+            if isinstance(message, bytes):
+                await asyncio.wait_for(websocket.send_bytes(message), SEND_TIMEOUT)
+                size = len(message)
+            else:
+                await asyncio.wait_for(websocket.send_text(message), SEND_TIMEOUT)
+                size = len(message.encode())
+            inc("spectator_frames")
+            inc("spectator_bytes", size)
+    except asyncio.CancelledError:
+        raise
+    except Exception:
+        if game.spectators.pop(websocket, None) is not None:
+            inc("ws_dropped", reason="spectator_slow")
+        await close_quietly(websocket)
+
+
+@asynccontextmanager
+async def room_lock(game: GameState, operation: str) -> AsyncIterator[None]:
+    # Сколько ждали блокировку комнаты и сколько её держали — по операциям.
+    started = time.perf_counter()
+    async with game.lock:
+        acquired = time.perf_counter()
+        try:
+            yield
+        finally:
+            observe("room_lock_hold_seconds", time.perf_counter() - acquired, operation=operation)
+            observe("room_lock_wait_seconds", acquired - started, operation=operation)
+
+
+def prepare_broadcast(game: GameState) -> Outgoing:
+    # Вызывается под game.lock: фиксирует новую версию и собирает кадры,
+    # а отправка идёт уже после освобождения блокировки. В режиме склейки
+    # кадры соберёт flush_broadcast, а здесь комната лишь помечается.
+    game.version += 1
+    games.touch(game)
+    lobbies.update(game)
+    arm_turn_timer(game)
+    store.mark_dirty(game)
+    if BROADCAST_INTERVAL > 0:
+        schedule_flush(game)
+        return []
+    return build_outgoing(game)
+
+
+# Сроки ходов всех комнат в одной куче; срок переносится, когда стол
+# начинает ждать другого хода, а одна задача run_turn_timers снимает истёкшие.
+turn_timers = DeadlineScheduler()
+TURN_TIMEOUTS = {TIMEOUT_DEFEND: DEFEND_TIMEOUT, TIMEOUT_ATTACK: ATTACK_TIMEOUT}
+
+
+def arm_turn_timer(game: GameState) -> None:
+    key = turn_key(game)
+    if key == game.turn_key:
+        return
+    game.turn_key = key
+    timeout = TURN_TIMEOUTS.get(key[0], 0.0) if key else 0.0
+    if timeout > 0:
+        turn_timers.schedule(game.id, time.monotonic() + timeout)
+    else:
+        turn_timers.cancel(game.id)
+
+
+async def expire_turn(game: GameState, key: Tuple[Any, ...]) -> None:
+    async with room_lock(game, "turn_timeout"):
+        # Пока ждали блокировку, игрок мог успеть сходить.
+        if games.get(game.id) is not game or game.turn_key != key:
+            return
+        kind = stalled_turn(game)
+        if kind is None:
+            return
+        try:
+            apply_turn_timeout(game, kind)
+        except ValueError:
+            logger.exception("Turn timeout failed in room %s", game.id)
+            return
+        inc("turn_timeouts", kind=kind)
+        outgoing = prepare_broadcast(game)
+    await deliver(outgoing)
+    schedule_bots(game)
+
+
+async def run_turn_timers() -> None:
+    while True:
+        await turn_timers.wait()
+        for game_id in turn_timers.pop_due(time.monotonic()):
+            game = games.get(game_id)
+            if game is not None and game.turn_key is not None:
+                spawn(expire_turn(game, game.turn_key))
+
+
+def receives_state(player: PlayerState) -> bool:
+    # Отключившемуся игроку кадры продолжают копиться, пока он может
+    # вернуться через resume и пока они помещаются в outbox.
+    if player.websocket:
+        return True
+    return player.detached and player.out_seq - player.detached_seq < OUTBOX_SIZE
+
+
+def build_outgoing(game: GameState) -> Outgoing:
+    if game.spectators:
+        feed_spectators(game)
+    outgoing: Outgoing = []
     for player in game.players:
-        if not player.websocket:
+        if not receives_state(player):
             continue
-        try:
-            await player.websocket.send_json(
-                {"type": "game_state", "game": serialize_game_for_player(game, player.id)}
-            )
-        except Exception:
-            player.connected = False
+        message = build_state_message(game, player)
+        if message is not None and player.websocket:
+            outgoing.append((player, player.websocket, message))
+    return outgoing
+
+
+def schedule_flush(game: GameState) -> None:
+    game.pending_broadcasts += 1
+    if game.flush_task is None:
+        game.flush_task = asyncio.create_task(flush_broadcast(game))
+
+
+async def flush_broadcast(game: GameState) -> None:
+    # Одна отправка на интервал: все изменения за это время уходят одним патчем.
+    await asyncio.sleep(BROADCAST_INTERVAL)
+    async with room_lock(game, "flush"):
+        merged = game.pending_broadcasts
+        game.pending_broadcasts = 0
+        game.flush_task = None
+        outgoing = build_outgoing(game)
+    inc("broadcast_flushes")
+    inc("broadcasts_coalesced", merged - 1)
+    await deliver(outgoing)
+
+
+def mark_disconnected(player: PlayerState, websocket: WebSocket) -> None:
+    # Сокет закрывается, а что делать с игроком, решает release_connection,
+    # когда обработчик этого сокета завершится.
+    if player.websocket is not websocket:
+        return
+    player.websocket = None
+    spawn(close_quietly(websocket))
+
+
+async def close_quietly(websocket: WebSocket, code: int = 1000) -> None:
+    try:
+        await asyncio.wait_for(websocket.close(code=code), SEND_TIMEOUT)
+    except Exception:
+        pass
+
+
+async def send_messages(player: PlayerState, websocket: WebSocket, messages: List[Message]) -> None:
+    # Кадры уходят подряд под одной блокировкой записи: рассылка из другой
+    # задачи не вклинится между ними.
+    try:
+        async with player.send_lock:
+            for message in messages:
+                if isinstance(message, bytes):
+                    await asyncio.wait_for(websocket.send_bytes(message), SEND_TIMEOUT)
+                else:
+                    await asyncio.wait_for(websocket.send_text(message), SEND_TIMEOUT)
+    except Exception:
+        mark_disconnected(player, websocket)
+
+
+async def send_message(player: PlayerState, websocket: WebSocket, message: Message) -> None:
+    await send_messages(player, websocket, [message])
+
+
+async def deliver(outgoing: Outgoing) -> None:
+    if not outgoing:
+        return
+    started = time.perf_counter()
+    if len(outgoing) == 1:
+        await send_message(*outgoing[0])
+    else:
+        await asyncio.gather(*(send_message(*item) for item in outgoing))
+    observe("broadcast_fanout_seconds", time.perf_counter() - started)
+    inc("outgoing_frames", len(outgoing))
+    inc(
+        "outgoing_bytes",
+        sum(
+            len(message) if isinstance(message, bytes) else len(message.encode())
+            for _, _, message in outgoing
+        ),
+    )
+
+
+async def broadcast_state(game: GameState) -> None:
+    async with room_lock(game, "broadcast"):
+        outgoing = prepare_broadcast(game)
+    await deliver(outgoing)
+
+
+async def send_full_state(game: GameState, player: PlayerState) -> None:
+    async with room_lock(game, "sync"):
+        websocket = player.websocket
+        if not websocket:
+            return
+        player.reset_sync()
+        message = build_state_message(game, player)
+    await send_message(player, websocket, message)
+
+
+def acknowledge_state(player: PlayerState, data: Dict[str, Any]) -> None:
+    version = data.get("version")
+    if isinstance(version, int) and player.acked_version < version <= (player.sent_version or 0):
+        player.acked_version = version
 
 
 async def create_game(req: CreateGameRequest) -> Dict[str, str]:
-    game_id = generate_game_id()
-    games[game_id] = GameState(game_id, req.maxPlayers)
+    game_id = generate_game_id(SHARD_INDEX, SHARD_COUNT)
+    while game_id in games:
+        game_id = generate_game_id(SHARD_INDEX, SHARD_COUNT)
+    game = GameState(game_id, req.maxPlayers)
+    game.fill_with_bots = req.fillWithBots
+    game.public = req.public
+    for evicted in games.add(game):
+        await evict_room(evicted, "capacity")
+    lobbies.update(game)
     return {"gameId": game_id}
 
 
+async def quick_match(req: QuickMatchRequest) -> Dict[str, Any]:
+    # Место в самом заполненном подходящем лобби, а если такого нет — новая
+    # публичная комната. Место не резервируется: если его успели занять,
+    # вход вернёт «Комната заполнена», и клиент просто повторит запрос.
+    game_id = lobbies.match(req.maxPlayers)
+    if game_id is not None:
+        inc("quick_matches", result="joined")
+        return {"gameId": game_id, "created": False}
+    max_players = req.maxPlayers or QUICK_MATCH_PLAYERS
+    created = await create_game(CreateGameRequest(maxPlayers=max_players, public=True))
+    inc("quick_matches", result="created")
+    return {"gameId": created["gameId"], "created": True}
+
+
+def list_lobbies(
+    max_players: Optional[int], cursor: Optional[str], limit: Optional[int]
+) -> Dict[str, Any]:
+    after = (0, -1)
+    if cursor:
+        try:
+            free, order = cursor.split(".")
+            after = (int(free), int(order))
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Неверный курсор") from None
+    keys = lobbies.page(max_players, after, limit or LOBBY_PAGE_SIZE)
+    rooms = []
+    for free, order, game_id in keys:
+        game = games.get(game_id)
+        if game is None:
+            continue
+        rooms.append(
+            {
+                "gameId": game_id,
+                "maxPlayers": game.max_players,
+                "players": len(game.players),
+                "freeSeats": free,
+                "cursor": f"{free}.{order}",
+            }
+        )
+    # Полная страница — возможно, есть и следующая.
+    last_free, last_order, _ = keys[-1] if keys else (0, 0, "")
+    next_cursor = (
+        f"{last_free}.{last_order}" if len(keys) == (limit or LOBBY_PAGE_SIZE) else None
+    )
+    return {"rooms": rooms, "nextCursor": next_cursor}
+
+
+async def evict_room(game: GameState, reason: str) -> None:
+    games.remove(game.id)
+    lobbies.discard(game.id)
+    turn_timers.cancel(game.id)
+    store.mark_deleted(game.id)
+    for task in (game.bot_task, game.flush_task):
+        if task:
+            task.cancel()
+    inc("rooms_evicted", reason=reason)
+    async with room_lock(game, "evict"):
+        sockets = [(player, player.websocket) for player in game.players if player.websocket]
+        for player in game.players:
+            if player.resume_task:
+                player.resume_task.cancel()
+        for player, _ in sockets:
+            player.websocket = None
+            player.connected = False
+        watchers = list(game.spectators.values())
+        game.spectators.clear()
+        for spectator in watchers:
+            if spectator.task:
+                spectator.task.cancel()
+    message = encode_message({"type": "return_to_menu"})
+    await deliver([(player, websocket, message) for player, websocket in sockets])
+    await asyncio.gather(*(close_quietly(websocket, 1001) for _, websocket in sockets))
+    await asyncio.gather(*(close_quietly(spectator.websocket, 1001) for spectator in watchers))
+
+
+async def sweep_rooms(now: float) -> None:
+    cutoff = now - min(ROOM_IDLE_TTL, ROOM_ABANDONED_TTL)
+    for game in games.least_recent(cutoff):
+        if now - game.last_activity >= ROOM_IDLE_TTL:
+            await evict_room(game, "idle")
+        elif now - game.last_activity >= ROOM_ABANDONED_TTL and not any(
+            player.websocket for player in game.players
+        ):
+            await evict_room(game, "abandoned")
+    if LOBBY_SEAT_TTL > 0:
+        for game in [game for game in games if game.phase == "lobby"]:
+            await reap_lobby_seats(game, now)
+
+
+def stale_seat(player: PlayerState, now: float) -> bool:
+    return (
+        not player.connected
+        and not player.is_bot
+        and player.disconnected_at is not None
+        and now - player.disconnected_at >= LOBBY_SEAT_TTL
+    )
+
+
+async def reap_lobby_seats(game: GameState, now: float) -> None:
+    # Давно отключившиеся игроки освобождают места в лобби, чтобы комнату
+    # можно было добрать; при возвращении они войдут как новые игроки.
+    async with room_lock(game, "reap"):
+        if game.phase != "lobby":
+            return
+        stale = [seat for seat, player in enumerate(game.players) if stale_seat(player, now)]
+        if not stale:
+            return
+        if all(player.is_bot or seat in stale for seat, player in enumerate(game.players)):
+            # Без людей боты мест не держат: при старте их снова добавит fill_bot_seats.
+            stale = list(range(len(game.players)))
+        for seat in reversed(stale):
+            apply_op(game, seat, OP_LEAVE)
+        outgoing = prepare_broadcast(game)
+    inc("lobby_seats_reaped", len(stale))
+    await deliver(outgoing)
+
+
+async def send_heartbeats(now: float) -> None:
+    # Полуоткрытое соединение не даёт ошибки записи, пока буферы не
+    # заполнятся; поэтому сервер сам пингует клиентов и закрывает тех,
+    # от кого давно ничего не приходило.
+    # Чтение из мёртвого сокета может не завершиться ещё долго, поэтому
+    # место освобождается сразу, не дожидаясь обработчика соединения.
+    ping = encode_message({"type": "ping"})
+    outgoing: Outgoing = []
+    dropped = []
+    for game in games:
+        for player in game.players:
+            websocket = player.websocket
+            if websocket is None:
+                continue
+            if now - player.last_seen > HEARTBEAT_TIMEOUT:
+                inc("ws_dropped", reason="heartbeat")
+                mark_disconnected(player, websocket)
+                dropped.append((game, player, websocket))
+            else:
+                outgoing.append((player, websocket, ping))
+    await asyncio.gather(*(send_message(*item) for item in outgoing))
+    for game, player, websocket in dropped:
+        await release_connection(game, player, websocket)
+
+
+async def run_heartbeat() -> None:
+    while True:
+        await asyncio.sleep(HEARTBEAT_INTERVAL)
+        try:
+            await send_heartbeats(time.monotonic())
+        except Exception:
+            logger.exception("Heartbeat failed")
+
+
+async def run_room_sweeper() -> None:
+    while True:
+        await asyncio.sleep(ROOM_SWEEP_INTERVAL)
+        try:
+            await sweep_rooms(time.monotonic())
+        except Exception:
+            logger.exception("Room sweep failed")
+
+
+def collect_room_metrics() -> None:
+    # Считается при каждом запросе /metrics, а не на каждом действии.
+    phases: Dict[str, int] = {"lobby": 0, "playing": 0, "ended": 0}
+    spectators = 0
+    players = {"connected": 0, "unresponsive": 0, "detached": 0, "disconnected": 0, "bot": 0}
+    now = time.monotonic()
+    for game in games:
+        phases[game.phase] = phases.get(game.phase, 0) + 1
+        spectators += len(game.spectators)
+        for player in game.players:
+            if player.is_bot:
+                players["bot"] += 1
+            elif player.websocket:
+                # Сокет открыт, но не ответил на последний пинг — кандидат в зомби.
+                silent = HEARTBEAT_INTERVAL > 0 and now - player.last_seen > 1.5 * HEARTBEAT_INTERVAL
+                players["unresponsive" if silent else "connected"] += 1
+            elif player.detached:
+                players["detached"] += 1
+            else:
+                players["disconnected"] += 1
+    clear_gauge("rooms")
+    for phase, count in phases.items():
+        set_gauge("rooms", count, phase=phase)
+    for state, count in players.items():
+        set_gauge("players", count, state=state)
+    set_gauge("open_lobbies", len(lobbies))
+    set_gauge("spectators", spectators)
+    set_gauge("turn_timers", len(turn_timers))
+
+
 def find_game(game_id: str) -> GameState:
     game = games.get(game_id)
     if not game:
@@ -194,36 +730,6 @@ def find_game(game_id: str) -> GameState:
     return game
 
 
-async def handle_start_game(game: GameState, player: PlayerState) -> None:
-    if player.id != game.host_id:
-        raise ValueError("Только создатель может начать игру.")
-    if len(game.players) < 2:
-        raise ValueError("Нужно минимум два игрока.")
-    if game.phase != "lobby":
-        raise ValueError("Игра уже началась.")
-    game.phase = "playing"
-    game.deck = build_deck()
-    game.trump_card = game.deck[-1]
-    for _ in range(6):
-        for pl in game.players:
-            pl.hand.append(game.deck.pop())
-    lowest_idx = lowest_trump_player(game.players, game.trump_card["suit"])
-    game.attacker_index = lowest_idx
-    game.defender_index = next_active_index(game, lowest_idx)
-    if game.defender_index is None:
-        game.defender_index = 0
-    recalc_attack_limit(game)
-    game.table = []
-    game.discard = []
-    game.rematch_votes.clear()
-    game.winner_id = None
-    game.loser_id = None
-    game.surrendered_player = None
-    game.status_message = f"Атакует {game.players[game.attacker_index].name}"
-    game.allow_throw_ins = False
-    game.attack_passed.clear()
-
-
 async def handle_join_lobby(
     websocket: WebSocket, game: GameState, payload: Dict[str, Any]
 ) -> PlayerState:
@@ -231,304 +737,358 @@ async def handle_join_lobby(
     if not name:
         raise ValueError("Введите имя игрока.")
     requested_id = payload.get("playerId")
-    async with game.lock:
+    async with room_lock(game, "join"):
         if game.phase != "lobby" and not requested_id:
             raise ValueError("Игра уже началась.")
         player = None
         if requested_id:
             player = game.find_player(requested_id)
+        if player and player.is_bot:
+            raise ValueError("Это место занято ботом.")
         if player:
-            player.websocket = websocket
-            player.connected = True
+            attach_connection(player, websocket)
             player.name = name or player.name
+            player.reset_sync()
         else:
             if game.phase != "lobby":
                 raise ValueError("Игра уже началась.")
             if len(game.players) >= game.max_players:
                 raise ValueError("Комната заполнена.")
-            player_id = secrets.token_hex(4)
-            player = PlayerState(player_id, name, websocket)
-            game.players.append(player)
-            if not game.host_id:
-                game.host_id = player_id
-    await websocket.send_json(
-        {"type": "joined", "playerId": player.id, "gameId": game.id}
-    )
-    await broadcast_state(game)
+            player = add_player(game, secrets.token_hex(4), name, websocket)
+            player.binary = uses_binary(websocket)
+            player.last_seen = time.monotonic()
+        joined = encode_message({"type": "joined", "playerId": player.id, "gameId": game.id})
+        outgoing = [(player, websocket, joined)] + prepare_broadcast(game)
+    await deliver(outgoing)
+    schedule_bots(game)
     return player
 
 
-def reset_to_lobby(game: GameState) -> None:
-    game.phase = "lobby"
-    game.deck = []
-    game.table.clear()
-    game.discard.clear()
-    game.rematch_votes.clear()
-    game.loser_id = None
-    game.winner_id = None
-    game.attack_limit = MAX_ATTACKS
-    game.surrendered_player = None
-    game.status_message = "Игра завершена. Создайте новую партию или дождитесь игроков."
-    game.trump_card = None
-    for player in game.players:
-        player.hand.clear()
-        player.is_out = False
-    game.attacker_index = None
-    game.defender_index = None
-
-
-def restart_game(game: GameState) -> None:
-    game.phase = "playing"
-    game.deck = build_deck()
-    game.discard = []
-    game.table = []
-    game.rematch_votes.clear()
-    game.winner_id = None
-    game.loser_id = None
-    game.attack_limit = MAX_ATTACKS
-    game.surrendered_player = None
-    game.trump_card = game.deck[-1]
-    for player in game.players:
-        player.hand.clear()
-        player.is_out = False
-    for _ in range(6):
-        for pl in game.players:
-            pl.hand.append(game.deck.pop())
-            if not game.deck:
-                break
-        if not game.deck:
-            break
-    lowest_idx = lowest_trump_player(game.players, game.trump_card["suit"])
-    game.attacker_index = lowest_idx
-    game.defender_index = next_active_index(game, lowest_idx)
-    if game.defender_index is None:
-        game.defender_index = 0
-    recalc_attack_limit(game)
-    game.status_message = f"Атакует {game.players[game.attacker_index].name}"
+def attach_connection(player: PlayerState, websocket: WebSocket) -> None:
+    if player.resume_task:
+        player.resume_task.cancel()
+        player.resume_task = None
+    player.detached = False
+    player.websocket = websocket
+    player.binary = uses_binary(websocket)
+    player.connected = True
+    player.last_seen = time.monotonic()
+    player.disconnected_at = None
 
 
-async def notify_return_to_menu(game: GameState) -> None:
-    for player in game.players:
-        if not player.websocket:
-            continue
-        try:
-            await player.websocket.send_json({"type": "return_to_menu"})
-        except Exception:
-            player.connected = False
+async def handle_resume(
+    websocket: WebSocket, game: GameState, payload: Dict[str, Any]
+) -> PlayerState:
+    # Продолжение сессии после обрыва: клиент называет последний полученный
+    # seq и получает только пропущенные кадры, а если часть изменений в outbox
+    # не попала, — ещё один патч до текущей версии. Полный снимок — если нужные
+    # кадры уже вытеснены или клиент сменил протокол.
+    player_id = payload.get("playerId")
+    last_seq = payload.get("lastSeq")
+    if not isinstance(player_id, str) or not isinstance(last_seq, int):
+        raise ValueError("Неверный запрос на продолжение сессии.")
+    async with room_lock(game, "resume"):
+        player = game.find_player(player_id)
+        if player is None or player.is_bot:
+            raise ValueError("Сессия не найдена.")
+        was_connected = player.connected
+        same_protocol = player.binary == uses_binary(websocket)
+        attach_connection(player, websocket)
+        oldest = player.outbox[0][0] if player.outbox else player.out_seq + 1
+        if same_protocol and oldest - 1 <= last_seq <= player.out_seq:
+            frames = [message for seq, message in player.outbox if seq > last_seq]
+            catch_up = build_state_message(game, player)
+            if catch_up is not None:
+                frames.append(catch_up)
+            inc("sessions_resumed", mode="replay")
+        else:
+            player.reset_sync()
+            frames = [build_state_message(game, player)]
+            inc("sessions_resumed", mode="snapshot")
+        resumed = encode_message(
+            {"type": "resumed", "playerId": player.id, "gameId": game.id, "replayed": len(frames)}
+        )
+        # Остальные узнают о переподключении, только если обрыв был им виден.
+        outgoing = [] if was_connected else prepare_broadcast(game)
+    await send_messages(player, websocket, [resumed, *frames])
+    await deliver(outgoing)
+    return player
 
 
-def validate_attack_card(
-    game: GameState, player: PlayerState, card: Dict[str, str]
-) -> None:
-    if game.attacker_index is None or game.defender_index is None:
-        raise ValueError("Сейчас нельзя атаковать.")
-    max_attacks = max(1, game.attack_limit or MAX_ATTACKS)
-    if len(game.table) >= max_attacks:
-        raise ValueError("Нельзя подкидывать больше карт.")
-    idx = player.card_index(card)
-    if idx == -1:
-        raise ValueError("У вас нет такой карты.")
-    if not game.table:
-        if player.id != game.players[game.attacker_index].id:
-            raise ValueError("Первым ходит назначенный атакующий.")
+async def handle_spectate(websocket: WebSocket, game: GameState) -> None:
+    if websocket in game.spectators:
         return
-    ranks = ranks_on_table(game)
-    if card["rank"] not in ranks:
-        raise ValueError("Можно подкидывать только имеющиеся ранги.")
-    if player.id != game.players[game.attacker_index].id and not game.allow_throw_ins:
-        raise ValueError("Ждите пока защитник побьёт первую карту.")
+    if len(game.spectators) >= MAX_SPECTATORS:
+        raise ValueError("Слишком много зрителей.")
+    await websocket.send_text(encode_message({"type": "spectating", "gameId": game.id}))
+    async with room_lock(game, "spectate"):
+        spectator = Spectator(websocket, uses_binary(websocket))
+        push_spectator_frame(game, spectator)
+        spectator.task = asyncio.create_task(run_spectator_feed(game, spectator))
+        game.spectators[websocket] = spectator
 
 
-def validate_defense_card(
-    game: GameState, player: PlayerState, attack_index: int, card: Dict[str, str]
-) -> None:
-    if game.defender_index is None:
-        raise ValueError("Нет защитника.")
-    if player.id != game.players[game.defender_index].id:
-        raise ValueError("Сейчас ход защиты у другого игрока.")
-    if attack_index < 0 or attack_index >= len(game.table):
-        raise ValueError("Нет такой карты на столе.")
-    slot = game.table[attack_index]
-    if slot["defense"]:
-        raise ValueError("Эта карта уже побита.")
-    idx = player.card_index(card)
-    if idx == -1:
-        raise ValueError("У вас нет этой карты.")
-    trump_suit = game.trump_card["suit"] if game.trump_card else ""
-    if not beats(card, slot["attack"], trump_suit):
-        raise ValueError("Карта не бьёт атаку.")
-
-
-def remove_card_from_hand(player: PlayerState, card: Dict[str, str]) -> Dict[str, str]:
-    idx = player.card_index(card)
-    if idx == -1:
-        raise ValueError("Карта не найдена.")
-    return player.hand.pop(idx)
-
-
-def finish_successful_round(game: GameState) -> None:
-    for slot in game.table:
-        game.discard.append(slot["attack"])
-        if slot["defense"]:
-            game.discard.append(slot["defense"])
-    game.table.clear()
-    game.attack_passed.clear()
-    game.allow_throw_ins = False
-    if game.attacker_index is None or game.defender_index is None:
-        return
-    game.status_message = (
-        f"{game.players[game.defender_index].name} отбился и теперь атакует."
-    )
-    game.attacker_index = game.defender_index
-    game.defender_index = next_active_index(game, game.attacker_index)
-    if game.defender_index is None:
-        game.defender_index = game.attacker_index
-    refill_hands(game, game.attacker_index)
-    cleanup_finished_players(game)
-    ensure_current_roles(game)
-    recalc_attack_limit(game)
-    check_for_game_end(game)
-
-
-def defender_take_cards(game: GameState) -> None:
-    if game.defender_index is None or not game.table:
-        raise ValueError("Нечего брать.")
-    defender = game.players[game.defender_index]
-    for slot in game.table:
-        defender.hand.append(slot["attack"])
-        if slot["defense"]:
-            defender.hand.append(slot["defense"])
-    game.table.clear()
-    game.attack_passed.clear()
-    game.allow_throw_ins = False
-    prev_attacker = game.attacker_index if game.attacker_index is not None else 0
-    attacker_name = game.players[prev_attacker].name if game.players else "Атакующий"
-    game.status_message = (
-        f"{defender.name} взял карты. Атакует {attacker_name}."
-    )
-    refill_hands(game, prev_attacker)
-    cleanup_finished_players(game)
-    game.defender_index = next_active_index(game, prev_attacker)
-    ensure_current_roles(game)
-    recalc_attack_limit(game)
-    check_for_game_end(game)
-
-
-def handle_attack_pass(game: GameState, player: PlayerState) -> None:
-    if not game.table:
-        raise ValueError("Нельзя пасовать до первой атаки.")
-    if game.defender_index is None:
-        raise ValueError("Нет защитника.")
-    if player.id == game.players[game.defender_index].id:
-        raise ValueError("Защитник не пасует.")
-    if any(slot["defense"] is None for slot in game.table):
-        raise ValueError("Сначала дождитесь защиты карт.")
-    game.attack_passed.add(player.id)
-    alive_attackers = [
-        pl.id
-        for idx, pl in enumerate(game.players)
-        if idx != game.defender_index and not pl.is_out and pl.hand
-    ]
-    pending = any(slot["defense"] is None for slot in game.table)
-    if not pending and all(attacker in game.attack_passed for attacker in alive_attackers):
-        finish_successful_round(game)
-
-
-def check_for_game_end(game: GameState) -> None:
-    remaining = [pl for pl in game.players if not pl.is_out]
-    if len(remaining) <= 1 and game.phase == "playing":
-        game.phase = "ended"
-        if remaining:
-            loser = remaining[0]
-            game.loser_id = loser.id
-            game.status_message = f"{loser.name} остался в дураках."
-            winners = [pl for pl in game.players if pl.id != loser.id]
-            game.winner_id = winners[0].id if winners else None
+def release_spectator(game: GameState, websocket: WebSocket) -> None:
+    spectator = game.spectators.pop(websocket, None)
+    if spectator is not None and spectator.task:
+        spectator.task.cancel()
+
+
+async def release_connection(game: GameState, player: PlayerState, websocket: WebSocket) -> None:
+    # Короткий обрыв остальным не виден: RESUME_GRACE секунд игрок считается
+    # в сети, а его кадры копятся для resume. Потом он отключается как раньше.
+    outgoing: Outgoing = []
+    async with room_lock(game, "disconnect"):
+        if player.websocket not in (websocket, None) or player.detached or not player.connected:
+            return
+        player.websocket = None
+        if RESUME_GRACE > 0 and player.connected:
+            player.detached = True
+            player.detached_seq = player.out_seq
+            player.resume_task = asyncio.create_task(expire_session(game, player))
         else:
-            game.status_message = "Игра завершена."
-            finished = [pl for pl in game.players if not pl.hand]
-            game.winner_id = finished[0].id if finished else None
-        game.rematch_votes.clear()
+            player.connected = False
+            player.disconnected_at = time.monotonic()
+            outgoing = prepare_broadcast(game)
+    await deliver(outgoing)
+
+
+async def expire_session(game: GameState, player: PlayerState) -> None:
+    await asyncio.sleep(RESUME_GRACE)
+    async with room_lock(game, "session_expired"):
+        if not player.detached:
+            return
+        player.detached = False
+        player.resume_task = None
+        player.connected = False
+        player.disconnected_at = time.monotonic()
+        outgoing = prepare_broadcast(game)
+    inc("sessions_expired")
+    await deliver(outgoing)
+
+
+async def notify_return_to_menu(game: GameState) -> None:
+    await deliver(
+        [
+            (player, player.websocket, encode_message({"type": "return_to_menu"}))
+            for player in game.players
+            if player.websocket
+        ]
+    )
+
+
+def action_label(action: Any) -> str:
+    # Имя действия приходит от клиента: в метки попадают только известные.
+    if isinstance(action, str) and (action in ACTION_OPS or action == "send_chat"):
+        return action
+    return "unknown"
 
 
 async def process_action(
     action: str, data: Dict[str, Any], game: GameState, player: PlayerState
 ) -> None:
-    if action == "start_game":
-        async with game.lock:
-            await handle_start_game(game, player)
-        await broadcast_state(game)
+    if not isinstance(action, str):
+        raise ValueError("Неизвестное действие.")
+    label = action_label(action)
+    started = time.perf_counter()
+    async with room_lock(game, label):
+        # Под профилировщик попадает только синхронная часть под блокировкой,
+        # поэтому выборки разных действий не перекрываются.
+        locked = time.perf_counter()
+        profiler = start_profile()
+        try:
+            apply_action(action, data, game, player)
+            applied = time.perf_counter()
+            outgoing = prepare_broadcast(game)
+        finally:
+            stop_profile(profiler)
+        serialized = time.perf_counter()
+    await deliver(outgoing)
+    finished = time.perf_counter()
+    observe("action_seconds", finished - started, action=label)
+    report_slow_action(
+        game.id,
+        label,
+        finished - started,
+        {
+            "lock_wait": locked - started,
+            "rules": applied - locked,
+            "serialize": serialized - applied,
+            "send": finished - serialized,
+        },
+    )
+    if action == "cancel_rematch":
+        await notify_return_to_menu(game)
+    schedule_bots(game)
+
+
+async def send_chat(game: GameState, player: PlayerState, data: Dict[str, Any]) -> None:
+    # Сообщение чата уходит отдельным кадром и не меняет версию состояния.
+    text = (data.get("message") or "").strip()
+    if not text:
+        raise ValueError("Нельзя отправить пустое сообщение.")
+    async with room_lock(game, "chat"):
+        message = add_chat_message(game, player, text[:300])
+        games.touch(game)
+        store.mark_dirty(game)
+        frame = encode_message({"type": "chat_message", "message": message})
+        outgoing = [(pl, pl.websocket, frame) for pl in game.players if pl.websocket]
+    inc("chat_messages")
+    await deliver(outgoing)
+
+
+async def send_chat_history(game: GameState, player: PlayerState, data: Dict[str, Any]) -> None:
+    after = data.get("afterSeq")
+    if not isinstance(after, int):
+        after = 0
+    async with room_lock(game, "chat_history"):
+        websocket = player.websocket
+        messages = [message for message in game.chat if message["seq"] > after]
+    if websocket:
+        frame = encode_message({"type": "chat_history", "messages": messages})
+        await send_message(player, websocket, frame)
+
+
+def schedule_bots(game: GameState) -> None:
+    if game.bot_task and not game.bot_task.done():
         return
-    if action in {"request_rematch", "cancel_rematch"}:
-        async with game.lock:
-            if game.phase != "ended":
-                raise ValueError("Повторное приглашение доступно после завершения партии.")
-            if action == "request_rematch":
-                game.rematch_votes.add(player.id)
-                if len(game.rematch_votes) == len(game.players):
-                    restart_game(game)
+    if any(player.is_bot for player in game.players):
+        game.bot_task = asyncio.create_task(run_bots(game))
+
+
+async def choose_bot_action(actions: List[Action], view: Optional[BotView]) -> Action:
+    if view is None:
+        return actions[0]
+    loop = asyncio.get_running_loop()
+    action, nodes, elapsed, worker = await loop.run_in_executor(
+        get_pool(), search_move, view, actions
+    )
+    inc("bot_searches")
+    inc("bot_nodes", nodes)
+    inc("bot_search_seconds", elapsed)
+    set_gauge("bot_nodes_per_second", nodes / elapsed if elapsed else 0.0, worker=worker)
+    return action
+
+
+async def run_bots(game: GameState) -> None:
+    # Боты ходят по очереди; поиск идёт в пуле процессов без блокировки
+    # комнаты, а ход применяется, только если за это время ничего не изменилось.
+    while games.get(game.id) is game:
+        async with room_lock(game, "bot_turn"):
+            turn = next_bot_turn(game)
+            if turn is None:
+                return
+            seat, actions = turn
+            version = game.version
+            view = build_view(game, seat) if len(actions) > 1 else None
+        started = time.monotonic()
+        try:
+            action = await choose_bot_action(actions, view)
+        except Exception:
+            logger.exception("Bot search failed")
+            action = actions[0]
+        await asyncio.sleep(max(0.0, BOT_MOVE_DELAY - (time.monotonic() - started)))
+        async with room_lock(game, "bot_move"):
+            if game.version != version:
+                continue
+            apply_op(game, action.seat, action.op, action.card, action.arg)
+            inc("bot_moves")
+            outgoing = prepare_broadcast(game)
+        await deliver(outgoing)
+
+
+async def dispatch_message(
+    websocket: WebSocket, game: GameState, player: Optional[PlayerState], data: Dict[str, Any]
+) -> Optional[PlayerState]:
+    action = data.get("action")
+    if action == "join":
+        try:
+            return await handle_join_lobby(websocket, game, data)
+        except ValueError as exc:
+            await websocket.send_json({"type": "error", "message": str(exc)})
+            return player
+    if action == "resume":
+        try:
+            return await handle_resume(websocket, game, data)
+        except ValueError as exc:
+            await websocket.send_json(
+                {"type": "error", "code": "resume_failed", "message": str(exc)}
+            )
+            return player
+    if action == "spectate":
+        try:
+            if player:
+                raise ValueError("Вы уже за столом.")
+            await handle_spectate(websocket, game)
+        except ValueError as exc:
+            await websocket.send_json({"type": "error", "message": str(exc)})
+        return player
+    if not player and websocket in game.spectators:
+        if action == "sync":
+            async with room_lock(game, "sync"):
+                spectator = game.spectators.get(websocket)
+                if spectator is not None:
+                    push_spectator_frame(game, spectator)
+        elif action != "ack":
+            await websocket.send_json({"type": "error", "message": "Зрители не могут делать ходы."})
+    elif not player:
+        await websocket.send_json({"type": "error", "message": "Сначала присоединитесь."})
+    elif action == "ack":
+        acknowledge_state(player, data)
+    elif action == "sync":
+        await send_full_state(game, player)
+    elif action == "chat_history":
+        await send_chat_history(game, player, data)
+    else:
+        try:
+            if action == "send_chat":
+                await send_chat(game, player, data)
             else:
-                reset_to_lobby(game)
-        await broadcast_state(game)
-        if action == "cancel_rematch":
-            await notify_return_to_menu(game)
-        return
-    if action == "send_chat":
-        text = (data.get("message") or "").strip()
-        if not text:
-            raise ValueError("Нельзя отправить пустое сообщение.")
-        async with game.lock:
-            add_chat_message(game, player, text[:300])
-        await broadcast_state(game)
-        return
-    if action == "surrender":
-        async with game.lock:
-            handle_surrender(game, player)
-        await broadcast_state(game)
+                await process_action(action, data, game, player)
+        except ValueError as exc:
+            inc("action_errors", action=action_label(action), reason=str(exc))
+            await websocket.send_json({"type": "error", "message": str(exc)})
+    return player
+
+
+def uses_binary(websocket: WebSocket) -> bool:
+    return SUBPROTOCOL in websocket.scope.get("subprotocols", ())
+
+
+def parse_frame(message: Dict[str, Any], binary: bool = False) -> Optional[Dict[str, Any]]:
+    if binary and message.get("bytes") is not None:
+        return decode_command(message["bytes"])
+    try:
+        data = json.loads(message.get("text") or message.get("bytes") or "")
+    except ValueError:
+        return None
+    return data if isinstance(data, dict) else None
+
+
+async def reject_connection(websocket: WebSocket, reason: str, code: int, text: str) -> None:
+    inc("ws_dropped", reason=reason)
+    try:
+        await asyncio.wait_for(
+            websocket.send_json({"type": "error", "code": reason, "message": text}), SEND_TIMEOUT
+        )
+    except Exception:
+        pass
+    await close_quietly(websocket, code)
+
+
+async def drain_consumer(consumer: asyncio.Task, inbound: asyncio.Queue) -> None:
+    # Уже принятые сообщения дорабатываются: рассылка по комнате, прерванная
+    # на полпути, оставила бы остальных игроков без последнего кадра.
+    async def finish() -> None:
+        await inbound.put(None)
+        await consumer
+
+    if consumer.done():
         return
-    if game.phase != "playing":
-        raise ValueError("Игра ещё не началась.")
-    async with game.lock:
-        if action == "play_attack":
-            card = data.get("card")
-            if not isinstance(card, dict):
-                raise ValueError("Укажите карту.")
-            validate_attack_card(game, player, card)
-            removed = remove_card_from_hand(player, card)
-            is_first_card = not game.table
-            game.table.append({"attack": removed, "defense": None, "attackerId": player.id})
-            game.attack_passed.clear()
-            if is_first_card:
-                game.allow_throw_ins = False
-            if game.allow_throw_ins is False and len(game.table) == 1:
-                game.status_message = f"{game.players[game.defender_index].name} отбивается."
-        elif action == "play_defense":
-            card = data.get("card")
-            attack_index = data.get("attackIndex")
-            if not isinstance(card, dict) or attack_index is None:
-                raise ValueError("Нужны карта и номер атаки.")
-            validate_defense_card(game, player, int(attack_index), card)
-            removed = remove_card_from_hand(player, card)
-            game.table[int(attack_index)]["defense"] = removed
-            if not game.allow_throw_ins:
-                game.allow_throw_ins = True
-            if all(slot["defense"] for slot in game.table):
-                game.status_message = f"{game.players[game.defender_index].name} решает подкидывать или пасовать."
-        elif action == "pass_attack":
-            handle_attack_pass(game, player)
-        elif action == "take_cards":
-            defender_take_cards(game)
-        elif action == "request_rematch":
-            if game.phase != "ended":
-                raise ValueError("Повторить можно только после завершения партии.")
-            game.rematch_votes.add(player.id)
-            if len(game.rematch_votes) == len(game.players):
-                restart_game(game)
-        elif action == "cancel_rematch":
-            reset_to_lobby(game)
-        else:
-            raise ValueError("Неизвестное действие.")
-        await broadcast_state(game)
+    try:
+        await asyncio.wait_for(finish(), SEND_TIMEOUT)
+    except asyncio.TimeoutError:
+        pass
 
 
 async def websocket_handler(websocket: WebSocket, game_id: str) -> None:
@@ -538,31 +1098,80 @@ async def websocket_handler(websocket: WebSocket, game_id: str) -> None:
         await websocket.send_json({"type": "error", "message": "Игра не найдена."})
         await websocket.close()
         return
-    await websocket.accept()
+    binary = uses_binary(websocket)
+    await websocket.accept(subprotocol=SUBPROTOCOL if binary else None)
     player: Optional[PlayerState] = None
+    # Чтение и обработка разделены очередью: чтение проверяет размер кадра
+    # и лимиты, а переполнение очереди значит, что клиент шлёт быстрее,
+    # чем комната успевает обрабатывать.
+    inbound: asyncio.Queue = asyncio.Queue(INBOUND_QUEUE_SIZE)
+    limiter = ConnectionLimiter()
+
+    async def consume() -> None:
+        nonlocal player
+        try:
+            while True:
+                data = await inbound.get()
+                if data is None:
+                    return
+                player = await dispatch_message(websocket, game, player, data)
+        except WebSocketDisconnect:
+            pass
+        except Exception:
+            states = (websocket.application_state, websocket.client_state)
+            if WebSocketState.DISCONNECTED not in states:
+                logger.exception("Websocket message handling failed")
+            await close_quietly(websocket, 1011)
+
+    async def finish_connection() -> None:
+        nonlocal player
+        await drain_consumer(consumer, inbound)
+        release_spectator(game, websocket)
+        if player is None:
+            player = next((pl for pl in game.players if pl.websocket is websocket), None)
+        if player:
+            await release_connection(game, player, websocket)
+
+    consumer = asyncio.create_task(consume())
     try:
         while True:
-            data = await websocket.receive_json()
-            action = data.get("action")
-            if action == "join":
-                player = await handle_join_lobby(websocket, game, data)
-            elif not player:
-                await websocket.send_json({"type": "error", "message": "Сначала присоединитесь."})
-            else:
-                try:
-                    await process_action(action, data, game, player)
-                except ValueError as exc:
-                    await websocket.send_json({"type": "error", "message": str(exc)})
+            message = await websocket.receive()
+            if message["type"] == "websocket.disconnect":
+                break
+            frame = message.get("text") or message.get("bytes") or ""
+            size = len(frame.encode()) if isinstance(frame, str) else len(frame)
+            if size > MAX_FRAME_BYTES:
+                await reject_connection(websocket, "oversize", 1009, "Слишком большое сообщение.")
+                break
+            data = parse_frame(message, binary)
+            if data is None:
+                inc("ws_invalid_frames")
+                await websocket.send_json({"type": "error", "message": "Неверный формат сообщения."})
+                continue
+            if player is not None:
+                player.last_seen = time.monotonic()
+            if not limiter.allow(data.get("action")):
+                await reject_connection(
+                    websocket, "rate_limited", 1008, "Слишком много сообщений, соединение закрыто."
+                )
+                break
+            if data.get("action") == "pong":
+                # Ответ на пинг нужен только для отметки last_seen выше.
+                continue
+            try:
+                inbound.put_nowait(data)
+            except asyncio.QueueFull:
+                await reject_connection(
+                    websocket, "queue_full", 1013, "Сервер не успевает обрабатывать сообщения."
+                )
+                break
     except WebSocketDisconnect:
-        if player:
-            player.connected = False
-            player.websocket = None
-            await broadcast_state(game)
-    if action == "send_chat":
-        text = (data.get("message") or "").strip()
-        if not text:
-            raise ValueError("Нельзя отправить пустое сообщение.")
-        async with game.lock:
-            add_chat_message(game, player, text[:300])
-        await broadcast_state(game)
-        return
+        pass
+    except RuntimeError:
+        # Сокет уже закрыл сервер (таймаут записи, вытеснение комнаты).
+        if websocket.application_state != WebSocketState.DISCONNECTED:
+            raise
+    finally:
+        closing = spawn(finish_connection())
+    # Уборка идёт отдельной задачей: отмена обработчика её не прерывает.
+    await asyncio.shield(closing)
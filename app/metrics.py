@@ -0,0 +1,120 @@
+from __future__ import annotations
+
+from bisect import bisect_left
+from collections import Counter
+from typing import Dict, Iterator, List, Tuple
+
+PREFIX = "durak_"
+
+# Границы корзин гистограмм по умолчанию, в секундах.
+LATENCY_BUCKETS = (
+    0.0001,
+    0.00025,
+    0.0005,
+    0.001,
+    0.0025,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+)
+
+Labels = Tuple[Tuple[str, str], ...]
+SeriesKey = Tuple[str, Labels]
+
+
+class Histogram:
+    __slots__ = ("buckets", "counts", "total", "count")
+
+    def __init__(self, buckets: Tuple[float, ...] = LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.total = 0.0
+        self.count = 0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.total += value
+        self.count += 1
+
+
+counters: Counter[SeriesKey] = Counter()
+gauges: Dict[SeriesKey, float] = {}
+histograms: Dict[SeriesKey, Histogram] = {}
+
+
+def _key(name: str, labels: Dict[str, object]) -> SeriesKey:
+    if not labels:
+        return name, ()
+    return name, tuple(sorted((label, str(value)) for label, value in labels.items()))
+
+
+def inc(name: str, amount: float = 1, **labels: object) -> None:
+    counters[_key(name, labels)] += amount
+
+
+def set_gauge(name: str, value: float, **labels: object) -> None:
+    gauges[_key(name, labels)] = value
+
+
+def clear_gauge(name: str) -> None:
+    for key in [key for key in gauges if key[0] == name]:
+        del gauges[key]
+
+
+def observe(name: str, value: float, **labels: object) -> None:
+    key = _key(name, labels)
+    histogram = histograms.get(key)
+    if histogram is None:
+        histogram = histograms[key] = Histogram()
+    histogram.observe(value)
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(labels: Labels, extra: str = "") -> str:
+    parts = [f'{label}="{_escape(value)}"' for label, value in labels]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _grouped(series: Dict[SeriesKey, object]) -> Iterator[Tuple[str, List[Tuple[Labels, object]]]]:
+    groups: Dict[str, List[Tuple[Labels, object]]] = {}
+    for (name, labels), value in series.items():
+        groups.setdefault(name, []).append((labels, value))
+    for name in sorted(groups):
+        yield name, sorted(groups[name], key=lambda item: item[0])
+
+
+def render_prometheus() -> str:
+    lines: List[str] = []
+    for name, series in _grouped(counters):
+        metric = PREFIX + (name if name.endswith("_total") else name + "_total")
+        lines.append(f"# TYPE {metric} counter")
+        lines.extend(f"{metric}{_labels(labels)} {value}" for labels, value in series)
+    for name, series in _grouped(gauges):
+        metric = PREFIX + name
+        lines.append(f"# TYPE {metric} gauge")
+        lines.extend(f"{metric}{_labels(labels)} {value}" for labels, value in series)
+    for name, series in _grouped(histograms):
+        metric = PREFIX + name
+        lines.append(f"# TYPE {metric} histogram")
+        for labels, histogram in series:
+            cumulative = 0
+            for bound, count in zip(histogram.buckets, histogram.counts):
+                cumulative += count
+                bucket = _labels(labels, f'le="{bound}"')
+                lines.append(f"{metric}_bucket{bucket} {cumulative}")
+            bucket = _labels(labels, 'le="+Inf"')
+            lines.append(f"{metric}_bucket{bucket} {histogram.count}")
+            lines.append(f"{metric}_sum{_labels(labels)} {histogram.total}")
+            lines.append(f"{metric}_count{_labels(labels)} {histogram.count}")
+    return "\n".join(lines) + "\n"
@@ -1,71 +1,252 @@
 from __future__ import annotations
 
 import asyncio
-from typing import Any, Dict, List, Optional
+from collections import deque
+from typing import TYPE_CHECKING, Any, Deque, Dict, List, Optional, Tuple
 
-from fastapi import WebSocket
+from .action_log import ActionLog
+from .cards import MAX_ATTACKS, card_rank, card_suit, generate_seed
+from .config import CHAT_HISTORY, OUTBOX_SIZE
 
-from .cards import MAX_ATTACKS
+if TYPE_CHECKING:
+    from fastapi import WebSocket
 
 
 class PlayerState:
-    def __init__(self, player_id: str, name: str, websocket: WebSocket):
+    def __init__(self, player_id: str, name: str, websocket: Optional[WebSocket]):
         self.id = player_id
         self.name = name
         self.websocket = websocket
-        self.hand: List[Dict[str, str]] = []
+        self.hand: int = 0
         self.connected = True
+        # Когда от клиента последний раз что-то приходило и когда игрок
+        # окончательно отключился (time.monotonic()).
+        self.last_seen = 0.0
+        self.disconnected_at: Optional[float] = None
         self.is_out = False
+        self.is_bot = False
+        # Клиент выбрал двоичный подпротокол: состояние уходит байтовыми кадрами.
+        self.binary = False
+        # Что клиент уже получил: от этого считается следующий патч.
+        self.sent_version: Optional[int] = None
+        self.sent_public: Optional[Dict[str, Any]] = None
+        self.sent_private: Optional[Dict[str, Any]] = None
+        self.acked_version = 0
+        self.send_lock = asyncio.Lock()
+        # Кадры состояния с порядковыми номерами: после короткого обрыва
+        # клиент присылает последний полученный seq и получает только пропущенное.
+        self.out_seq = 0
+        self.outbox: Deque[Tuple[int, Any]] = deque(maxlen=OUTBOX_SIZE)
+        # Сокет потерян, но сессия ждёт resume; detached_seq — последний кадр до обрыва.
+        self.detached = False
+        self.detached_seq = 0
+        self.resume_task: Optional[asyncio.Task] = None
 
-    def card_index(self, card: Dict[str, str]) -> int:
-        for idx, owned in enumerate(self.hand):
-            if owned["rank"] == card["rank"] and owned["suit"] == card["suit"]:
-                return idx
-        return -1
+    def reset_sync(self) -> None:
+        self.sent_version = None
+        self.sent_public = None
+        self.sent_private = None
+        self.acked_version = 0
+
+    @property
+    def hand_size(self) -> int:
+        return self.hand.bit_count()
+
+    def has_card(self, card: int) -> bool:
+        return bool(self.hand >> card & 1)
+
+    def add_card(self, card: int) -> None:
+        self.hand |= 1 << card
+
+    def remove_card(self, card: int) -> None:
+        self.hand &= ~(1 << card)
+
+
+class Spectator:
+    # Зритель не сидит за столом: у него нет руки, патчей и outbox, только
+    # последний ещё не отправленный кадр — более новый его вытесняет.
+    __slots__ = ("websocket", "binary", "latest", "wakeup", "task")
+
+    def __init__(self, websocket: WebSocket, binary: bool):
+        self.websocket = websocket
+        self.binary = binary
+        self.latest: Any = None
+        self.wakeup = asyncio.Event()
+        self.task: Optional[asyncio.Task] = None
+
+
+class TableSlot:
+    __slots__ = ("attack", "defense", "attacker_id")
+
+    def __init__(self, attack: int, attacker_id: str):
+        self.attack = attack
+        self.defense: Optional[int] = None
+        self.attacker_id = attacker_id
 
 
 class GameState:
-    def __init__(self, game_id: str, max_players: int):
+    def __init__(self, game_id: str, max_players: int, seed: Optional[int] = None):
         self.id = game_id
         self.max_players = max_players
         self.players: List[PlayerState] = []
+        # Индексы, которые правила обновляют по мере движения карт:
+        # место игрока по id, маска ещё играющих мест, число неотбитых карт.
+        self.seat_of: Dict[str, int] = {}
+        self.active_seats: int = 0
+        self.undefended: int = 0
         self.host_id: Optional[str] = None
         self.phase: str = "lobby"
-        self.deck: List[Dict[str, str]] = []
-        self.discard: List[Dict[str, str]] = []
-        self.trump_card: Optional[Dict[str, str]] = None
+        self.deck: List[int] = []
+        self.discard: int = 0
+        self.trump_card: Optional[int] = None
         self.attacker_index: Optional[int] = None
         self.defender_index: Optional[int] = None
-        self.table: List[Dict[str, Any]] = []
+        self.table: List[TableSlot] = []
+        self.table_ranks: int = 0
         self.status_message: str = "Создайте игру и пригласите друзей."
         self.allow_throw_ins: bool = False
         self.attack_passed: set[str] = set()
         self.lock = asyncio.Lock()
-        self.history: List[str] = []
+        self.seed = generate_seed() if seed is None else seed
+        self.deals = 0
+        self.action_log = ActionLog(self.seed, max_players)
         self.loser_id: Optional[str] = None
         self.attack_limit: int = MAX_ATTACKS
         self.rematch_votes: set[str] = set()
         self.winner_id: Optional[str] = None
-        self.chat_messages: List[Dict[str, str]] = []
+        # Чат живёт отдельно от состояния игры: старые сообщения вытесняются,
+        # а номер seq позволяет клиенту дозапросить пропущенное.
+        self.chat: Deque[Dict[str, Any]] = deque(maxlen=CHAT_HISTORY)
+        self.chat_seq = 0
         self.surrendered_player: Optional[str] = None
+        self.fill_with_bots = False
+        # Публичная комната видна в каталоге лобби и в быстрой игре.
+        self.public = False
+        self.bot_task: Optional[asyncio.Task] = None
+        # Режим склейки: сколько изменений ждут отправки и задача, которая их отправит.
+        self.pending_broadcasts = 0
+        self.flush_task: Optional[asyncio.Task] = None
+        self.version = 0
+        self.last_activity = 0.0
+        # Публичная часть состояния кодируется один раз на версию.
+        self.public_cache_version: Optional[int] = None
+        self.public_state: Optional[Dict[str, Any]] = None
+        self.public_json = ""
+        self.public_patches: Dict[int, str] = {}
+        self.public_binary: Optional[Tuple[int, bytes]] = None
+        self.public_binary_patches: Dict[int, Tuple[int, bytes]] = {}
+        # Зрители по сокету и их общий кадр: JSON и двоичный, по одному на версию.
+        self.spectators: Dict[WebSocket, Spectator] = {}
+        self.spectator_frames: Dict[bool, Tuple[int, Any]] = {}
+        # Ход, на который заведён срок (engine.turn_key).
+        self.turn_key: Optional[Tuple[Any, ...]] = None
+
+    @property
+    def trump_suit(self) -> Optional[int]:
+        if self.trump_card is None:
+            return None
+        return card_suit(self.trump_card)
 
     def find_player(self, player_id: str) -> Optional[PlayerState]:
-        for player in self.players:
-            if player.id == player_id:
-                return player
-        return None
+        seat = self.seat_of.get(player_id)
+        return None if seat is None else self.players[seat]
+
+    def seat_player(self, player: PlayerState) -> int:
+        seat = len(self.players)
+        self.players.append(player)
+        self.seat_of[player.id] = seat
+        if not player.is_out:
+            self.active_seats |= 1 << seat
+        return seat
+
+    @property
+    def active_count(self) -> int:
+        return self.active_seats.bit_count()
+
+    def is_active(self, seat: int) -> bool:
+        return bool(self.active_seats >> seat & 1)
+
+
+def set_player_out(game: GameState, seat: int) -> None:
+    game.players[seat].is_out = True
+    game.active_seats &= ~(1 << seat)
+
+
+def reset_players(game: GameState) -> None:
+    for player in game.players:
+        player.hand = 0
+        player.is_out = False
+    game.active_seats = (1 << len(game.players)) - 1
+
+
+def rebuild_indexes(game: GameState) -> None:
+    # Для состояний, собранных в обход правил (восстановление, поиск ботов).
+    game.seat_of = {player.id: seat for seat, player in enumerate(game.players)}
+    game.active_seats = 0
+    for seat, player in enumerate(game.players):
+        if not player.is_out:
+            game.active_seats |= 1 << seat
+    game.table_ranks = 0
+    game.undefended = 0
+    for slot in game.table:
+        game.table_ranks |= 1 << card_rank(slot.attack)
+        if slot.defense is None:
+            game.undefended += 1
+        else:
+            game.table_ranks |= 1 << card_rank(slot.defense)
+
+
+def check_indexes(game: GameState) -> None:
+    expected_ranks = 0
+    for slot in game.table:
+        expected_ranks |= 1 << card_rank(slot.attack)
+        if slot.defense is not None:
+            expected_ranks |= 1 << card_rank(slot.defense)
+    expected = {
+        "seat_of": {player.id: seat for seat, player in enumerate(game.players)},
+        "active_seats": sum(
+            1 << seat for seat, player in enumerate(game.players) if not player.is_out
+        ),
+        "undefended": sum(1 for slot in game.table if slot.defense is None),
+        "table_ranks": expected_ranks,
+    }
+    for name, value in expected.items():
+        if getattr(game, name) != value:
+            raise AssertionError(f"Index {name} is out of sync: {getattr(game, name)!r} != {value!r}")
+
+
+def table_add_attack(game: GameState, card: int, attacker_id: str) -> None:
+    game.table.append(TableSlot(card, attacker_id))
+    game.table_ranks |= 1 << card_rank(card)
+    game.undefended += 1
+
+
+def table_add_defense(game: GameState, attack_index: int, card: int) -> None:
+    game.table[attack_index].defense = card
+    game.table_ranks |= 1 << card_rank(card)
+    game.undefended -= 1
+
+
+def clear_table(game: GameState) -> int:
+    cards = 0
+    for slot in game.table:
+        cards |= 1 << slot.attack
+        if slot.defense is not None:
+            cards |= 1 << slot.defense
+    game.table.clear()
+    game.table_ranks = 0
+    game.undefended = 0
+    return cards
 
 
 def next_active_index(game: GameState, current: int) -> Optional[int]:
-    if not game.players:
+    # Следующее по кругу место из маски играющих (может вернуть само current).
+    active = game.active_seats
+    if not active:
         return None
-    total = len(game.players)
-    for step in range(1, total + 1):
-        idx = (current + step) % total
-        candidate = game.players[idx]
-        if not candidate.is_out:
-            return idx
-    return None
+    after = active >> (current + 1) << (current + 1)
+    pick = after or active
+    return (pick & -pick).bit_length() - 1
 
 
 def refill_hands(game: GameState, start_index: Optional[int]) -> None:
@@ -82,16 +263,16 @@ def refill_hands(game: GameState, start_index: Optional[int]) -> None:
         visited += 1
     for pos in order:
         player = game.players[pos]
-        while len(player.hand) < 6 and game.deck:
-            player.hand.append(game.deck.pop())
+        while player.hand_size < 6 and game.deck:
+            player.add_card(game.deck.pop())
 
 
 def cleanup_finished_players(game: GameState) -> None:
     if game.deck:
         return
-    for player in game.players:
+    for seat, player in enumerate(game.players):
         if not player.is_out and not player.hand:
-            player.is_out = True
+            set_player_out(game, seat)
 
 
 def ensure_current_roles(game: GameState) -> None:
@@ -115,4 +296,4 @@ def recalc_attack_limit(game: GameState) -> None:
         game.attack_limit = MAX_ATTACKS
         return
     defender = game.players[game.defender_index]
-    game.attack_limit = min(MAX_ATTACKS, max(1, len(defender.hand)))
+    game.attack_limit = min(MAX_ATTACKS, max(1, defender.hand_size))
@@ -0,0 +1,86 @@
+from __future__ import annotations
+
+import cProfile
+import io
+import logging
+import pstats
+import random
+import tracemalloc
+from typing import Dict, Optional
+
+from .config import PROFILE_SAMPLE_RATE, SLOW_ACTION_THRESHOLD, TRACEMALLOC_FRAMES
+from .metrics import inc
+
+logger = logging.getLogger(__name__)
+
+# Доля действий, выполняемых под профилировщиком; меняется через /admin/profile.
+sample_rate = PROFILE_SAMPLE_RATE
+_aggregate: Optional[pstats.Stats] = None
+_sampled = 0
+
+
+def set_sample_rate(rate: float) -> None:
+    global sample_rate
+    sample_rate = min(1.0, max(0.0, rate))
+
+
+def start_profile() -> Optional[cProfile.Profile]:
+    # При выключенном профилировании это одно сравнение.
+    if not sample_rate or random.random() >= sample_rate:
+        return None
+    profiler = cProfile.Profile()
+    profiler.enable()
+    return profiler
+
+
+def stop_profile(profiler: Optional[cProfile.Profile]) -> None:
+    global _aggregate, _sampled
+    if profiler is None:
+        return
+    profiler.disable()
+    _sampled += 1
+    if _aggregate is None:
+        _aggregate = pstats.Stats(profiler)
+    else:
+        _aggregate.add(profiler)
+
+
+def render_profile(sort: str = "cumulative", limit: int = 40) -> str:
+    if _aggregate is None:
+        return f"Нет собранных профилей (доля выборки {sample_rate}).\n"
+    out = io.StringIO()
+    out.write(f"Профилей: {_sampled}, доля выборки {sample_rate}\n")
+    _aggregate.stream = out
+    _aggregate.sort_stats(sort).print_stats(limit)
+    return out.getvalue()
+
+
+def reset_profiles() -> None:
+    global _aggregate, _sampled
+    _aggregate = None
+    _sampled = 0
+
+
+def report_slow_action(game_id: str, action: str, total: float, phases: Dict[str, float]) -> None:
+    if not SLOW_ACTION_THRESHOLD or total < SLOW_ACTION_THRESHOLD:
+        return
+    inc("slow_actions", action=action)
+    breakdown = ", ".join(f"{phase}={seconds * 1000:.1f}ms" for phase, seconds in phases.items())
+    logger.warning("Slow action %s in room %s: %.1fms (%s)", action, game_id, total * 1000, breakdown)
+
+
+def memory_top(limit: int = 20) -> str:
+    if not tracemalloc.is_tracing():
+        tracemalloc.start(max(1, TRACEMALLOC_FRAMES))
+        return "tracemalloc запущен, повторите запрос позже.\n"
+    snapshot = tracemalloc.take_snapshot()
+    current, peak = tracemalloc.get_traced_memory()
+    lines = [f"Сейчас {current / 2**20:.1f} МБ, пик {peak / 2**20:.1f} МБ"]
+    for stat in snapshot.statistics("lineno")[:limit]:
+        lines.append(str(stat))
+    return "\n".join(lines) + "\n"
+
+
+def stop_memory_tracing() -> None:
+    if tracemalloc.is_tracing():
+        tracemalloc.stop()
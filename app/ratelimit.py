@@ -0,0 +1,48 @@
+from __future__ import annotations
+
+import time
+from typing import Dict, Optional, Tuple
+
+from .config import RATE_LIMITS
+
+
+class TokenBucket:
+    __slots__ = ("rate", "capacity", "tokens", "updated")
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+
+    def allow(self, now: float, cost: float = 1.0) -> bool:
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens < cost:
+            return False
+        self.tokens -= cost
+        return True
+
+
+def action_group(action: Optional[str]) -> str:
+    if action in ("send_chat", "sync", "chat_history", "ack", "pong"):
+        return action
+    return "game"
+
+
+class ConnectionLimiter:
+    # Общее ведро на соединение плюс отдельное на каждую группу действий.
+    # Подтверждения и ответы на пинг приходят в ответ на кадры сервера и в общий
+    # лимит не входят, но ограничены своими вёдрами.
+    def __init__(self, limits: Dict[str, Tuple[float, float]] = RATE_LIMITS):
+        self.total = TokenBucket(*limits["total"])
+        self.groups = {
+            group: TokenBucket(*limit) for group, limit in limits.items() if group != "total"
+        }
+
+    def allow(self, action: Optional[str]) -> bool:
+        now = time.monotonic()
+        bucket = self.groups.get(action_group(action))
+        if bucket is not None and not bucket.allow(now):
+            return False
+        return action in ("ack", "pong") or self.total.allow(now)
@@ -0,0 +1,22 @@
+from __future__ import annotations
+
+from typing import Optional
+
+from .action_log import OP_JOIN, ActionLog
+from .engine import add_player, apply_op
+from .models import GameState
+
+
+def replay_game(log: ActionLog, upto: Optional[int] = None, game_id: str = "REPLAY") -> GameState:
+    # Прогоняет журнал через тот же apply_op, что и сервер; upto — число
+    # записей, после которых нужно остановиться.
+    game = GameState(game_id, log.max_players, seed=log.seed)
+    for index, (op, seat, card, arg) in enumerate(log):
+        if upto is not None and index >= upto:
+            break
+        if op == OP_JOIN:
+            player_id, name = log.roster[seat]
+            add_player(game, player_id, name)
+        else:
+            apply_op(game, seat, op, card, arg)
+    return game
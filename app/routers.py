@@ -1,7 +1,20 @@
-from fastapi import FastAPI, WebSocket
+import secrets
+from typing import Optional
 
-from .game_service import create_game, websocket_handler
-from .schemas import CreateGameRequest
+from fastapi import FastAPI, Header, HTTPException, Query, WebSocket
+from fastapi.responses import PlainTextResponse
+
+from . import profiling
+from .config import ADMIN_TOKEN
+from .game_service import (
+    collect_room_metrics,
+    create_game,
+    list_lobbies,
+    quick_match,
+    websocket_handler,
+)
+from .metrics import render_prometheus
+from .schemas import CreateGameRequest, QuickMatchRequest
 
 
 def register_routes(app: FastAPI) -> None:
@@ -9,6 +22,64 @@ def register_routes(app: FastAPI) -> None:
     async def create_game_endpoint(req: CreateGameRequest):
         return await create_game(req)
 
+    @app.get("/api/lobbies")
+    async def list_lobbies_endpoint(
+        maxPlayers: Optional[int] = Query(None, ge=2, le=6),
+        cursor: Optional[str] = None,
+        limit: Optional[int] = Query(None, ge=1, le=100),
+    ):
+        return list_lobbies(maxPlayers, cursor, limit)
+
+    @app.post("/api/quick-match")
+    async def quick_match_endpoint(req: QuickMatchRequest):
+        return await quick_match(req)
+
     @app.websocket("/ws/{game_id}")
     async def websocket_endpoint(websocket: WebSocket, game_id: str):
         await websocket_handler(websocket, game_id)
+
+
+def register_metrics(app: FastAPI) -> None:
+    @app.get("/metrics", response_class=PlainTextResponse)
+    async def metrics_endpoint():
+        collect_room_metrics()
+        return PlainTextResponse(
+            render_prometheus(), media_type="text/plain; version=0.0.4; charset=utf-8"
+        )
+
+
+def register_admin(app: FastAPI) -> None:
+    if not ADMIN_TOKEN:
+        return
+
+    def check_token(token: str) -> None:
+        if not secrets.compare_digest(token, ADMIN_TOKEN):
+            raise HTTPException(status_code=403, detail="Нет доступа")
+
+    @app.get("/admin/profile", response_class=PlainTextResponse)
+    async def admin_profile(
+        sort: str = "cumulative", limit: int = 40, x_admin_token: str = Header("")
+    ):
+        check_token(x_admin_token)
+        return profiling.render_profile(sort, limit)
+
+    @app.post("/admin/profile", response_class=PlainTextResponse)
+    async def admin_profile_control(
+        rate: float = 0.0, reset: bool = False, x_admin_token: str = Header("")
+    ):
+        check_token(x_admin_token)
+        if reset:
+            profiling.reset_profiles()
+        profiling.set_sample_rate(rate)
+        return f"Доля выборки: {profiling.sample_rate}\n"
+
+    @app.get("/admin/memory", response_class=PlainTextResponse)
+    async def admin_memory(limit: int = 20, x_admin_token: str = Header("")):
+        check_token(x_admin_token)
+        return profiling.memory_top(limit)
+
+    @app.delete("/admin/memory", response_class=PlainTextResponse)
+    async def admin_memory_stop(x_admin_token: str = Header("")):
+        check_token(x_admin_token)
+        profiling.stop_memory_tracing()
+        return "tracemalloc остановлен.\n"
@@ -1,5 +1,13 @@
+from typing import Optional
+
 from pydantic import BaseModel, Field
 
 
 class CreateGameRequest(BaseModel):
     maxPlayers: int = Field(ge=2, le=6)
+    fillWithBots: bool = False
+    public: bool = False
+
+
+class QuickMatchRequest(BaseModel):
+    maxPlayers: Optional[int] = Field(default=None, ge=2, le=6)
@@ -0,0 +1,228 @@
+from __future__ import annotations
+
+import asyncio
+import itertools
+import json
+from http import HTTPStatus
+from typing import Any, Dict, List, Optional, Tuple
+from urllib.parse import parse_qsl, urlencode
+
+from .cards import shard_for_game_id
+from .config import LOBBY_PAGE_SIZE
+
+Backend = Tuple[str, int]
+Reply = Tuple[int, bytes]
+
+BAD_GATEWAY = b"HTTP/1.1 502 Bad Gateway\r\nContent-Length: 0\r\nConnection: close\r\n\r\n"
+MAX_HEAD_SIZE = 64 * 1024
+# Каталог лобби у каждого шарда свой: эти запросы маршрутизатор сам
+# рассылает всем шардам и склеивает ответы.
+LOBBY_LIST = ("GET", "/api/lobbies")
+QUICK_MATCH = ("POST", "/api/quick-match")
+# Разделитель курсоров шардов в общем курсоре: "3.17~~1.4".
+CURSOR_SEPARATOR = "~"
+
+
+class ShardRouter:
+    # Маршрутизатор смотрит только на строку запроса: /ws/{game_id} уходит
+    # шарду-владельцу комнаты, запросы к каталогу лобби — всем шардам,
+    # остальное (создание комнат, статика) — по кругу.
+    def __init__(self, backends: List[Backend]):
+        self.backends = backends
+        self._round_robin = itertools.cycle(range(len(backends)))
+
+    def pick_backend(self, path: str) -> Backend:
+        parts = path.split("?", 1)[0].split("/")
+        if len(parts) >= 3 and parts[1] == "ws" and parts[2]:
+            return self.backends[shard_for_game_id(parts[2], len(self.backends))]
+        return self.backends[next(self._round_robin)]
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        backend_writer = None
+        try:
+            head = await reader.readuntil(b"\r\n\r\n")
+            request_line, *header_lines = head[:-4].split(b"\r\n")
+            method, path, _ = request_line.decode("latin-1").split(" ", 2)
+            is_upgrade = any(line.lower().startswith(b"upgrade:") for line in header_lines)
+            route = (method, path.split("?", 1)[0])
+            if not is_upgrade and route in (LOBBY_LIST, QUICK_MATCH):
+                body = await read_body(reader, header_lines)
+                if route == LOBBY_LIST:
+                    status, payload = await self.list_lobbies(path)
+                else:
+                    status, payload = await self.quick_match(body)
+                writer.write(http_response(status, payload))
+                await writer.drain()
+                return
+            if not is_upgrade:
+                # Обычные HTTP-запросы не держим keep-alive: следующий запрос
+                # по тому же соединению мог бы относиться к другому шарду.
+                header_lines = [
+                    line
+                    for line in header_lines
+                    if not line.lower().startswith((b"connection:", b"keep-alive:"))
+                ]
+                header_lines.append(b"Connection: close")
+            host, port = self.pick_backend(path)
+            try:
+                backend_reader, backend_writer = await asyncio.open_connection(host, port)
+            except OSError:
+                writer.write(BAD_GATEWAY)
+                await writer.drain()
+                return
+            backend_writer.write(b"\r\n".join([request_line, *header_lines]) + b"\r\n\r\n")
+            upstream = asyncio.create_task(pipe(reader, backend_writer))
+            await pipe(backend_reader, writer)
+            upstream.cancel()
+        except (asyncio.IncompleteReadError, asyncio.LimitOverrunError, ValueError, ConnectionError):
+            pass
+        finally:
+            for stream in (backend_writer, writer):
+                if stream is not None:
+                    stream.close()
+
+    async def fan_out(self, path: str) -> List[Optional[Dict[str, Any]]]:
+        # Ответ каждого шарда по порядку; недоступный или ответивший ошибкой — None.
+        replies = await asyncio.gather(
+            *(backend_request(backend, "GET", path) for backend in self.backends),
+            return_exceptions=True,
+        )
+        results: List[Optional[Dict[str, Any]]] = []
+        for reply in replies:
+            if isinstance(reply, tuple) and reply[0] == 200:
+                results.append(json.loads(reply[1]))
+            else:
+                results.append(None)
+        return results
+
+    async def list_lobbies(self, path: str) -> Reply:
+        # Общий курсор — курсоры всех шардов через "~". Каждый шард отдаёт
+        # свою страницу, из склейки берутся первые limit комнат, и курсор
+        # шарда сдвигается только до последней взятой у него комнаты.
+        query = dict(parse_qsl(path.partition("?")[2]))
+        cursor = query.pop("cursor", "")
+        cursors = cursor.split(CURSOR_SEPARATOR) if cursor else [""] * len(self.backends)
+        if len(cursors) != len(self.backends):
+            return json_reply(400, {"detail": "Неверный курсор"})
+        try:
+            limit = int(query.get("limit") or LOBBY_PAGE_SIZE)
+        except ValueError:
+            limit = 0
+        paths = []
+        for shard_cursor in cursors:
+            shard_query = dict(query, cursor=shard_cursor) if shard_cursor else query
+            paths.append(f"/api/lobbies?{urlencode(shard_query)}")
+        replies = await asyncio.gather(
+            *(backend_request(backend, "GET", shard_path)
+              for backend, shard_path in zip(self.backends, paths)),
+            return_exceptions=True,
+        )
+        candidates = []
+        more = False
+        for shard, reply in enumerate(replies):
+            if not isinstance(reply, tuple):
+                continue
+            if reply[0] != 200:
+                # Ошибка запроса (неверные параметры) одинакова на всех шардах.
+                return reply
+            result = json.loads(reply[1])
+            more = more or result["nextCursor"] is not None
+            for room in result["rooms"]:
+                free, order = room["cursor"].split(".")
+                candidates.append((int(free), int(order), shard, room))
+        candidates.sort(key=lambda entry: entry[:3])
+        page = candidates[:limit]
+        for _, _, shard, room in page:
+            cursors[shard] = room["cursor"]
+        more = more or len(candidates) > limit
+        next_cursor = CURSOR_SEPARATOR.join(cursors) if more else None
+        return json_reply(200, {"rooms": [room for *_, room in page], "nextCursor": next_cursor})
+
+    async def quick_match(self, body: bytes) -> Reply:
+        # Самое заполненное лобби среди всех шардов; если его нет, комнату
+        # создаёт следующий по кругу шард, как при обычном создании.
+        try:
+            request = json.loads(body or b"{}")
+        except ValueError:
+            request = None
+        if isinstance(request, dict):
+            query = {"limit": "1"}
+            if request.get("maxPlayers") is not None:
+                query["maxPlayers"] = str(request["maxPlayers"])
+            best = None
+            for shard, result in enumerate(await self.fan_out(f"/api/lobbies?{urlencode(query)}")):
+                if result and result["rooms"]:
+                    room = result["rooms"][0]
+                    if best is None or room["freeSeats"] < best[0]:
+                        best = (room["freeSeats"], shard, room["gameId"])
+            if best is not None:
+                return json_reply(200, {"gameId": best[2], "created": False})
+        backend = self.backends[next(self._round_robin)]
+        try:
+            return await backend_request(backend, "POST", QUICK_MATCH[1], body)
+        except OSError:
+            return 502, b""
+
+
+async def read_body(reader: asyncio.StreamReader, header_lines: List[bytes]) -> bytes:
+    for line in header_lines:
+        name, _, value = line.partition(b":")
+        if name.strip().lower() == b"content-length":
+            size = int(value.strip())
+            if size > MAX_HEAD_SIZE:
+                raise ValueError("Request body too large")
+            return await reader.readexactly(size)
+    return b""
+
+
+async def backend_request(backend: Backend, method: str, path: str, body: bytes = b"") -> Reply:
+    host, port = backend
+    reader, writer = await asyncio.open_connection(host, port)
+    try:
+        writer.write(
+            (
+                f"{method} {path} HTTP/1.1\r\nHost: {host}:{port}\r\n"
+                f"Content-Type: application/json\r\nContent-Length: {len(body)}\r\n"
+                "Connection: close\r\n\r\n"
+            ).encode("latin-1")
+            + body
+        )
+        await writer.drain()
+        response = await reader.read()
+    finally:
+        writer.close()
+    head, _, payload = response.partition(b"\r\n\r\n")
+    return int(head.split(b" ", 2)[1]), payload
+
+
+def json_reply(status: int, data: Dict[str, Any]) -> Reply:
+    return status, json.dumps(data, ensure_ascii=False).encode()
+
+
+def http_response(status: int, payload: bytes) -> bytes:
+    return (
+        f"HTTP/1.1 {status} {HTTPStatus(status).phrase}\r\n"
+        f"Content-Type: application/json\r\nContent-Length: {len(payload)}\r\n"
+        "Connection: close\r\n\r\n"
+    ).encode("latin-1") + payload
+
+
+async def pipe(source: asyncio.StreamReader, target: asyncio.StreamWriter) -> None:
+    try:
+        while True:
+            data = await source.read(65536)
+            if not data:
+                break
+            target.write(data)
+            await target.drain()
+        if target.can_write_eof():
+            target.write_eof()
+    except (ConnectionError, OSError):
+        pass
+
+
+async def serve_router(host: str, port: int, backends: List[Backend]) -> None:
+    router = ShardRouter(backends)
+    server = await asyncio.start_server(router.handle, host, port, limit=MAX_HEAD_SIZE)
+    async with server:
+        await server.serve_forever()
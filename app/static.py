@@ -0,0 +1,150 @@
+from __future__ import annotations
+
+import gzip
+import hashlib
+import mimetypes
+import re
+from pathlib import Path
+from typing import Dict, List, NamedTuple, Optional
+
+from starlette.datastructures import Headers
+from starlette.responses import PlainTextResponse, Response
+from starlette.types import Receive, Scope, Send
+
+try:
+    import brotli
+except ImportError:  # brotli не обязателен — тогда отдаём только gzip
+    brotli = None
+
+# Файлы с хешем содержимого в имени (atlas.90d2e633b6.svg) не меняются
+# и кешируются навсегда, остальные браузер перепроверяет по ETag.
+HASHED_NAME = re.compile(r"\.[0-9a-f]{8,}\.[^./]+$")
+IMMUTABLE_CACHE = "public, max-age=31536000, immutable"
+REVALIDATE_CACHE = "no-cache"
+COMPRESSIBLE_TYPES = ("text/", "application/javascript", "application/json", "image/svg+xml")
+MIN_COMPRESS_SIZE = 256
+
+
+class Variant(NamedTuple):
+    body: bytes
+    etag: str
+
+
+class Asset(NamedTuple):
+    media_type: str
+    cache_control: str
+    # Кодировка ("br", "gzip", "identity") -> тело и ETag этой версии.
+    variants: Dict[str, Variant]
+
+
+def _compressible(media_type: str) -> bool:
+    return media_type.startswith(COMPRESSIBLE_TYPES)
+
+
+def _variant(body: bytes, suffix: str = "") -> Variant:
+    digest = hashlib.sha256(body).hexdigest()[:20]
+    return Variant(body, f'"{digest}{suffix}"')
+
+
+def load_asset(path: Path, name: str) -> Asset:
+    body = path.read_bytes()
+    media_type = mimetypes.guess_type(name)[0] or "application/octet-stream"
+    if media_type.startswith("text/") or media_type == "application/javascript":
+        media_type += "; charset=utf-8"
+    variants = {"identity": _variant(body)}
+    if _compressible(media_type) and len(body) >= MIN_COMPRESS_SIZE:
+        # mtime=0 — чтобы сжатый файл и его ETag не менялись между перезапусками.
+        compressed = gzip.compress(body, compresslevel=9, mtime=0)
+        if len(compressed) < len(body):
+            variants["gzip"] = _variant(compressed, "-gz")
+        if brotli is not None:
+            compressed = brotli.compress(body, quality=11)
+            if len(compressed) < len(body):
+                variants["br"] = _variant(compressed, "-br")
+    cache_control = IMMUTABLE_CACHE if HASHED_NAME.search(name) else REVALIDATE_CACHE
+    return Asset(media_type, cache_control, variants)
+
+
+def _accepted_encodings(header: str) -> List[str]:
+    accepted = []
+    for part in header.split(","):
+        coding, *params = part.split(";")
+        quality = 1.0
+        for param in params:
+            key, _, value = param.strip().partition("=")
+            if key == "q":
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        if quality > 0:
+            accepted.append(coding.strip().lower())
+    return accepted
+
+
+def _etag_matches(header: str, etag: str) -> bool:
+    if header.strip() == "*":
+        return True
+    tags = [tag.strip() for tag in header.split(",")]
+    return etag in tags or f"W/{etag}" in tags
+
+
+class StaticAssets:
+    # Замена StaticFiles: все файлы читаются и сжимаются один раз при создании
+    # приложения и отдаются из памяти. После правки файлов нужен перезапуск.
+    def __init__(self, directory: str, index: str = "index.html"):
+        self.index = index
+        self.assets: Dict[str, Asset] = {}
+        root = Path(directory)
+        for path in sorted(root.rglob("*")):
+            if path.is_file():
+                name = path.relative_to(root).as_posix()
+                self.assets[name] = load_asset(path, name)
+
+    def lookup(self, path: str) -> Optional[Asset]:
+        name = path.lstrip("/")
+        if not name or name.endswith("/"):
+            name += self.index
+        asset = self.assets.get(name)
+        if asset is None and "." not in name.rsplit("/", 1)[-1]:
+            asset = self.assets.get(f"{name}/{self.index}")
+        return asset
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        assert scope["type"] == "http"
+        if scope["method"] not in ("GET", "HEAD"):
+            response: Response = PlainTextResponse("Method Not Allowed", status_code=405)
+            await response(scope, receive, send)
+            return
+        path = scope["path"]
+        root_path = scope.get("root_path", "")
+        if root_path and path.startswith(root_path):
+            path = path[len(root_path):]
+        asset = self.lookup(path)
+        if asset is None:
+            await PlainTextResponse("Not Found", status_code=404)(scope, receive, send)
+            return
+        request_headers = Headers(scope=scope)
+        encoding = "identity"
+        accepted = _accepted_encodings(request_headers.get("accept-encoding", ""))
+        for candidate in ("br", "gzip"):
+            if candidate in asset.variants and candidate in accepted:
+                encoding = candidate
+                break
+        variant = asset.variants[encoding]
+        headers = {
+            "ETag": variant.etag,
+            "Cache-Control": asset.cache_control,
+            "Vary": "Accept-Encoding",
+        }
+        if_none_match = request_headers.get("if-none-match")
+        if if_none_match and _etag_matches(if_none_match, variant.etag):
+            await Response(status_code=304, headers=headers)(scope, receive, send)
+            return
+        if encoding != "identity":
+            headers["Content-Encoding"] = encoding
+        body = b"" if scope["method"] == "HEAD" else variant.body
+        response = Response(body, media_type=asset.media_type, headers=headers)
+        if scope["method"] == "HEAD":
+            response.headers["content-length"] = str(len(variant.body))
+        await response(scope, receive, send)
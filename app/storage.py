@@ -1,7 +1,321 @@
 from __future__ import annotations
 
-from typing import Dict
+import asyncio
+import base64
+import heapq
+import itertools
+import json
+import sqlite3
+import time
+import zlib
+from bisect import bisect_left, insort
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterator, List, Optional, Set, Tuple
 
-from .models import GameState
+from .action_log import ActionLog
+from .config import MAX_ROOMS, PERSIST_DELAY, SQLITE_PATH, STORAGE_BACKEND
+from .metrics import inc, observe, set_gauge
+from .models import GameState, PlayerState, TableSlot, rebuild_indexes
 
-games: Dict[str, GameState] = {}
+
+class RoomRegistry:
+    # Комнаты хранятся в порядке последней активности: в начале — самые старые.
+    def __init__(self, max_rooms: int):
+        self.max_rooms = max_rooms
+        self._rooms: OrderedDict[str, GameState] = OrderedDict()
+
+    def __contains__(self, game_id: str) -> bool:
+        return game_id in self._rooms
+
+    def __len__(self) -> int:
+        return len(self._rooms)
+
+    def __iter__(self) -> Iterator[GameState]:
+        return iter(list(self._rooms.values()))
+
+    def get(self, game_id: str) -> Optional[GameState]:
+        return self._rooms.get(game_id)
+
+    def add(self, game: GameState) -> List[GameState]:
+        game.last_activity = time.monotonic()
+        self._rooms[game.id] = game
+        self._rooms.move_to_end(game.id)
+        evicted = []
+        while len(self._rooms) > self.max_rooms:
+            _, oldest = self._rooms.popitem(last=False)
+            evicted.append(oldest)
+        return evicted
+
+    def touch(self, game: GameState) -> None:
+        game.last_activity = time.monotonic()
+        if game.id in self._rooms:
+            self._rooms.move_to_end(game.id)
+
+    def remove(self, game_id: str) -> Optional[GameState]:
+        return self._rooms.pop(game_id, None)
+
+    def least_recent(self, older_than: float) -> Iterator[GameState]:
+        for game in list(self._rooms.values()):
+            if game.last_activity > older_than:
+                break
+            yield game
+
+
+LobbyKey = Tuple[int, int, str]
+
+
+class LobbyIndex:
+    # Каталог открытых публичных лобби. Для каждого размера комнаты — список,
+    # отсортированный по (свободные места, порядок появления, id): первой
+    # стоит самая заполненная комната, поиск и вставка — бинарные.
+    def __init__(self) -> None:
+        self._lists: Dict[int, List[LobbyKey]] = {}
+        self._keys: Dict[str, Tuple[int, LobbyKey]] = {}
+        self._order = itertools.count()
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
+    def update(self, game: GameState) -> None:
+        free = game.max_players - len(game.players)
+        current = self._keys.get(game.id)
+        if not game.public or game.phase != "lobby" or free <= 0:
+            if current is not None:
+                self.discard(game.id)
+            return
+        if current is not None:
+            if current[1][0] == free:
+                return
+            self.discard(game.id)
+            order = current[1][1]
+        else:
+            order = next(self._order)
+        key = (free, order, game.id)
+        insort(self._lists.setdefault(game.max_players, []), key)
+        self._keys[game.id] = (game.max_players, key)
+
+    def discard(self, game_id: str) -> None:
+        entry = self._keys.pop(game_id, None)
+        if entry is None:
+            return
+        max_players, key = entry
+        keys = self._lists[max_players]
+        del keys[bisect_left(keys, key)]
+
+    def match(self, max_players: Optional[int] = None) -> Optional[str]:
+        # Самое заполненное лобби нужного размера, а без размера — любого.
+        sizes = [max_players] if max_players else list(self._lists)
+        best = min(
+            (self._lists[size][0] for size in sizes if self._lists.get(size)),
+            default=None,
+        )
+        return None if best is None else best[2]
+
+    def page(
+        self, max_players: Optional[int], after: Tuple[int, int], limit: int
+    ) -> List[LobbyKey]:
+        # Курсор — (свободные места, порядок) последней выданной комнаты; с него
+        # каждый список продолжается бинарным поиском, и выдача стоит
+        # O(log n + limit), сколько бы комнат ни было.
+        sizes = [max_players] if max_players else list(self._lists)
+        start = (after[0], after[1] + 1)
+        tails = []
+        for size in sizes:
+            keys = self._lists.get(size, [])
+            tails.append(map(keys.__getitem__, range(bisect_left(keys, start), len(keys))))
+        return list(itertools.islice(heapq.merge(*tails), limit))
+
+
+def snapshot_game(game: GameState) -> bytes:
+    data = {
+        "id": game.id,
+        "maxPlayers": game.max_players,
+        "players": [[pl.id, pl.name, pl.hand, pl.is_out, pl.is_bot] for pl in game.players],
+        "host": game.host_id,
+        "phase": game.phase,
+        "deck": game.deck,
+        "discard": game.discard,
+        "trump": game.trump_card,
+        "attacker": game.attacker_index,
+        "defender": game.defender_index,
+        "table": [[slot.attack, slot.defense, slot.attacker_id] for slot in game.table],
+        "status": game.status_message,
+        "throwIns": game.allow_throw_ins,
+        "passed": sorted(game.attack_passed),
+        "loser": game.loser_id,
+        "attackLimit": game.attack_limit,
+        "rematch": sorted(game.rematch_votes),
+        "winner": game.winner_id,
+        "chat": list(game.chat),
+        "surrendered": game.surrendered_player,
+        "fillWithBots": game.fill_with_bots,
+        "public": game.public,
+        "version": game.version,
+        "seed": game.seed,
+        "deals": game.deals,
+        "log": base64.b64encode(game.action_log.to_bytes()).decode(),
+    }
+    return zlib.compress(json.dumps(data, ensure_ascii=False, separators=(",", ":")).encode())
+
+
+def restore_game(blob: bytes) -> GameState:
+    data = json.loads(zlib.decompress(blob))
+    game = GameState(data["id"], data["maxPlayers"], seed=data["seed"])
+    for player_id, name, hand, is_out, *flags in data["players"]:
+        player = PlayerState(player_id, name, None)
+        player.hand = hand
+        player.is_out = is_out
+        player.is_bot = bool(flags and flags[0])
+        player.connected = player.is_bot
+        if not player.is_bot:
+            player.disconnected_at = time.monotonic()
+        game.seat_player(player)
+    game.host_id = data["host"]
+    game.phase = data["phase"]
+    game.deck = data["deck"]
+    game.discard = data["discard"]
+    game.trump_card = data["trump"]
+    game.attacker_index = data["attacker"]
+    game.defender_index = data["defender"]
+    for attack, defense, attacker_id in data["table"]:
+        slot = TableSlot(attack, attacker_id)
+        slot.defense = defense
+        game.table.append(slot)
+    rebuild_indexes(game)
+    game.status_message = data["status"]
+    game.allow_throw_ins = data["throwIns"]
+    game.attack_passed = set(data["passed"])
+    game.loser_id = data["loser"]
+    game.attack_limit = data["attackLimit"]
+    game.rematch_votes = set(data["rematch"])
+    game.winner_id = data["winner"]
+    for message in data["chat"]:
+        game.chat_seq = message.setdefault("seq", game.chat_seq + 1)
+        game.chat.append(message)
+    game.surrendered_player = data["surrendered"]
+    game.fill_with_bots = data.get("fillWithBots", False)
+    game.public = data.get("public", False)
+    game.version = data["version"]
+    game.deals = data["deals"]
+    game.action_log = ActionLog.from_bytes(base64.b64decode(data["log"]))
+    return game
+
+
+class RoomStore:
+    # Хранилище по умолчанию: всё живёт только в памяти процесса.
+    async def start(self) -> None:
+        pass
+
+    async def stop(self) -> None:
+        pass
+
+    async def load_all(self) -> List[GameState]:
+        return []
+
+    def mark_dirty(self, game: GameState) -> None:
+        pass
+
+    def mark_deleted(self, game_id: str) -> None:
+        pass
+
+
+class SqliteRoomStore(RoomStore):
+    # Изменённые комнаты копятся в _dirty и пишутся пачкой в отдельном потоке,
+    # поэтому цикл событий никогда не ждёт диска.
+    def __init__(self, path: str, delay: float = PERSIST_DELAY):
+        self.path = path
+        self.delay = delay
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="durak-sqlite")
+        self._conn: Optional[sqlite3.Connection] = None
+        self._dirty: Dict[str, GameState] = {}
+        self._deleted: Set[str] = set()
+        self._wakeup = asyncio.Event()
+        self._writer: Optional[asyncio.Task] = None
+
+    async def _run(self, func, *args):
+        return await asyncio.get_running_loop().run_in_executor(self._executor, func, *args)
+
+    def _open(self) -> None:
+        self._conn = sqlite3.connect(self.path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS rooms (id TEXT PRIMARY KEY, data BLOB NOT NULL, updated_at REAL NOT NULL)"
+        )
+        self._conn.commit()
+
+    def _read_all(self) -> List[bytes]:
+        return [row[0] for row in self._conn.execute("SELECT data FROM rooms")]
+
+    def _write(self, rows: List[Tuple[str, bytes]], deleted: List[str]) -> None:
+        now = time.time()
+        with self._conn:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO rooms (id, data, updated_at) VALUES (?, ?, ?)",
+                [(game_id, blob, now) for game_id, blob in rows],
+            )
+            self._conn.executemany("DELETE FROM rooms WHERE id = ?", [(game_id,) for game_id in deleted])
+
+    async def start(self) -> None:
+        await self._run(self._open)
+        self._writer = asyncio.create_task(self._write_behind())
+
+    async def stop(self) -> None:
+        if self._writer:
+            self._writer.cancel()
+            self._writer = None
+        await self.flush()
+        if self._conn:
+            await self._run(self._conn.close)
+            self._conn = None
+        self._executor.shutdown(wait=True)
+
+    async def load_all(self) -> List[GameState]:
+        return [restore_game(blob) for blob in await self._run(self._read_all)]
+
+    def mark_dirty(self, game: GameState) -> None:
+        self._dirty[game.id] = game
+        self._deleted.discard(game.id)
+        set_gauge("persist_queue_depth", len(self._dirty) + len(self._deleted))
+        self._wakeup.set()
+
+    def mark_deleted(self, game_id: str) -> None:
+        self._dirty.pop(game_id, None)
+        self._deleted.add(game_id)
+        set_gauge("persist_queue_depth", len(self._dirty) + len(self._deleted))
+        self._wakeup.set()
+
+    async def _write_behind(self) -> None:
+        while True:
+            await self._wakeup.wait()
+            await asyncio.sleep(self.delay)
+            self._wakeup.clear()
+            await self.flush()
+
+    async def flush(self) -> None:
+        if not self._dirty and not self._deleted:
+            return
+        dirty, self._dirty = self._dirty, {}
+        deleted, self._deleted = list(self._deleted), set()
+        set_gauge("persist_queue_depth", 0)
+        rows = [(game_id, snapshot_game(game)) for game_id, game in dirty.items()]
+        started = time.perf_counter()
+        await self._run(self._write, rows, deleted)
+        observe("persist_write_seconds", time.perf_counter() - started)
+        inc("persist_batches")
+        inc("persist_snapshots", len(rows))
+        inc("persist_snapshot_bytes", sum(len(blob) for _, blob in rows))
+
+
+def build_store(backend: str) -> RoomStore:
+    if backend == "sqlite":
+        return SqliteRoomStore(SQLITE_PATH)
+    if backend == "memory":
+        return RoomStore()
+    raise ValueError(f"Unknown storage backend: {backend}")
+
+
+games = RoomRegistry(MAX_ROOMS)
+lobbies = LobbyIndex()
+store = build_store(STORAGE_BACKEND)
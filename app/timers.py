@@ -0,0 +1,68 @@
+from __future__ import annotations
+
+import asyncio
+import heapq
+import itertools
+import time
+from typing import Dict, List, Tuple
+
+# Сколько устаревших записей терпим в куче на одну живую, прежде чем пересобрать её.
+COMPACT_RATIO = 2
+
+
+class DeadlineScheduler:
+    # Один таймер на все комнаты: куча (срок, номер, ключ) и номер текущей
+    # записи для каждого ключа. Перенос и отмена не ищут старую запись,
+    # а только меняют номер; устаревшие записи выбрасываются при выборке,
+    # а когда их становится слишком много, куча пересобирается.
+    def __init__(self) -> None:
+        self._heap: List[Tuple[float, int, str]] = []
+        self._current: Dict[str, int] = {}
+        self._order = itertools.count()
+        self._wakeup = asyncio.Event()
+
+    def __len__(self) -> int:
+        return len(self._current)
+
+    def schedule(self, key: str, deadline: float) -> None:
+        token = next(self._order)
+        self._current[key] = token
+        if not self._heap or deadline < self._heap[0][0]:
+            self._wakeup.set()
+        heapq.heappush(self._heap, (deadline, token, key))
+        if len(self._heap) > COMPACT_RATIO * len(self._current) + 64:
+            self._compact()
+
+    def cancel(self, key: str) -> None:
+        self._current.pop(key, None)
+
+    def _compact(self) -> None:
+        self._heap = [entry for entry in self._heap if self._current.get(entry[2]) == entry[1]]
+        heapq.heapify(self._heap)
+
+    def pop_due(self, now: float) -> List[str]:
+        due = []
+        heap = self._heap
+        while heap and heap[0][0] <= now:
+            _, token, key = heapq.heappop(heap)
+            if self._current.get(key) == token:
+                del self._current[key]
+                due.append(key)
+        return due
+
+    def next_deadline(self) -> float:
+        heap = self._heap
+        while heap and self._current.get(heap[0][2]) != heap[0][1]:
+            heapq.heappop(heap)
+        return heap[0][0] if heap else float("inf")
+
+    async def wait(self) -> None:
+        # Спит до ближайшего срока или до появления более раннего.
+        timeout = self.next_deadline() - time.monotonic()
+        if timeout <= 0:
+            return
+        self._wakeup.clear()
+        try:
+            await asyncio.wait_for(self._wakeup.wait(), None if timeout == float("inf") else timeout)
+        except asyncio.TimeoutError:
+            pass
@@ -0,0 +1,210 @@
+// Двоичный подпротокол (см. app/binary_protocol.py): сервер шлёт состояние
+// и патчи байтами, а здесь они превращаются в те же объекты, что и в JSON.
+const BINARY_PROTOCOL = "durak.bin.v1";
+
+const FRAME_STATE = 1;
+const NONE = 0xff;
+const CMD_ACK = 0x40;
+const CMD_SYNC = 0x41;
+const CMD_CHAT_HISTORY = 0x42;
+const CMD_PONG = 0x43;
+
+const SUITS = ["C", "D", "H", "S"];
+const RANKS = ["6", "7", "8", "9", "10", "J", "Q", "K", "A"];
+const PHASES = ["lobby", "playing", "ended"];
+const ACTION_FLAGS = [
+  "canStart",
+  "canAttack",
+  "canThrow",
+  "canPass",
+  "canDefend",
+  "canTake",
+  "canSurrender",
+];
+const FIELDS = [
+  "id",
+  "phase",
+  "maxPlayers",
+  "players",
+  "deckCount",
+  "discardCount",
+  "trumpCard",
+  "table",
+  "status",
+  "attackerId",
+  "defenderId",
+  "allowThrowIns",
+  "loserId",
+  "winnerId",
+  "rematchVotes",
+  "surrenderedPlayer",
+  "hand",
+  "availableActions",
+];
+// Коды игровых действий совпадают с кодами журнала на сервере.
+const ACTION_CODES = {
+  start_game: 2,
+  play_attack: 3,
+  play_defense: 4,
+  pass_attack: 5,
+  take_cards: 6,
+  request_rematch: 7,
+  cancel_rematch: 8,
+  surrender: 9,
+};
+
+const CARDS = [];
+for (let card = 0; card < SUITS.length * RANKS.length; card += 1) {
+  CARDS.push({ suit: SUITS[card & 3], rank: RANKS[card >> 2] });
+}
+
+const textDecoder = new TextDecoder();
+
+function decodeFrame(buffer, knownPlayers) {
+  const view = new DataView(buffer);
+  const bytes = new Uint8Array(buffer);
+  let pos = 0;
+  const byte = () => bytes[pos++];
+  const u16 = () => {
+    const value = view.getUint16(pos);
+    pos += 2;
+    return value;
+  };
+  const u32 = () => {
+    const value = view.getUint32(pos);
+    pos += 4;
+    return value;
+  };
+  const text = (size) => {
+    const value = textDecoder.decode(bytes.subarray(pos, pos + size));
+    pos += size;
+    return value;
+  };
+  const card = () => {
+    const value = byte();
+    return value === NONE ? null : CARDS[value];
+  };
+
+  const frameType = byte();
+  const message = { seq: u32(), version: u32() };
+  if (frameType === FRAME_STATE) {
+    message.type = "game_state";
+  } else {
+    message.type = "game_patch";
+    message.baseVersion = u32();
+  }
+  const mask = u32();
+  let roster = knownPlayers || [];
+  const playerId = (seat) => (seat < roster.length ? roster[seat].id : null);
+  const values = {};
+  FIELDS.forEach((field, bit) => {
+    if (!((mask >>> bit) & 1)) return;
+    switch (field) {
+      case "id":
+        values.id = text(byte());
+        break;
+      case "phase":
+        values.phase = PHASES[byte()];
+        break;
+      case "maxPlayers":
+      case "deckCount":
+      case "discardCount":
+        values[field] = byte();
+        break;
+      case "players": {
+        const count = byte();
+        roster = [];
+        for (let i = 0; i < count; i += 1) {
+          const flags = byte();
+          const handSize = byte();
+          const id = text(byte());
+          const name = text(byte());
+          roster.push({
+            id,
+            name,
+            handSize,
+            isHost: Boolean(flags & 1),
+            isOut: Boolean(flags & 2),
+            connected: Boolean(flags & 4),
+            isBot: Boolean(flags & 8),
+          });
+        }
+        values.players = roster;
+        break;
+      }
+      case "trumpCard":
+        values.trumpCard = card();
+        break;
+      case "table": {
+        const count = byte();
+        values.table = [];
+        for (let i = 0; i < count; i += 1) {
+          const attack = card();
+          const defense = card();
+          values.table.push({ attack, defense, attackerId: playerId(byte()) });
+        }
+        break;
+      }
+      case "status":
+        values.status = text(u16());
+        break;
+      case "allowThrowIns":
+        values.allowThrowIns = Boolean(byte());
+        break;
+      case "rematchVotes": {
+        const votes = u16();
+        values.rematchVotes = [];
+        for (let seat = 0; seat < 16; seat += 1) {
+          if ((votes >> seat) & 1) values.rematchVotes.push(playerId(seat));
+        }
+        break;
+      }
+      case "hand": {
+        const count = byte();
+        values.hand = [];
+        for (let i = 0; i < count; i += 1) values.hand.push(card());
+        break;
+      }
+      case "availableActions": {
+        const flags = byte();
+        values.availableActions = {};
+        ACTION_FLAGS.forEach((flag, index) => {
+          values.availableActions[flag] = Boolean((flags >> index) & 1);
+        });
+        break;
+      }
+      default:
+        values[field] = playerId(byte());
+    }
+  });
+  message[frameType === FRAME_STATE ? "game" : "changes"] = values;
+  return message;
+}
+
+function cardCode(card) {
+  return RANKS.indexOf(card.rank) * 4 + SUITS.indexOf(card.suit);
+}
+
+function counterCommand(code, value) {
+  const buffer = new ArrayBuffer(5);
+  const view = new DataView(buffer);
+  view.setUint8(0, code);
+  view.setUint32(1, value >>> 0);
+  return buffer;
+}
+
+// Возвращает двоичную команду или null, если действие идёт только в JSON
+// (вход в комнату и чат несут строки и остаются текстовыми).
+function encodeAction(action, payload = {}) {
+  if (action === "ack") return counterCommand(CMD_ACK, payload.version || 0);
+  if (action === "chat_history") return counterCommand(CMD_CHAT_HISTORY, payload.afterSeq || 0);
+  if (action === "sync") return new Uint8Array([CMD_SYNC]).buffer;
+  if (action === "pong") return new Uint8Array([CMD_PONG]).buffer;
+  const code = ACTION_CODES[action];
+  if (code === undefined) return null;
+  const card = payload.card ? cardCode(payload.card) : NONE;
+  const attackIndex = Number.isInteger(payload.attackIndex) ? payload.attackIndex : NONE;
+  return new Uint8Array([code, card, attackIndex]).buffer;
+}
+
+export { BINARY_PROTOCOL, decodeFrame, encodeAction };
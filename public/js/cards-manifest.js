@@ -0,0 +1,4 @@
+// Сгенерировано scripts/generate_cards.py — не редактировать вручную.
+const CARD_ATLAS = "cards/atlas.f0b11cc984.svg";
+
+export { CARD_ATLAS };
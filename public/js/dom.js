@@ -1,3 +1,5 @@
+import { CARD_ATLAS } from "./cards-manifest.js";
+
 const elements = {
   entrySection: document.getElementById("entry-section"),
   waitingScreen: document.getElementById("waiting-screen"),
@@ -8,6 +10,11 @@ const elements = {
   joinNameInput: document.getElementById("join-name"),
   createNameInput: document.getElementById("create-name"),
   createCountInput: document.getElementById("create-count"),
+  createBotsInput: document.getElementById("create-bots"),
+  createPublicInput: document.getElementById("create-public"),
+  quickForm: document.getElementById("quick-form"),
+  quickNameInput: document.getElementById("quick-name"),
+  openLobbies: document.getElementById("open-lobbies"),
   lobbySection: document.getElementById("lobby"),
   gameSection: document.getElementById("game"),
   playersList: document.getElementById("players"),
@@ -59,7 +66,8 @@ function formatCard(card) {
 }
 
 function getCardAsset(card) {
-  return `cards/${card.rank}${card.suit}.svg`;
+  // Все карты лежат в одном атласе и выбираются по <view id="card-6C">.
+  return `${CARD_ATLAS}#card-${card.rank}${card.suit}`;
 }
 
 export default elements;
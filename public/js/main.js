@@ -10,7 +10,7 @@ import {
   updateInviteLink,
   hideDefenseModal,
 } from "./ui.js";
-import { connectToGame, sendAction } from "./network.js";
+import { connectToGame, sendAction, watchGame } from "./network.js";
 
 registerCallbacks({
   onPlayAttack: (card) => sendAction("play_attack", { card }),
@@ -36,7 +36,11 @@ elements.createForm?.addEventListener("submit", async (event) => {
     const response = await fetch("/api/games", {
       method: "POST",
       headers: { "Content-Type": "application/json" },
-      body: JSON.stringify({ maxPlayers: count }),
+      body: JSON.stringify({
+        maxPlayers: count,
+        fillWithBots: Boolean(elements.createBotsInput?.checked),
+        public: Boolean(elements.createPublicInput?.checked),
+      }),
     });
     if (!response.ok) {
       throw new Error("Ошибка создания комнаты.");
@@ -68,6 +72,58 @@ elements.joinForm?.addEventListener("submit", (event) => {
   connectToGame(code, name);
 });
 
+elements.quickForm?.addEventListener("submit", async (event) => {
+  event.preventDefault();
+  const name = elements.quickNameInput.value.trim();
+  if (!name) {
+    showToast("Введите имя.");
+    return;
+  }
+  try {
+    const response = await fetch("/api/quick-match", {
+      method: "POST",
+      headers: { "Content-Type": "application/json" },
+      body: JSON.stringify({}),
+    });
+    if (!response.ok) {
+      throw new Error("Ошибка быстрой игры.");
+    }
+    const data = await response.json();
+    elements.joinCodeInput.value = data.gameId;
+    updateInviteLink(data.gameId);
+    connectToGame(data.gameId, name);
+    showToast(data.created ? "Свободных комнат нет — создана новая." : "Комната найдена!");
+  } catch (error) {
+    showToast("Не удалось найти игру.");
+    console.error(error);
+  }
+});
+
+async function loadOpenLobbies() {
+  if (!elements.openLobbies) return;
+  try {
+    const response = await fetch("/api/lobbies?limit=10");
+    if (!response.ok) return;
+    const data = await response.json();
+    elements.openLobbies.innerHTML = "";
+    data.rooms.forEach((room) => {
+      const item = document.createElement("li");
+      const button = document.createElement("button");
+      button.type = "button";
+      button.className = "secondary";
+      button.textContent = `${room.gameId} — ${room.players}/${room.maxPlayers}`;
+      button.addEventListener("click", () => {
+        elements.joinCodeInput.value = room.gameId;
+        elements.joinNameInput.focus();
+      });
+      item.appendChild(button);
+      elements.openLobbies.appendChild(item);
+    });
+  } catch (error) {
+    console.error(error);
+  }
+}
+
 elements.startButton?.addEventListener("click", () => {
   sendAction("start_game");
 });
@@ -157,7 +213,12 @@ function requestNameAndJoin(gameId) {
 
 const params = new URLSearchParams(window.location.search);
 const presetCode = params.get("game");
-if (presetCode) {
+if (presetCode && params.has("watch")) {
+  // Ссылка вида ?game=ABC123&watch — смотреть партию без места за столом.
+  const normalized = presetCode.toUpperCase();
+  elements.joinCodeInput.value = normalized;
+  watchGame(normalized);
+} else if (presetCode) {
   const normalized = presetCode.toUpperCase();
   elements.joinCodeInput.value = normalized;
   updateInviteLink(normalized);
@@ -171,5 +232,6 @@ if (presetCode) {
   }
 }
 
+loadOpenLobbies();
 renderApp();
 
@@ -4,13 +4,40 @@ import {
   storePlayerId,
   getStoredPlayerName,
   storePlayerName,
+  prefersBinaryProtocol,
 } from "./state.js";
-import { showToast, renderApp, toggleEntryVisibility, resetToMenu } from "./ui.js";
+import {
+  appendChat,
+  showToast,
+  renderApp,
+  resetChat,
+  toggleEntryVisibility,
+  resetToMenu,
+} from "./ui.js";
+import { BINARY_PROTOCOL, decodeFrame, encodeAction } from "./binary.js";
+
+// Паузы перед повторными попытками после обрыва, мс.
+const RECONNECT_DELAYS = [500, 1000, 2000, 4000, 8000];
+// Коды закрытия, после которых переподключаться бессмысленно: лимиты сервера.
+const NO_RECONNECT_CODES = new Set([1008, 1009]);
 
 function normalizeName(name) {
   return name ? name.trim() : "";
 }
 
+function sendFrame(socket, action, payload = {}) {
+  // Если сервер принял двоичный подпротокол, действия уходят короткими
+  // командами; вход и чат всё равно отправляются в JSON.
+  const frame = socket.protocol === BINARY_PROTOCOL ? encodeAction(action, payload) : null;
+  socket.send(frame || JSON.stringify({ action, ...payload }));
+}
+
+function acknowledgeVersion(socket) {
+  // Зрителю сервер всегда шлёт полные снимки, подтверждать нечего.
+  if (state.spectating || socket.readyState !== WebSocket.OPEN) return;
+  sendFrame(socket, "ack", { version: state.version });
+}
+
 function connectToGame(gameId, name) {
   if (!gameId) return;
   const normalized = normalizeName(name) || getStoredPlayerName(gameId);
@@ -18,36 +45,110 @@ function connectToGame(gameId, name) {
     state.playerName = normalized;
     storePlayerName(gameId, normalized);
   }
+  if (state.gameId !== gameId) {
+    resetChat();
+  }
   state.gameId = gameId;
+  state.version = null;
+  state.seq = 0;
+  state.spectating = false;
+  openSocket(gameId, false, 0);
+}
+
+function watchGame(gameId) {
+  if (!gameId) return;
+  if (state.gameId !== gameId) {
+    resetChat();
+  }
+  state.gameId = gameId;
+  state.version = null;
+  state.seq = 0;
+  state.spectating = true;
+  openSocket(gameId, false, 0);
+}
+
+function sendJoin(socket, gameId) {
+  socket.send(
+    JSON.stringify({
+      action: "join",
+      playerName: state.playerName || getStoredPlayerName(gameId),
+      playerId: getStoredPlayerId(gameId),
+    })
+  );
+}
+
+function openSocket(gameId, resume, attempt) {
   const protocol = window.location.protocol === "https:" ? "wss" : "ws";
   const wsUrl = `${protocol}://${window.location.host}/ws/${gameId}`;
-  if (state.socket) {
-    state.socket.close();
-  }
-  const socket = new WebSocket(wsUrl);
+  const previous = state.socket;
+  const socket = prefersBinaryProtocol()
+    ? new WebSocket(wsUrl, [BINARY_PROTOCOL])
+    : new WebSocket(wsUrl);
+  socket.binaryType = "arraybuffer";
   state.socket = socket;
+  if (previous) {
+    previous.close();
+  }
   socket.onopen = () => {
-    socket.send(
-      JSON.stringify({
-        action: "join",
-        playerName: state.playerName || getStoredPlayerName(gameId),
-        playerId: getStoredPlayerId(gameId),
-      })
-    );
+    // После обрыва продолжаем сессию с последнего полученного кадра,
+    // а не входим заново с полным снимком.
+    if (state.spectating) {
+      socket.send(JSON.stringify({ action: "spectate" }));
+    } else if (resume) {
+      socket.send(
+        JSON.stringify({ action: "resume", playerId: state.playerId, lastSeq: state.seq })
+      );
+    } else {
+      sendJoin(socket, gameId);
+    }
   };
   socket.onmessage = ({ data }) => {
-    const payload = JSON.parse(data);
-    if (payload.type === "joined") {
+    const payload =
+      typeof data === "string" ? JSON.parse(data) : decodeFrame(data, state.game?.players);
+    if (payload.seq !== undefined) {
+      // Повторно присланные при возобновлении кадры пропускаем.
+      if (payload.seq <= state.seq) return;
+      state.seq = payload.seq;
+    }
+    if (payload.type === "spectating") {
+      attempt = 0;
+      toggleEntryVisibility(true);
+    } else if (payload.type === "resumed") {
+      attempt = 0;
+      sendFrame(socket, "chat_history", { afterSeq: state.chatSeq });
+    } else if (payload.type === "joined") {
+      attempt = 0;
       state.playerId = payload.playerId;
       storePlayerId(payload.gameId, payload.playerId);
       storePlayerName(payload.gameId, state.playerName);
+      sendFrame(socket, "chat_history", { afterSeq: state.chatSeq });
       toggleEntryVisibility(true);
       const nextUrl = new URL(window.location.href);
       nextUrl.searchParams.set("game", payload.gameId);
       window.history.replaceState({}, "", nextUrl.toString());
     } else if (payload.type === "game_state") {
       state.game = payload.game;
+      state.version = payload.version;
+      acknowledgeVersion(socket);
+      renderApp();
+    } else if (payload.type === "game_patch") {
+      if (!state.game || payload.baseVersion !== state.version) {
+        sendFrame(socket, "sync");
+        return;
+      }
+      Object.assign(state.game, payload.changes);
+      state.version = payload.version;
+      acknowledgeVersion(socket);
       renderApp();
+    } else if (payload.type === "ping") {
+      sendFrame(socket, "pong");
+    } else if (payload.type === "chat_message") {
+      appendChat([payload.message]);
+    } else if (payload.type === "chat_history") {
+      appendChat(payload.messages);
+    } else if (payload.type === "error" && payload.code === "resume_failed") {
+      state.seq = 0;
+      sendJoin(socket, gameId);
     } else if (payload.type === "error") {
       showToast(payload.message);
     } else if (payload.type === "return_to_menu") {
@@ -59,8 +160,21 @@ function connectToGame(gameId, name) {
       showToast("Игра завершена. Создайте новую комнату или присоединяйтесь заново.");
     }
   };
-  socket.onclose = () => {
-    showToast("Соединение закрыто.");
+  socket.onclose = ({ code }) => {
+    // Сокет заменён новым или закрыт намеренно (выход в меню).
+    if (state.socket !== socket) return;
+    state.socket = null;
+    const canReconnect = state.playerId || state.spectating;
+    if (!canReconnect || NO_RECONNECT_CODES.has(code) || attempt >= RECONNECT_DELAYS.length) {
+      showToast("Соединение закрыто.");
+      return;
+    }
+    showToast("Связь потеряна, переподключаемся…");
+    setTimeout(() => {
+      if (!state.socket && state.gameId === gameId) {
+        openSocket(gameId, !state.spectating, attempt + 1);
+      }
+    }, RECONNECT_DELAYS[attempt]);
   };
 }
 
@@ -69,7 +183,7 @@ function sendAction(action, payload = {}) {
     showToast("Нет соединения с сервером.");
     return;
   }
-  state.socket.send(JSON.stringify({ action, ...payload }));
+  sendFrame(state.socket, action, payload);
 }
 
-export { connectToGame, sendAction };
+export { connectToGame, sendAction, watchGame };
@@ -2,21 +2,26 @@ const state = {
   socket: null,
   playerId: null,
   playerName: "",
+  // Режим зрителя: только публичное состояние, без руки и действий.
+  spectating: false,
   gameId: null,
   inviteMode: false,
   inviteGameId: null,
   waitingOnly: false,
   game: null,
+  version: null,
+  seq: 0,
   handSnapshot: new Set(),
   tableSnapshot: new Set(),
   lastPhase: null,
   handPositions: new Map(),
-  lastChatLength: 0,
+  chatSeq: 0,
   playerColors: new Map(),
 };
 
 const PLAYER_KEY = (gameId) => `durak-player-${gameId}`;
 const NAME_KEY = (gameId) => `durak-name-${gameId}`;
+const BINARY_KEY = "durak-binary";
 
 function getStoredPlayerId(gameId) {
   if (!gameId) return null;
@@ -38,10 +43,21 @@ function storePlayerName(gameId, name) {
   localStorage.setItem(NAME_KEY(gameId), name);
 }
 
+function prefersBinaryProtocol() {
+  // Двоичный протокол включается по желанию: ?binary=1 в адресе включает его
+  // и запоминает, ?binary=0 выключает. По умолчанию — JSON.
+  const flag = new URLSearchParams(window.location.search).get("binary");
+  if (flag !== null) {
+    localStorage.setItem(BINARY_KEY, flag === "0" ? "0" : "1");
+  }
+  return localStorage.getItem(BINARY_KEY) === "1";
+}
+
 export {
   state,
   getStoredPlayerId,
   storePlayerId,
   getStoredPlayerName,
   storePlayerName,
+  prefersBinaryProtocol,
 };
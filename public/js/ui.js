@@ -22,6 +22,7 @@ const SUIT_INDEX = SUIT_ORDER.reduce((acc, suit, idx) => {
 }, {});
 
 const CARD_RENDER_OPTIONS = { rotationBase: 5 };
+const CHAT_LIMIT = 200;
 let toastTimer = null;
 let callbacks = {
   onPlayAttack: null,
@@ -142,7 +143,7 @@ function renderApp() {
   if (!inLobby && state.waitingOnly) {
     exitWaitingState();
   }
-  toggleEntryVisibility(Boolean(state.playerId));
+  toggleEntryVisibility(Boolean(state.playerId || state.spectating));
   const { game } = state;
   if (inLobby) {
     if (state.inviteMode || state.waitingOnly) {
@@ -156,9 +157,7 @@ function renderApp() {
       }
       renderPlayers(game);
       if (elements.startButton) {
-        const me = game.players.find((p) => p.id === state.playerId);
-        const activePlayers = game.players.filter((p) => !p.isOut);
-        const canStart = Boolean(me?.isHost) && activePlayers.length >= 2;
+        const canStart = Boolean(game.availableActions?.canStart);
         elements.startButton.classList.toggle("hidden", !canStart);
       }
     }
@@ -189,7 +188,7 @@ function renderPlayers(game) {
     const li = document.createElement("li");
     const spanName = document.createElement("span");
     spanName.textContent = `${player.name}${
-      player.id === state.playerId ? " (вы)" : ""
+      player.id === state.playerId ? " (вы)" : player.isBot ? " (бот)" : ""
     }`;
     li.appendChild(spanName);
     const detail = document.createElement("span");
@@ -281,7 +280,7 @@ function renderHand(game) {
   const previousPositions = state.handPositions || new Map();
   elements.handContainer.innerHTML = "";
   if (!me) return;
-  const sortedHand = sortHandCards(me.hand, game.trumpCard?.suit);
+  const sortedHand = sortHandCards(game.hand || [], game.trumpCard?.suit);
   const total = sortedHand.length;
   const center = (total - 1) / 2;
   const overlap = Math.min(80, 20 + total * 4);
@@ -518,7 +517,9 @@ function toggleWinnerModal(game) {
 
 function resetToMenu() {
   state.game = null;
+  state.version = null;
   state.playerId = null;
+  state.spectating = false;
   state.inviteMode = false;
   state.inviteGameId = null;
   state.waitingOnly = false;
@@ -526,7 +527,7 @@ function resetToMenu() {
   state.tableSnapshot = new Set();
   state.lastPhase = null;
   state.handPositions = new Map();
-  state.lastChatLength = 0;
+  resetChat();
   state.playerColors = new Map();
   elements.winnerModal?.classList.add("hidden");
   elements.lobbySection?.classList.add("hidden");
@@ -537,11 +538,13 @@ function resetToMenu() {
 
 export {
   activateInviteMode,
+  appendChat,
   deactivateInviteMode,
   exitWaitingState,
   resetToMenu,
   registerCallbacks,
   renderApp,
+  resetChat,
   requestInviteName,
   showToast,
   toggleEntryVisibility,
@@ -549,17 +552,27 @@ export {
   hideDefenseModal,
 };
 function renderChat(game) {
-  if (!elements.chatPanel || !elements.chatLog) return;
+  if (!elements.chatPanel) return;
   const visible = Boolean(state.playerId) && game.phase !== "lobby";
   elements.chatPanel.classList.toggle("hidden", !visible);
-  if (!visible) return;
+}
+
+function resetChat() {
+  state.chatSeq = 0;
+  if (elements.chatLog) elements.chatLog.innerHTML = "";
+}
+
+function appendChat(messages) {
+  if (!elements.chatLog) return;
   const log = elements.chatLog;
-  const previousCount = state.lastChatLength || 0;
   const atBottom = log.scrollHeight - log.scrollTop - log.clientHeight < 40;
-  log.innerHTML = "";
-  game.chat.forEach((message) => {
+  let added = false;
+  messages.forEach((message) => {
+    // История после переподключения может прийти позже живых сообщений.
+    if (log.querySelector(`[data-seq="${message.seq}"]`)) return;
     const entry = document.createElement("div");
     entry.className = "chat-message";
+    entry.dataset.seq = message.seq;
     const name = document.createElement("strong");
     name.textContent = message.playerName || "Игрок";
     const body = document.createElement("span");
@@ -567,10 +580,18 @@ function renderChat(game) {
     body.textContent = `: ${payload}`;
     entry.appendChild(name);
     entry.appendChild(body);
-    log.appendChild(entry);
+    const next =
+      message.seq < state.chatSeq
+        ? Array.from(log.children).find((el) => Number(el.dataset.seq) > message.seq)
+        : null;
+    log.insertBefore(entry, next || null);
+    state.chatSeq = Math.max(state.chatSeq, message.seq);
+    added = true;
   });
-  if (atBottom || game.chat.length > previousCount) {
+  while (log.children.length > CHAT_LIMIT) {
+    log.firstElementChild.remove();
+  }
+  if (added && atBottom) {
     log.scrollTop = log.scrollHeight;
   }
-  state.lastChatLength = game.chat.length;
 }
@@ -0,0 +1,68 @@
+import asyncio
+import os
+import signal
+import subprocess
+import sys
+from typing import Dict, List
+
+from app.sharding import serve_router
+
+
+def build_worker_command(port: int) -> List[str]:
+    return [
+        sys.executable,
+        "-m",
+        "uvicorn",
+        "server:app",
+        "--host",
+        "127.0.0.1",
+        "--port",
+        str(port),
+    ]
+
+
+def build_worker_env(index: int, count: int) -> Dict[str, str]:
+    env = dict(os.environ)
+    env["DURAK_SHARD_INDEX"] = str(index)
+    env["DURAK_SHARD_COUNT"] = str(count)
+    sqlite_path = env.get("DURAK_SQLITE_PATH", "durak.sqlite3")
+    root, ext = os.path.splitext(sqlite_path)
+    env["DURAK_SQLITE_PATH"] = f"{root}.shard{index}{ext}"
+    return env
+
+
+def run_shards(port: int, count: int) -> None:
+    worker_ports = [port + 1 + index for index in range(count)]
+    workers = [
+        subprocess.Popen(build_worker_command(worker_port), env=build_worker_env(index, count))
+        for index, worker_port in enumerate(worker_ports)
+    ]
+
+    def handle_sig(signum, frame):
+        raise KeyboardInterrupt
+
+    signal.signal(signal.SIGTERM, handle_sig)
+    backends = [("127.0.0.1", worker_port) for worker_port in worker_ports]
+    try:
+        asyncio.run(serve_router("0.0.0.0", port, backends))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        terminate_workers(workers)
+
+
+def terminate_workers(workers: List[subprocess.Popen]) -> None:
+    for proc in workers:
+        if proc.poll() is None:
+            proc.terminate()
+    for proc in workers:
+        try:
+            proc.wait(timeout=5)
+        except subprocess.TimeoutExpired:
+            proc.kill()
+
+
+if __name__ == "__main__":
+    port = int(os.environ.get("APP_PORT", "8000"))
+    count = int(os.environ.get("DURAK_SHARDS", str(os.cpu_count() or 1)))
+    run_shards(port, count)
@@ -0,0 +1,135 @@
+# Сравнение JSON и двоичного протокола на одних и тех же партиях: размер
+# кадров и время кодирования/декодирования. Попутно проверяет, что после
+# разбора оба протокола дают клиенту одинаковое состояние.
+#
+#   python scripts/bench_protocol.py --games 200 --players 4
+import argparse
+import json
+import random
+import sys
+import time
+from pathlib import Path
+from typing import Any, Dict, List
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from app.action_log import OP_SURRENDER  # noqa: E402
+from app.binary_protocol import decode_frame  # noqa: E402
+from app.engine import DurakEngine  # noqa: E402
+from app.game_service import build_state_message  # noqa: E402
+from app.models import GameState, PlayerState  # noqa: E402
+
+MAX_STEPS = 5000
+
+
+class Totals:
+    def __init__(self) -> None:
+        self.frames = 0
+        self.bytes = 0
+        self.full_frames = 0
+        self.full_bytes = 0
+        self.encode_seconds = 0.0
+        self.decode_seconds = 0.0
+
+    def report(self, name: str) -> Dict[str, float]:
+        return {
+            "protocol": name,
+            "frames": self.frames,
+            "avg_patch_bytes": round(self.bytes / max(1, self.frames), 1),
+            "avg_state_bytes": round(self.full_bytes / max(1, self.full_frames), 1),
+            "encode_us_per_frame": round(self.encode_seconds / max(1, self.frames) * 1e6, 2),
+            "decode_us_per_frame": round(self.decode_seconds / max(1, self.frames) * 1e6, 2),
+        }
+
+
+def frame_size(frame: Any) -> int:
+    return len(frame) if isinstance(frame, bytes) else len(frame.encode())
+
+
+def encode_round(game: GameState, viewers: List[PlayerState], totals: Totals) -> List[Any]:
+    # Публичный кеш сбрасывается, чтобы каждый протокол платил за сборку состояния сам.
+    game.public_cache_version = None
+    started = time.perf_counter()
+    frames = [build_state_message(game, viewer) for viewer in viewers]
+    totals.encode_seconds += time.perf_counter() - started
+    for viewer in viewers:
+        viewer.acked_version = game.version
+    return frames
+
+
+def apply_frame(view: Dict[str, Any], message: Dict[str, Any]) -> Dict[str, Any]:
+    if message["type"] == "game_state":
+        return dict(message["game"])
+    view.update(message["changes"])
+    return view
+
+
+def run(games: int, players: int, seed: int) -> List[Dict[str, float]]:
+    rng = random.Random(seed)
+    json_totals = Totals()
+    binary_totals = Totals()
+    for _ in range(games):
+        engine = DurakEngine.new_game(players, seed=rng.getrandbits(63))
+        game = engine.state
+        # Зрители вне комнаты с теми же id: у каждого свой «отправленный» снимок.
+        json_viewers = [PlayerState(pl.id, pl.name, None) for pl in game.players]
+        binary_viewers = [PlayerState(pl.id, pl.name, None) for pl in game.players]
+        for viewer in binary_viewers:
+            viewer.binary = True
+        json_views: List[Dict[str, Any]] = [{} for _ in game.players]
+        binary_views: List[Dict[str, Any]] = [{} for _ in game.players]
+        steps = 0
+        while True:
+            game.version += 1
+            for viewers, totals, views, decode in (
+                (json_viewers, json_totals, json_views, json.loads),
+                (binary_viewers, binary_totals, binary_views, None),
+            ):
+                frames = encode_round(game, viewers, totals)
+                for seat, frame in enumerate(frames):
+                    if frame is None:
+                        continue
+                    started = time.perf_counter()
+                    if decode is None:
+                        message = decode_frame(frame, views[seat].get("players"))
+                    else:
+                        message = decode(frame)
+                    totals.decode_seconds += time.perf_counter() - started
+                    totals.frames += 1
+                    totals.bytes += frame_size(frame)
+                    views[seat] = apply_frame(views[seat], message)
+            if json_views != binary_views:
+                raise AssertionError(f"Состояния разошлись на ходу {steps}")
+            # Полные снимки — то, что получает клиент при входе и переподключении.
+            for totals, binary in ((json_totals, False), (binary_totals, True)):
+                probe = PlayerState(game.players[0].id, "", None)
+                probe.binary = binary
+                totals.full_frames += 1
+                totals.full_bytes += frame_size(build_state_message(game, probe))
+            if engine.is_over or steps >= MAX_STEPS:
+                break
+            actions = engine.legal_actions()
+            candidates = [action for action in actions if action.op != OP_SURRENDER]
+            engine.apply(rng.choice(candidates or actions))
+            steps += 1
+    return [json_totals.report("json"), binary_totals.report("binary")]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--games", type=int, default=100)
+    parser.add_argument("--players", type=int, default=4)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    results = run(args.games, args.players, args.seed)
+    for result in results:
+        print(json.dumps(result, ensure_ascii=False))
+    json_result, binary_result = results
+    print(
+        f"Патч: {binary_result['avg_patch_bytes'] / json_result['avg_patch_bytes']:.0%} от JSON, "
+        f"полное состояние: {binary_result['avg_state_bytes'] / json_result['avg_state_bytes']:.0%}"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,151 @@
+# Проверка шардирования: под нагрузкой на шард 0 комната на шарде 1
+# должна отвечать так же быстро, как без нагрузки.
+#
+#   python scripts/check_shards.py
+import asyncio
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+import urllib.request
+from pathlib import Path
+from typing import List
+
+import websockets
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+from app.cards import shard_for_game_id  # noqa: E402
+
+PORT = int(os.environ.get("CHECK_PORT", "8700"))
+SHARDS = 2
+LOAD_ROOMS = int(os.environ.get("CHECK_LOAD_ROOMS", "40"))
+LOAD_PLAYERS = 5
+PROBES = 40
+
+
+def http_post(path: str, payload: dict) -> dict:
+    request = urllib.request.Request(
+        f"http://127.0.0.1:{PORT}{path}",
+        data=json.dumps(payload).encode(),
+        headers={"Content-Type": "application/json"},
+    )
+    with urllib.request.urlopen(request, timeout=10) as response:
+        return json.loads(response.read())
+
+
+def wait_until_ready(timeout: float = 20.0) -> None:
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            http_post("/api/games", {"maxPlayers": 2})
+            return
+        except OSError:
+            time.sleep(0.2)
+    raise SystemExit("Шарды не поднялись.")
+
+
+def create_room_on(shard: int) -> str:
+    while True:
+        game_id = http_post("/api/games", {"maxPlayers": LOAD_PLAYERS + 1})["gameId"]
+        if shard_for_game_id(game_id, SHARDS) == shard:
+            return game_id
+
+
+async def join(game_id: str, name: str):
+    socket = await websockets.connect(f"ws://127.0.0.1:{PORT}/ws/{game_id}", max_size=None)
+    await socket.send(json.dumps({"action": "join", "playerName": name}))
+    return socket
+
+
+async def drain(socket) -> None:
+    try:
+        async for _ in socket:
+            pass
+    except websockets.ConnectionClosed:
+        pass
+
+
+async def spam(socket, stop: asyncio.Event) -> None:
+    while not stop.is_set():
+        try:
+            await socket.send(json.dumps({"action": "send_chat", "message": "нагрузка"}))
+        except websockets.ConnectionClosed:
+            return
+        await asyncio.sleep(0.05)
+
+
+async def probe(socket, count: int) -> List[float]:
+    latencies = []
+    for _ in range(count):
+        started = time.perf_counter()
+        await socket.send(json.dumps({"action": "send_chat", "message": "проба"}))
+        while True:
+            message = json.loads(await socket.recv())
+            if "проба" in json.dumps(message, ensure_ascii=False):
+                break
+        latencies.append((time.perf_counter() - started) * 1000)
+        await asyncio.sleep(0.05)
+    return latencies
+
+
+def p95(values: List[float]) -> float:
+    return statistics.quantiles(values, n=20)[-1]
+
+
+async def run_check() -> None:
+    quiet_room = await asyncio.to_thread(create_room_on, 1)
+    prober = await join(quiet_room, "проба")
+    await prober.recv()
+    await prober.recv()
+    baseline = await probe(prober, PROBES)
+
+    load_rooms = [await asyncio.to_thread(create_room_on, 0) for _ in range(LOAD_ROOMS)]
+    sockets = [
+        await join(game_id, f"p{index}") for game_id in load_rooms for index in range(LOAD_PLAYERS)
+    ]
+    stop = asyncio.Event()
+    tasks = [asyncio.create_task(drain(socket)) for socket in sockets]
+    tasks += [asyncio.create_task(spam(socket, stop)) for socket in sockets]
+    await asyncio.sleep(1.0)
+    loaded_prober = await join(load_rooms[0], "проба")
+    await loaded_prober.recv()
+    loaded_shard = await probe(loaded_prober, PROBES)
+    other_shard = await probe(prober, PROBES)
+    stop.set()
+    for task in tasks:
+        task.cancel()
+    for socket in sockets + [prober, loaded_prober]:
+        await socket.close()
+
+    print(f"шард 1 без нагрузки: p95 {p95(baseline):.1f} мс")
+    print(f"шард 0 под нагрузкой: p95 {p95(loaded_shard):.1f} мс")
+    print(f"шард 1 при нагрузке на шард 0: p95 {p95(other_shard):.1f} мс")
+    if p95(other_shard) > max(3 * p95(baseline), p95(baseline) + 50):
+        raise SystemExit("Комната на шарде 1 замедлилась вместе с шардом 0.")
+    print("OK: шарды работают независимо.")
+
+
+def main() -> None:
+    # Нагрузка здесь нарочно выше пользовательских лимитов частоты.
+    env = dict(
+        os.environ,
+        APP_PORT=str(PORT),
+        DURAK_SHARDS=str(SHARDS),
+        DURAK_RATE_TOTAL="1000:1000",
+        DURAK_RATE_CHAT="1000:1000",
+    )
+    proc = subprocess.Popen([sys.executable, "run_sharded.py"], cwd=ROOT, env=env)
+    try:
+        wait_until_ready()
+        asyncio.run(run_check())
+    finally:
+        proc.terminate()
+        proc.wait(timeout=10)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,3 +1,4 @@
+import hashlib
 import os
 from pathlib import Path
 
@@ -10,6 +11,9 @@ SUITS = {
 }
 COLORS = {"C": "#111", "S": "#111", "D": "#c62121", "H": "#c62121"}
 OUTPUT_DIR = Path("public/cards")
+MANIFEST_PATH = Path("public/js/cards-manifest.js")
+CARD_WIDTH = 140
+CARD_HEIGHT = 200
 
 SVG_TEMPLATE = """<svg xmlns="http://www.w3.org/2000/svg" width="140" height="200" viewBox="0 0 140 200">
   <rect x="4" y="4" width="132" height="192" rx="16" ry="16" fill="#fff" stroke="#1d2333" stroke-width="4"/>
@@ -23,6 +27,65 @@ SVG_TEMPLATE = """<svg xmlns="http://www.w3.org/2000/svg" width="140" height="20
 </svg>
 """
 
+# Атлас: все карты в одном файле, рамка и шрифт описаны один раз, угол карты
+# переиспользуется через <use>. Каждой карте соответствует <view>, поэтому
+# клиент берёт её как cards/atlas.<хеш>.svg#card-6C одним запросом на все карты.
+ATLAS_HEADER = """<svg xmlns="http://www.w3.org/2000/svg" width="{width}" height="{height}" viewBox="0 0 {width} {height}" font-family="'Segoe UI', sans-serif" font-weight="600">
+  <defs>
+    <rect id="frame" x="4" y="4" width="132" height="192" rx="16" ry="16" fill="#fff" stroke="#1d2333" stroke-width="4"/>
+  </defs>
+"""
+
+ATLAS_CARD = """  <view id="card-{name}" viewBox="{x} {y} {w} {h}"/>
+  <g transform="translate({x} {y})" fill="{color}">
+    <use href="#frame"/>
+    <g id="corner-{name}">
+      <text x="16" y="32" font-size="26">{rank}</text>
+      <text x="20" y="58" font-size="28" font-weight="400">{symbol}</text>
+    </g>
+    <use href="#corner-{name}" transform="rotate(180 70 100)"/>
+    <text x="70" y="110" text-anchor="middle" font-size="72">{symbol}</text>
+  </g>
+"""
+
+MANIFEST_TEMPLATE = """// Сгенерировано scripts/generate_cards.py — не редактировать вручную.
+const CARD_ATLAS = "cards/{atlas}";
+
+export {{ CARD_ATLAS }};
+"""
+
+
+def build_atlas() -> str:
+    parts = [ATLAS_HEADER.format(width=CARD_WIDTH * len(RANKS), height=CARD_HEIGHT * len(SUITS))]
+    for row, (suit, symbol) in enumerate(SUITS.items()):
+        for column, rank in enumerate(RANKS):
+            parts.append(
+                ATLAS_CARD.format(
+                    name=f"{rank}{suit}",
+                    x=column * CARD_WIDTH,
+                    y=row * CARD_HEIGHT,
+                    w=CARD_WIDTH,
+                    h=CARD_HEIGHT,
+                    color=COLORS[suit],
+                    rank=rank,
+                    symbol=symbol,
+                )
+            )
+    parts.append("</svg>\n")
+    return "".join(parts)
+
+
+def write_atlas() -> str:
+    atlas = build_atlas()
+    digest = hashlib.sha256(atlas.encode("utf-8")).hexdigest()[:10]
+    name = f"atlas.{digest}.svg"
+    for stale in OUTPUT_DIR.glob("atlas.*.svg"):
+        if stale.name != name:
+            os.remove(stale)
+    (OUTPUT_DIR / name).write_text(atlas, encoding="utf-8")
+    MANIFEST_PATH.write_text(MANIFEST_TEMPLATE.format(atlas=name), encoding="utf-8")
+    return name
+
 
 def main() -> None:
     OUTPUT_DIR.mkdir(parents=True, exist_ok=True)
@@ -33,6 +96,7 @@ def main() -> None:
             svg = SVG_TEMPLATE.format(color=color, rank=rank, symbol=symbol)
             (OUTPUT_DIR / f"{name}.svg").write_text(svg, encoding="utf-8")
     print("Generated 36 SVG cards in", OUTPUT_DIR)
+    print("Generated atlas", OUTPUT_DIR / write_atlas(), "and", MANIFEST_PATH)
 
 
 if __name__ == "__main__":
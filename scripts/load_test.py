@@ -0,0 +1,387 @@
+# Нагрузочный тест: поднимает сервер, создаёт комнаты через /api/games,
+# рассаживает в них клиентов по /ws/{game_id} и играет по availableActions.
+# Итог (задержки p50/p95/p99, сообщения в секунду, байты на кадр, RSS сервера)
+# пишется в JSON, чтобы сравнивать прогоны до и после изменений.
+#
+#   python scripts/load_test.py --rooms 1000 --players 3 --duration 60 --output before.json
+import argparse
+import asyncio
+import json
+import os
+import random
+import resource
+import statistics
+import subprocess
+import sys
+import time
+import urllib.request
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+import websockets
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+from app.cards import beats, card_from_json, card_rank, card_suit  # noqa: E402
+
+
+class Stats:
+    def __init__(self) -> None:
+        self.action_latency: List[float] = []
+        self.chat_latency: List[float] = []
+        self.frames = 0
+        self.frame_bytes = 0
+        self.full_states = 0
+        self.patches = 0
+        self.sent = 0
+        self.errors = 0
+        self.syncs = 0
+        self.disconnects = 0
+        self.rss_samples: List[int] = []
+
+
+class Client:
+    def __init__(self, args: argparse.Namespace, stats: Stats, game_id: str, index: int):
+        self.args = args
+        self.stats = stats
+        self.game_id = game_id
+        self.index = index
+        self.rng = random.Random(f"{game_id}:{index}")
+        self.socket = None
+        self.player_id: Optional[str] = None
+        self.game: Optional[Dict[str, Any]] = None
+        self.version: Optional[int] = None
+        self.acted_version: Optional[int] = None
+        self.pending_action: Optional[float] = None
+        self.pending_chat: Optional[float] = None
+        self.chat_marker: Optional[str] = None
+        self.chat_sent = 0
+        self.move_task: Optional[asyncio.Task] = None
+
+    async def send(self, payload: Dict[str, Any]) -> None:
+        await self.socket.send(json.dumps(payload, ensure_ascii=False))
+        self.stats.sent += 1
+
+    async def send_quietly(self, payload: Dict[str, Any]) -> None:
+        try:
+            await self.send(payload)
+        except websockets.ConnectionClosed:
+            pass
+
+    async def run(self, stop: asyncio.Event) -> None:
+        url = f"{self.args.ws_url}/ws/{self.game_id}"
+        try:
+            self.socket = await websockets.connect(url, max_size=None, open_timeout=30)
+        except Exception:
+            self.stats.disconnects += 1
+            return
+        await self.send({"action": "join", "playerName": f"bot{self.index}"})
+        chat_task = asyncio.create_task(self.chat_loop(stop))
+        try:
+            while not stop.is_set():
+                try:
+                    raw = await asyncio.wait_for(self.socket.recv(), 1.0)
+                except asyncio.TimeoutError:
+                    continue
+                self.handle(raw)
+        except websockets.ConnectionClosed:
+            if not stop.is_set():
+                self.stats.disconnects += 1
+        finally:
+            chat_task.cancel()
+            if self.move_task:
+                self.move_task.cancel()
+            await self.socket.close()
+
+    def handle(self, raw: str) -> None:
+        now = time.perf_counter()
+        self.stats.frames += 1
+        self.stats.frame_bytes += len(raw.encode()) if isinstance(raw, str) else len(raw)
+        message = json.loads(raw)
+        kind = message.get("type")
+        if kind == "joined":
+            self.player_id = message["playerId"]
+            return
+        if kind == "error":
+            self.stats.errors += 1
+            self.pending_action = None
+            self.acted_version = None
+            self.schedule_move()
+            return
+        if kind == "chat_message":
+            if self.pending_chat is not None and message["message"]["text"] == self.chat_marker:
+                self.stats.chat_latency.append((now - self.pending_chat) * 1000)
+                self.pending_chat = None
+            return
+        if kind == "game_state":
+            self.stats.full_states += 1
+            self.game = message["game"]
+        elif kind == "game_patch":
+            self.stats.patches += 1
+            if self.game is None or message["baseVersion"] != self.version:
+                self.stats.syncs += 1
+                asyncio.create_task(self.send_quietly({"action": "sync"}))
+                return
+            self.game.update(message["changes"])
+        else:
+            return
+        self.version = message["version"]
+        asyncio.create_task(self.send_quietly({"action": "ack", "version": self.version}))
+        if self.pending_action is not None:
+            self.stats.action_latency.append((now - self.pending_action) * 1000)
+            self.pending_action = None
+        self.schedule_move()
+
+    def schedule_move(self) -> None:
+        if self.acted_version == self.version or (self.move_task and not self.move_task.done()):
+            return
+        if self.choose_move() is None:
+            return
+        self.acted_version = self.version
+        self.move_task = asyncio.create_task(self.make_move())
+
+    async def make_move(self) -> None:
+        await asyncio.sleep(self.rng.uniform(0, 2 * self.args.think))
+        move = self.choose_move()
+        if move is None:
+            return
+        self.pending_action = time.perf_counter()
+        await self.send_quietly(move)
+
+    def choose_move(self) -> Optional[Dict[str, Any]]:
+        game = self.game
+        if not game or not self.player_id:
+            return None
+        actions = game.get("availableActions", {})
+        phase = game.get("phase")
+        if phase == "lobby":
+            ready = len(game["players"]) >= self.args.players
+            return {"action": "start_game"} if actions.get("canStart") and ready else None
+        if phase == "ended":
+            if self.player_id in game.get("rematchVotes", []):
+                return None
+            return {"action": "request_rematch"}
+        hand = [card_from_json(card) for card in game.get("hand", [])]
+        if not hand:
+            return None
+        trump = card_suit(card_from_json(game["trumpCard"]))
+
+        def weight(card: int):
+            return (card_suit(card) == trump, card_rank(card))
+
+        if actions.get("canDefend"):
+            for attack_index, slot in enumerate(game["table"]):
+                if slot["defense"] is not None:
+                    continue
+                attack = card_from_json(slot["attack"])
+                options = [card for card in hand if beats(card, attack, trump)]
+                if options:
+                    return {
+                        "action": "play_defense",
+                        "card": game["hand"][hand.index(min(options, key=weight))],
+                        "attackIndex": attack_index,
+                    }
+                break
+            return {"action": "take_cards"} if actions.get("canTake") else None
+        if actions.get("canAttack"):
+            return {"action": "play_attack", "card": game["hand"][hand.index(min(hand, key=weight))]}
+        if actions.get("canThrow") and self.rng.random() < 0.5:
+            ranks = {
+                card_rank(card_from_json(slot[key]))
+                for slot in game["table"]
+                for key in ("attack", "defense")
+                if slot[key]
+            }
+            options = [card for card in hand if card_rank(card) in ranks]
+            if options:
+                return {"action": "play_attack", "card": game["hand"][hand.index(min(options, key=weight))]}
+        if actions.get("canPass"):
+            return {"action": "pass_attack"}
+        return None
+
+    async def chat_loop(self, stop: asyncio.Event) -> None:
+        if self.args.chat_rate <= 0:
+            return
+        while not stop.is_set():
+            await asyncio.sleep(self.rng.expovariate(self.args.chat_rate))
+            if not self.player_id:
+                continue
+            self.chat_sent += 1
+            self.chat_marker = f"{self.player_id}#{self.chat_sent}"
+            self.pending_chat = time.perf_counter()
+            await self.send_quietly({"action": "send_chat", "message": self.chat_marker})
+
+
+def http_post(base_url: str, path: str, payload: dict) -> dict:
+    request = urllib.request.Request(
+        f"{base_url}{path}",
+        data=json.dumps(payload).encode(),
+        headers={"Content-Type": "application/json"},
+    )
+    with urllib.request.urlopen(request, timeout=30) as response:
+        return json.loads(response.read())
+
+
+def wait_until_ready(base_url: str, timeout: float = 30.0) -> None:
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            urllib.request.urlopen(f"{base_url}/", timeout=2).read()
+            return
+        except OSError:
+            time.sleep(0.2)
+    raise SystemExit("Сервер не поднялся.")
+
+
+def read_rss(pid: int) -> Optional[int]:
+    try:
+        with open(f"/proc/{pid}/status") as status:
+            for line in status:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        return None
+    return None
+
+
+async def sample_rss(pid: int, stats: Stats, stop: asyncio.Event) -> None:
+    while not stop.is_set():
+        rss = read_rss(pid)
+        if rss is not None:
+            stats.rss_samples.append(rss)
+        await asyncio.sleep(0.5)
+
+
+def percentiles(values: List[float]) -> Dict[str, Optional[float]]:
+    if len(values) < 2:
+        value = values[0] if values else None
+        return {"count": len(values), "p50": value, "p95": value, "p99": value}
+    cuts = statistics.quantiles(values, n=100)
+    return {
+        "count": len(values),
+        "p50": round(cuts[49], 2),
+        "p95": round(cuts[94], 2),
+        "p99": round(cuts[98], 2),
+    }
+
+
+async def run_load(args: argparse.Namespace, server_pid: Optional[int]) -> Dict[str, Any]:
+    stats = Stats()
+    stop = asyncio.Event()
+    create_limit = asyncio.Semaphore(args.concurrency)
+
+    async def create_room() -> str:
+        async with create_limit:
+            response = await asyncio.to_thread(
+                http_post, args.http_url, "/api/games", {"maxPlayers": args.players}
+            )
+            return response["gameId"]
+
+    rss_task = asyncio.create_task(sample_rss(server_pid, stats, stop)) if server_pid else None
+    rss_idle = read_rss(server_pid) if server_pid else None
+    started = time.perf_counter()
+    room_ids = await asyncio.gather(*(create_room() for _ in range(args.rooms)))
+    clients = [
+        Client(args, stats, game_id, index) for game_id in room_ids for index in range(args.players)
+    ]
+    tasks = []
+    for offset in range(0, len(clients), args.concurrency):
+        tasks += [asyncio.create_task(client.run(stop)) for client in clients[offset:offset + args.concurrency]]
+        await asyncio.sleep(0.05)
+    ramp_up = time.perf_counter() - started
+
+    stats.action_latency.clear()
+    stats.chat_latency.clear()
+    frames_before, bytes_before, sent_before = stats.frames, stats.frame_bytes, stats.sent
+    measure_started = time.perf_counter()
+    await asyncio.sleep(args.duration)
+    elapsed = time.perf_counter() - measure_started
+    frames = stats.frames - frames_before
+    frame_bytes = stats.frame_bytes - bytes_before
+    sent = stats.sent - sent_before
+    stop.set()
+    await asyncio.gather(*tasks, return_exceptions=True)
+    if rss_task:
+        await rss_task
+
+    return {
+        "config": {
+            "rooms": args.rooms,
+            "players": args.players,
+            "duration": args.duration,
+            "chatRate": args.chat_rate,
+            "think": args.think,
+        },
+        "clients": len(clients),
+        "rampUpSeconds": round(ramp_up, 2),
+        "measuredSeconds": round(elapsed, 2),
+        "actionLatencyMs": percentiles(stats.action_latency),
+        "chatLatencyMs": percentiles(stats.chat_latency),
+        "messagesPerSecond": round(frames / elapsed, 1),
+        "clientMessagesPerSecond": round(sent / elapsed, 1),
+        "bytesPerFrame": round(frame_bytes / frames, 1) if frames else None,
+        "fullStates": stats.full_states,
+        "patches": stats.patches,
+        "syncs": stats.syncs,
+        "errors": stats.errors,
+        "disconnects": stats.disconnects,
+        "serverRss": {
+            "idle": rss_idle,
+            "peak": max(stats.rss_samples) if stats.rss_samples else None,
+            "end": stats.rss_samples[-1] if stats.rss_samples else None,
+        },
+    }
+
+
+def raise_fd_limit() -> None:
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    if soft < hard:
+        resource.setrlimit(resource.RLIMIT_NOFILE, (hard, hard))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rooms", type=int, default=200)
+    parser.add_argument("--players", type=int, default=3)
+    parser.add_argument("--duration", type=float, default=30.0, help="секунды замера после разгона")
+    parser.add_argument("--think", type=float, default=0.2, help="средняя пауза перед ходом, с")
+    parser.add_argument("--chat-rate", type=float, default=0.1, help="сообщений чата в секунду на клиента")
+    parser.add_argument("--concurrency", type=int, default=100, help="одновременных подключений при разгоне")
+    parser.add_argument("--url", help="уже запущенный сервер, например http://127.0.0.1:8000")
+    parser.add_argument("--port", type=int, default=int(os.environ.get("LOAD_PORT", "8800")))
+    parser.add_argument("--output", default="load_test_results.json")
+    args = parser.parse_args()
+
+    raise_fd_limit()
+    proc = None
+    if args.url:
+        args.http_url = args.url.rstrip("/")
+    else:
+        args.http_url = f"http://127.0.0.1:{args.port}"
+        proc = subprocess.Popen(
+            [sys.executable, "-m", "uvicorn", "server:app", "--host", "127.0.0.1",
+             "--port", str(args.port), "--log-level", "warning"],
+            cwd=ROOT,
+        )
+    args.ws_url = "ws" + args.http_url[len("http"):]
+    try:
+        wait_until_ready(args.http_url)
+        result = asyncio.run(run_load(args, proc.pid if proc else None))
+    finally:
+        if proc:
+            proc.terminate()
+            proc.wait(timeout=10)
+
+    Path(args.output).write_text(json.dumps(result, ensure_ascii=False, indent=2))
+    action = result["actionLatencyMs"]
+    print(f"клиентов: {result['clients']}, разгон {result['rampUpSeconds']} с")
+    print(f"ход → рассылка: p50 {action['p50']} мс, p95 {action['p95']} мс, p99 {action['p99']} мс")
+    print(f"{result['messagesPerSecond']} сообщений/с, {result['bytesPerFrame']} байт/кадр")
+    if result["serverRss"]["peak"]:
+        print(f"RSS сервера: пик {result['serverRss']['peak'] / 2**20:.1f} МБ")
+    print(f"результаты записаны в {args.output}")
+
+
+if __name__ == "__main__":
+    main()
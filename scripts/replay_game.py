@@ -0,0 +1,41 @@
+# Восстанавливает состояние комнаты из журнала действий в SQLite-хранилище.
+#
+#   python scripts/replay_game.py durak.sqlite3 ABC123 [--upto N]
+import argparse
+import json
+import sqlite3
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from app.cards import mask_to_json  # noqa: E402
+from app.game_service import serialize_public_state  # noqa: E402
+from app.replay import replay_game  # noqa: E402
+from app.storage import restore_game  # noqa: E402
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("database")
+    parser.add_argument("game_id")
+    parser.add_argument("--upto", type=int, default=None, help="сколько записей журнала применить")
+    args = parser.parse_args()
+
+    conn = sqlite3.connect(args.database)
+    row = conn.execute("SELECT data FROM rooms WHERE id = ?", (args.game_id,)).fetchone()
+    if not row:
+        raise SystemExit(f"Комната {args.game_id} не найдена.")
+    stored = restore_game(row[0])
+    log = stored.action_log
+    game = replay_game(log, upto=args.upto, game_id=stored.id)
+
+    state = serialize_public_state(game)
+    state["hands"] = {player.name: mask_to_json(player.hand) for player in game.players}
+    state["logEntries"] = len(log)
+    state["appliedEntries"] = len(log) if args.upto is None else min(args.upto, len(log))
+    print(json.dumps(state, ensure_ascii=False, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+# Пакетная самоигра на синхронном движке: считает партии в секунду.
+#
+#   python scripts/selfplay.py --games 2000 --players 4 --policy greedy --workers 4
+#
+# С DURAK_CHECK_INDEXES=1 после каждого хода индексы состояния сверяются
+# с полным пересчётом.
+import argparse
+import random
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Callable, Dict, List, Tuple
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from app.action_log import OP_ATTACK, OP_DEFEND, OP_PASS, OP_SURRENDER, OP_TAKE  # noqa: E402
+from app.cards import card_rank, card_suit  # noqa: E402
+from app.engine import Action, DurakEngine  # noqa: E402
+
+MAX_STEPS = 5000
+
+Policy = Callable[[DurakEngine, List[Action], random.Random], Action]
+
+
+def random_policy(engine: DurakEngine, actions: List[Action], rng: random.Random) -> Action:
+    candidates = [action for action in actions if action.op != OP_SURRENDER]
+    return rng.choice(candidates or actions)
+
+
+def greedy_policy(engine: DurakEngine, actions: List[Action], rng: random.Random) -> Action:
+    # Бьём и ходим самой младшей картой (козыри — в последнюю очередь),
+    # подкидываем, пока можно, иначе пасуем или берём.
+    game = engine.state
+    trump = game.trump_suit
+
+    def weight(action: Action) -> Tuple[bool, int]:
+        return (card_suit(action.card) == trump, card_rank(action.card))
+
+    for op in (OP_DEFEND, OP_ATTACK):
+        candidates = [action for action in actions if action.op == op]
+        if candidates:
+            return min(candidates, key=weight)
+    passes = [
+        action
+        for action in actions
+        if action.op == OP_PASS and game.players[action.seat].id not in game.attack_passed
+    ]
+    if passes:
+        return passes[0]
+    takes = [action for action in actions if action.op == OP_TAKE]
+    if takes:
+        return takes[0]
+    return random_policy(engine, actions, rng)
+
+
+POLICIES: Dict[str, Policy] = {"random": random_policy, "greedy": greedy_policy}
+
+
+def play_games(count: int, players: int, policy_name: str, seed: int) -> Tuple[int, int]:
+    rng = random.Random(seed)
+    policy = POLICIES[policy_name]
+    moves = 0
+    for _ in range(count):
+        engine = DurakEngine.new_game(players, seed=rng.getrandbits(63))
+        steps = 0
+        while not engine.is_over and steps < MAX_STEPS:
+            engine.apply(policy(engine, engine.legal_actions(), rng))
+            steps += 1
+        moves += steps
+    return count, moves
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--games", type=int, default=1000)
+    parser.add_argument("--players", type=int, default=4)
+    parser.add_argument("--policy", choices=sorted(POLICIES), default="random")
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    per_worker = [args.games // args.workers] * args.workers
+    per_worker[0] += args.games - sum(per_worker)
+    started = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=args.workers) as pool:
+        results = list(
+            pool.map(
+                play_games,
+                per_worker,
+                [args.players] * args.workers,
+                [args.policy] * args.workers,
+                [args.seed + idx for idx in range(args.workers)],
+            )
+        )
+    elapsed = time.perf_counter() - started
+    games = sum(count for count, _ in results)
+    moves = sum(moves for _, moves in results)
+    print(f"{games} партий, {moves} ходов за {elapsed:.2f} с")
+    print(f"{games / elapsed:.1f} партий/с, {moves / elapsed:.0f} ходов/с")
+
+
+if __name__ == "__main__":
+    main()